@@ -0,0 +1,618 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+from quickxor import quickxor_b64
+
+# A local stand-in for the parts of Microsoft Graph and the SolarWinds Service
+# Desk API this project calls. Graph is served under /v1.0 and SolarWinds
+# under /solarwinds, so a run points GRAPH_API_URL at http://host:port/v1.0
+# and SOLARWINDS_API_URL at http://host:port/solarwinds.
+
+GRAPH_PREFIX = "/v1.0"
+SOLARWINDS_PREFIX = "/solarwinds"
+DEFAULT_PAGE_SIZE = 100
+ID_SEGMENT = re.compile(r"^/(users|groups)/(?!delta$)[^/]+")  # For per-endpoint request counts
+
+
+class FaultProfile:
+    """Latency, throttling and error injection applied to every request.
+
+    Batched sub-requests are throttled and failed one by one like Graph does;
+    the $batch envelope itself only gets the latency.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, throttle_rate=0.0, retry_after=1, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+    def fault(self):
+        # Returns (status, headers, body) for an injected failure, or None
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after)}, graph_error("TooManyRequests", "Throttled by mock server")
+        if roll < self.throttle_rate + self.error_rate:
+            return 503, {}, graph_error("ServiceUnavailable", "Injected failure")
+        return None
+
+
+def graph_error(code, message):
+    return {"error": {"code": code, "message": message}}
+
+
+def make_ticket(ticket_id):
+    updated = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(1700000000 + ticket_id))
+    return {
+        "id": ticket_id,
+        "number": ticket_id,
+        "name": f"New user request {ticket_id}",
+        "state": "New",
+        "updated_at": updated,
+        "customFields": [
+            {"name": "FirstName", "value": f"First{ticket_id}"},
+            {"name": "LastName", "value": f"Last{ticket_id}"},
+            {"name": "Department", "value": "Benchmarking"},
+            {"name": "JobTitle", "value": "Tester"},
+            {"name": "ManagerEmail", "value": f"manager{ticket_id % 50}@example.com"},
+        ],
+    }
+
+
+class MockDirectory:
+    """In-memory tenant: users, groups with members, invitations and tickets."""
+
+    def __init__(self, groups=10, tickets=0):
+        self.lock = threading.Lock()
+        self.reset(groups, tickets)
+
+    def reset(self, groups=10, tickets=0):
+        # POST /mock/reset starts over with an empty tenant
+        self.users = {}  # id -> user
+        self.users_by_key = {}  # lowercased UPN / mail -> id
+        self.groups = {}  # id -> {"id", "displayName", "members": set()}
+        self.ticket_version = getattr(self, "ticket_version", 0)
+        self.ticket_notes = {}
+        self.counts = {}
+        self.files = {}  # item id -> {"id", "owner", "name", "path", "content", "hash"}
+        self.uploads = {}  # upload session id -> {"owner", "path", "size", "content": bytearray}
+        self.deleted = {}  # id -> deleted user, until restored
+        for number in range(groups):
+            group_id = str(uuid.UUID(int=number + 1))
+            self.groups[group_id] = {"id": group_id, "displayName": f"Mock Group {number + 1}", "members": set()}
+        # Newest first, the order the SolarWinds client asks for
+        self.tickets = [make_ticket(ticket_id) for ticket_id in range(tickets, 0, -1)]
+        self.ticket_version += 1
+
+    def add_ticket(self, ticket_id):
+        self.tickets.insert(0, make_ticket(ticket_id))
+        self.ticket_version += 1
+
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def resolve_user(self, key):
+        key = unquote(key).lower()
+        if key in self.users:
+            return key
+        return self.users_by_key.get(key)
+
+    def create_user(self, body):
+        upn = (body or {}).get("userPrincipalName")
+        if not upn:
+            return 400, {}, graph_error("Request_BadRequest", "userPrincipalName is required")
+        with self.lock:
+            if upn.lower() in self.users_by_key:
+                return 400, {}, graph_error(
+                    "Request_BadRequest",
+                    "Another object with the same value for property userPrincipalName already exists.")
+            user_id = str(uuid.uuid4())
+            user = dict(body, id=user_id, mail=body.get("mail"))
+            user.pop("passwordProfile", None)
+            self.users[user_id] = user
+            self.users_by_key[upn.lower()] = user_id
+        return 201, {}, user
+
+    def invite(self, body):
+        email = (body or {}).get("invitedUserEmailAddress")
+        if not email:
+            return 400, {}, graph_error("BadRequest", "invitedUserEmailAddress is required")
+        with self.lock:
+            user_id = self.users_by_key.get(email.lower())
+            if user_id is None:
+                user_id = str(uuid.uuid4())
+                upn = f"{email.replace('@', '_')}#EXT#@mock.onmicrosoft.com"
+                self.users[user_id] = {"id": user_id, "userPrincipalName": upn, "mail": email,
+                                       "displayName": body.get("invitedUserDisplayName"), "userType": "Guest"}
+                self.users_by_key[email.lower()] = user_id
+                self.users_by_key[upn.lower()] = user_id
+        return 201, {}, {"id": str(uuid.uuid4()), "status": "PendingAcceptance",
+                         "invitedUserEmailAddress": email, "invitedUser": {"id": user_id}}
+
+    def add_member(self, group_id, body):
+        reference = (body or {}).get("@odata.id", "")
+        with self.lock:
+            group = self.groups.get(group_id)
+            if group is None:
+                return 404, {}, graph_error("Request_ResourceNotFound", f"Group {group_id} not found")
+            user_id = self.resolve_user(reference.rstrip("/").rsplit("/", 1)[-1])
+            if user_id is None:
+                return 404, {}, graph_error("Request_ResourceNotFound", "Referenced user not found")
+            if user_id in group["members"]:
+                return 400, {}, graph_error("Request_BadRequest",
+                                            "One or more added object references already exist.")
+            group["members"].add(user_id)
+        return 204, {}, None
+
+    def update_group(self, group_id, body):
+        # PATCH with members@odata.bind adds up to 20 members at once
+        references = (body or {}).get("members@odata.bind", [])
+        if len(references) > 20:
+            return 400, {}, graph_error("Request_BadRequest", "At most 20 members can be added per request")
+        with self.lock:
+            group = self.groups.get(group_id)
+            if group is None:
+                return 404, {}, graph_error("Request_ResourceNotFound", f"Group {group_id} not found")
+            user_ids = [self.resolve_user(reference.rstrip("/").rsplit("/", 1)[-1]) for reference in references]
+            if None in user_ids:
+                return 404, {}, graph_error("Request_ResourceNotFound", "Referenced user not found")
+            if any(user_id in group["members"] for user_id in user_ids):
+                return 400, {}, graph_error("Request_BadRequest",
+                                            "One or more added object references already exist.")
+            group["members"].update(user_ids)
+        return 204, {}, None
+
+    def update_user(self, key, body):
+        with self.lock:
+            user_id = self.resolve_user(key)
+            if user_id is None:
+                return 404, {}, graph_error("Request_ResourceNotFound", "User not found")
+            self.users[user_id].update(body or {})
+        return 204, {}, None
+
+    def add_file(self, owner_id, path, content):
+        # path is relative to the drive root, e.g. "Documents/report.docx"
+        folder, _, name = path.strip("/").rpartition("/")
+        item_id = str(uuid.uuid4())
+        self.files[item_id] = {"id": item_id, "owner": owner_id, "name": name,
+                               "path": f"/drive/root:/{folder}" if folder else "/drive/root:",
+                               "content": bytes(content), "hash": quickxor_b64(content)}
+        return item_id
+
+    def drive_item(self, item, origin):
+        return {"id": item["id"], "name": item["name"], "size": len(item["content"]),
+                "parentReference": {"path": item["path"]},
+                "file": {"hashes": {"quickXorHash": item["hash"]}},
+                "@microsoft.graph.downloadUrl": f"{origin}/mock/download/{item['id']}"}
+
+    def download(self, item_id, headers):
+        item = self.files.get(item_id)
+        if item is None:
+            return 404, {}, graph_error("itemNotFound", "Item not found")
+        content = item["content"]
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", headers.get("Range") or "")
+        if match is None:
+            return 200, {}, content
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(content) - 1), len(content) - 1)
+        if start >= len(content):
+            return 416, {"Content-Range": f"bytes */{len(content)}"}, None
+        return 206, {"Content-Range": f"bytes {start}-{end}/{len(content)}"}, content[start:end + 1]
+
+    def create_upload_session(self, owner_key, path, origin):
+        owner_id = self.resolve_user(owner_key)
+        if owner_id is None:
+            return 404, {}, graph_error("Request_ResourceNotFound", "User not found")
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.uploads[session_id] = {"owner": owner_id, "path": unquote(path), "size": None,
+                                        "content": bytearray()}
+        return 200, {}, {"uploadUrl": f"{origin}/mock/upload/{session_id}",
+                         "expirationDateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 3600))}
+
+    def upload_fragment(self, session_id, body, headers, origin):
+        # Fragments must arrive in order, as Graph requires
+        with self.lock:
+            upload = self.uploads.get(session_id)
+            if upload is None:
+                return 404, {}, graph_error("itemNotFound", "Upload session not found")
+            match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+)", headers.get("Content-Range") or "")
+            if match is None:
+                return 400, {}, graph_error("invalidRequest", "Content-Range is required")
+            start, end, size = (int(value) for value in match.groups())
+            if start != len(upload["content"]) or end - start + 1 != len(body or b""):
+                return 416, {}, graph_error("invalidRange", "Fragment does not start at the next expected byte")
+            upload["content"] += body
+            if len(upload["content"]) < size:
+                return 202, {}, {"nextExpectedRanges": [f"{len(upload['content'])}-"]}
+            del self.uploads[session_id]
+        return self.store_upload(upload["owner"], upload["path"], bytes(upload["content"]), origin)
+
+    def upload_status(self, session_id):
+        with self.lock:
+            upload = self.uploads.get(session_id)
+            if upload is None:
+                return 404, {}, graph_error("itemNotFound", "Upload session not found")
+            return 200, {}, {"nextExpectedRanges": [f"{len(upload['content'])}-"]}
+
+    def store_upload(self, owner_key, path, content, origin):
+        owner_id = self.resolve_user(owner_key)
+        if owner_id is None:
+            return 404, {}, graph_error("Request_ResourceNotFound", "User not found")
+        with self.lock:
+            path = unquote(path).strip("/")
+            # conflictBehavior "replace": a file at the same path is overwritten
+            for item_id, item in list(self.files.items()):
+                if item["owner"] == owner_id and f"{item['path'].split(':', 1)[1]}/{item['name']}".strip("/") == path:
+                    del self.files[item_id]
+            item_id = self.add_file(owner_id, path, content)
+            return 201, {}, self.drive_item(self.files[item_id], origin)
+
+    def delete_user(self, key):
+        with self.lock:
+            user_id = self.resolve_user(key)
+            if user_id is None:
+                return 404, {}, graph_error("Request_ResourceNotFound", "User not found")
+            user = self.users.pop(user_id)
+            self.deleted[user_id] = user
+            for lookup in (user.get("userPrincipalName"), user.get("mail")):
+                if lookup:
+                    self.users_by_key.pop(lookup.lower(), None)
+            for group in self.groups.values():
+                group["members"].discard(user_id)
+        return 204, {}, None
+
+    def restore_user(self, user_id):
+        with self.lock:
+            user = self.deleted.pop(user_id, None)
+            if user is None:
+                return 404, {}, graph_error("Request_ResourceNotFound", "Deleted object not found")
+            self.users[user_id] = user
+            for lookup in (user.get("userPrincipalName"), user.get("mail")):
+                if lookup:
+                    self.users_by_key[lookup.lower()] = user_id
+        return 200, {}, user
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, directory, faults):
+        super().__init__(address, MockRequestHandler)
+        self.directory = directory
+        self.faults = faults
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, every response
+    # waits out the client's delayed ACK and the mock adds ~40ms of its own
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_PATCH(self):
+        self.handle_request("PATCH")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def handle_request(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        try:
+            if "octet-stream" in (self.headers.get("Content-Type") or "") or self.path.startswith("/mock/upload/"):
+                body = raw_body  # File content
+            else:
+                body = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            self.reply(400, {}, graph_error("BadRequest", "Body is not JSON"))
+            return
+
+        faults = self.server.faults
+        faults.delay()
+        path = urlsplit(self.path).path
+        is_batch = path == f"{GRAPH_PREFIX}/$batch"
+        fault = None if is_batch else faults.fault()
+        if fault is not None:
+            self.reply(*fault)
+            return
+        if is_batch:
+            self.reply(*self.batch(body))
+        else:
+            self.reply(*route(self.server.directory, method, self.path, body, self.headers, self.origin()))
+
+    def batch(self, body):
+        sub_requests = (body or {}).get("requests", [])
+        if len(sub_requests) > 20:
+            return 400, {}, graph_error("BadRequest", "A batch may contain at most 20 requests")
+        directory = self.server.directory
+        directory.count("$batch")
+        statuses = {}
+        responses = []
+        for sub_request in sub_requests:
+            request_id = sub_request.get("id")
+            failed_dependency = any(statuses.get(dependency, 500) >= 400
+                                    for dependency in sub_request.get("dependsOn", []))
+            if failed_dependency:
+                status, headers, sub_body = 424, {}, graph_error("FailedDependency", "Dependency failed")
+            else:
+                status, headers, sub_body = (self.server.faults.fault() or
+                                             route(directory, sub_request.get("method", "GET"),
+                                                   GRAPH_PREFIX + sub_request.get("url", ""),
+                                                   sub_request.get("body"), sub_request.get("headers") or {},
+                                                   self.origin()))
+            statuses[request_id] = status
+            response = {"id": request_id, "status": status, "headers": headers}
+            if sub_body is not None:
+                response["body"] = sub_body
+            responses.append(response)
+        # Graph does not keep sub-responses in request order
+        random.shuffle(responses)
+        return 200, {}, {"responses": responses}
+
+    def origin(self):
+        return f"http://{self.headers.get('Host') or self.server.base_url.split('//', 1)[1]}"
+
+    def reply(self, status, headers, body):
+        raw = isinstance(body, bytes)
+        payload = body if raw else json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if payload:
+            self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+
+def route(directory, method, target, body, headers, origin=""):
+    # Next and delta links are absolute, as Graph sends them
+    if target.startswith("/"):
+        target = origin + target
+    parts = urlsplit(target)
+    path = parts.path.rstrip("/")
+    query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+    if path == "/mock/reset" and method == "POST":
+        with directory.lock:
+            directory.reset((body or {}).get("groups", len(directory.groups)), (body or {}).get("tickets", 0))
+        return 204, {}, None
+    if path == "/mock/stats" and method == "GET":
+        with directory.lock:
+            return 200, {}, {"counts": dict(directory.counts), "users": len(directory.users)}
+    match = re.fullmatch(r"/mock/download/([^/]+)", path)
+    if match and method == "GET":
+        directory.count("GET /mock/download")
+        return directory.download(match.group(1), headers)
+    match = re.fullmatch(r"/mock/upload/([^/]+)", path)
+    if match and method == "PUT":
+        directory.count("PUT /mock/upload")
+        return directory.upload_fragment(match.group(1), body, headers, origin)
+    if match and method == "GET":
+        return directory.upload_status(match.group(1))
+    if path.startswith(SOLARWINDS_PREFIX):
+        return solarwinds_route(directory, method, path[len(SOLARWINDS_PREFIX):], query, body, headers)
+    if not path.startswith(GRAPH_PREFIX):
+        return 404, {}, graph_error("NotFound", f"No mock for {path}")
+    path = path[len(GRAPH_PREFIX):]
+    template = ID_SEGMENT.sub(r"/\1/{id}", path)
+    directory.count(f"{method} {template}")
+
+    if path == "/users" and method == "POST":
+        return directory.create_user(body)
+    if path == "/users" and method == "GET":
+        return list_users(directory, target, query)
+    if path in ("/users/delta", "/groups/delta") and method == "GET":
+        return delta(directory, target, path, query)
+    if path == "/groups" and method == "GET":
+        with directory.lock:
+            groups = [{"id": group["id"], "displayName": group["displayName"]} for group in directory.groups.values()]
+        return page_of(groups, target, query)
+    if path == "/invitations" and method == "POST":
+        return directory.invite(body)
+
+    match = re.fullmatch(r"/users/([^/]+)/drive/root/delta", path)
+    if match and method == "GET":
+        owner_id = directory.resolve_user(match.group(1))
+        with directory.lock:
+            items = [directory.drive_item(item, origin) for item in directory.files.values() if item["owner"] == owner_id]
+        status, headers, body = page_of(items, target, query)
+        if "@odata.nextLink" not in body:
+            body["@odata.deltaLink"] = f"{target.split('?', 1)[0]}?$deltatoken=latest"
+        return status, headers, body
+    match = re.fullmatch(r"/users/([^/]+)/drive/items/([^/]+)", path)
+    if match and method == "GET":
+        item = directory.files.get(match.group(2))
+        if item is None:
+            return 404, {}, graph_error("itemNotFound", "Item not found")
+        return 200, {}, directory.drive_item(item, origin)
+    match = re.fullmatch(r"/users/([^/]+)/drive/root:/(.+):/createUploadSession", path)
+    if match and method == "POST":
+        return directory.create_upload_session(match.group(1), match.group(2), origin)
+    match = re.fullmatch(r"/users/([^/]+)/drive/root:/(.+):/content", path)
+    if match and method == "PUT":
+        return directory.store_upload(match.group(1), match.group(2), body or b"", origin)
+
+    match = re.fullmatch(r"/groups/([^/]+)/members/\$ref", path)
+    if match and method == "POST":
+        return directory.add_member(match.group(1), body)
+    match = re.fullmatch(r"/groups/([^/]+)/members(?:/microsoft\.graph\.user)?", path)
+    if match and method == "GET":
+        group = directory.groups.get(match.group(1))
+        if group is None:
+            return 404, {}, graph_error("Request_ResourceNotFound", "Group not found")
+        with directory.lock:
+            members = [dict(directory.users[user_id]) for user_id in sorted(group["members"])]
+        return page_of(members, target, query)
+    match = re.fullmatch(r"/groups/([^/]+)", path)
+    if match and method == "PATCH":
+        return directory.update_group(match.group(1), body)
+    if match and method == "GET":
+        group = directory.groups.get(match.group(1))
+        if group is None:
+            return 404, {}, graph_error("Request_ResourceNotFound", "Group not found")
+        return 200, {}, {"id": group["id"], "displayName": group["displayName"]}
+    match = re.fullmatch(r"/directory/deletedItems/([^/]+)/restore", path)
+    if match and method == "POST":
+        return directory.restore_user(match.group(1))
+    match = re.fullmatch(r"/users/([^/]+)", path)
+    if match and method == "DELETE":
+        return directory.delete_user(match.group(1))
+    if match and method == "PATCH":
+        return directory.update_user(match.group(1), body)
+    if match and method == "GET":
+        user_id = directory.resolve_user(match.group(1))
+        if user_id is None:
+            return 404, {}, graph_error("Request_ResourceNotFound", "User not found")
+        return 200, {}, directory.users[user_id]
+    return 404, {}, graph_error("NotFound", f"No mock for {method} {path}")
+
+
+def page_of(items, target, query):
+    top = int(query.get("$top", DEFAULT_PAGE_SIZE))
+    skip = int(query.get("$skiptoken", 0))
+    body = {"value": items[skip:skip + top]}
+    if skip + top < len(items):
+        # Like Graph, the next link carries the original query
+        base = target.split("?", 1)[0]
+        body["@odata.nextLink"] = f"{base}?{urlencode(dict(query, **{'$skiptoken': skip + top}))}"
+    return 200, {}, body
+
+
+def list_users(directory, target, query):
+    # Supports the "userPrincipalName in (...) or mail in (...)" lookups and
+    # startswith(field,'prefix') searches
+    with directory.lock:
+        if "$filter" in query and "startswith(" in query["$filter"]:
+            terms = [(field, prefix.replace("''", "'").lower()) for field, prefix in
+                     re.findall(r"startswith\((\w+),'((?:[^']|'')*)'\)", query["$filter"])]
+            users = [user for user in directory.users.values()
+                     if any(str(user.get(field) or "").lower().startswith(prefix) for field, prefix in terms)]
+        elif "$filter" in query:
+            wanted = {value.lower() for value in re.findall(r"'((?:[^']|'')*)'", query["$filter"])}
+            user_ids = {directory.users_by_key[key] for key in wanted if key in directory.users_by_key}
+            users = [directory.users[user_id] for user_id in user_ids]
+        else:
+            users = list(directory.users.values())
+    select = query.get("$select")
+    if select:
+        fields = select.split(",")
+        users = [{field: user.get(field) for field in fields} for user in users]
+    return page_of(users, target, query)
+
+
+def delta(directory, target, path, query):
+    # Every round returns the full set; the delta link just ends the round
+    if "$deltatoken" in query:
+        return 200, {}, {"value": [], "@odata.deltaLink": target}
+    status, headers, body = (list_users(directory, target, query) if path == "/users/delta" else
+                             page_of([{"id": group["id"], "displayName": group["displayName"]}
+                                      for group in directory.groups.values()], target, query))
+    if "@odata.nextLink" not in body:
+        base = target.split("?", 1)[0]
+        body["@odata.deltaLink"] = f"{base}?$deltatoken=latest"
+    return status, headers, body
+
+
+def solarwinds_route(directory, method, path, query, body, headers):
+    if path == "/requests" and method == "GET":
+        directory.count("GET /requests")
+        etag = '"' + hashlib.sha1(str(directory.ticket_version).encode()).hexdigest() + '"'
+        page = int(query.get("page", 1))
+        if page == 1 and headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, None
+        per_page = int(query.get("per_page", DEFAULT_PAGE_SIZE))
+        with directory.lock:
+            tickets = directory.tickets[(page - 1) * per_page:page * per_page]
+            total_pages = max(1, -(-len(directory.tickets) // per_page))
+        return 200, {"ETag": etag, "X-Total-Pages": str(total_pages)}, tickets
+    match = re.fullmatch(r"/requests/(\d+)", path)
+    if match and method == "PUT":
+        directory.count("PUT /requests/{id}")
+        with directory.lock:
+            directory.ticket_notes.setdefault(int(match.group(1)), []).append((body or {}).get("note"))
+        return 200, {}, {"id": int(match.group(1))}
+    return 404, {}, {"error": f"No mock for {method} {path}"}
+
+
+def start_server(host="127.0.0.1", port=0, directory=None, faults=None):
+    """Starts a MockServer on a background thread and returns it."""
+    server = MockServer((host, port), directory or MockDirectory(), faults or FaultProfile())
+    thread = threading.Thread(target=server.serve_forever, name="mock-server", daemon=True)
+    thread.start()
+    return server
+
+
+def add_fault_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds, at random")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, help="Seed for the fault injection")
+
+
+def fault_profile(args):
+    return FaultProfile(args.latency, args.jitter, args.throttle_rate, args.retry_after, args.error_rate, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock Microsoft Graph and SolarWinds API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--tickets", type=int, default=0)
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockServer((args.host, args.port), MockDirectory(args.groups, args.tickets), fault_profile(args))
+    print(f"GRAPH_API_URL={server.base_url}{GRAPH_PREFIX}")
+    print(f"SOLARWINDS_API_URL={server.base_url}{SOLARWINDS_PREFIX}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from collections import namedtuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.mock_server import (GRAPH_PREFIX, SOLARWINDS_PREFIX, FaultProfile, MockDirectory, MockServer,
+                                    add_fault_arguments)
+
+# Measures provisioning throughput against benchmarks/mock_server.py, so no
+# tenant is touched. The server runs in its own process unless --in-process
+# is given, so it does not compete with the client for the GIL.
+#
+#   python benchmarks/run_benchmark.py --users 1000 10000 100000
+#   python benchmarks/run_benchmark.py --scenario invite-guests --latency 0.05 --throttle-rate 0.02
+
+SCENARIOS = ("create-users", "invite-guests", "tickets")
+BENCHMARK_GROUP_ID = str(uuid.UUID(int=1))  # First group the mock server creates
+
+AccessToken = namedtuple("AccessToken", ["token", "expires_on"])
+
+
+class MockCredential:
+    def get_token(self, *scopes):
+        return AccessToken("mock-token", int(time.time()) + 3600)
+
+
+class RequestTimer:
+    """Records the wall time of every HTTP request the client makes."""
+
+    def __init__(self):
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def install(self):
+        import http_transport
+        original = http_transport.HttpTransport.request
+        timer = self
+
+        def timed_request(transport, method, url, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(transport, method, url, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with timer._lock:
+                    timer.latencies.append(elapsed)
+
+        http_transport.HttpTransport.request = timed_request
+
+    def reset(self):
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def serve(connection, groups, faults):
+    server = MockServer(("127.0.0.1", 0), MockDirectory(groups), FaultProfile(**faults))
+    connection.send(server.base_url)
+    server.serve_forever()
+
+
+class ServerProcess:
+    """Runs the mock server for the whole session; yields its base URL."""
+
+    def __init__(self, groups, faults, in_process=False):
+        self.groups = groups
+        self.faults = faults
+        self.in_process = in_process
+        self._process = None
+        self._server = None
+
+    def __enter__(self):
+        if self.in_process:
+            self._server = MockServer(("127.0.0.1", 0), MockDirectory(self.groups), FaultProfile(**self.faults))
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            return self._server.base_url
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=serve, args=(child, self.groups, self.faults), daemon=True)
+        self._process.start()
+        return parent.recv()
+
+    def __exit__(self, *exc_info):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+
+
+def reset_server(base_url, groups, tickets):
+    # Plain urllib so the reset is not counted by the RequestTimer
+    request = urllib.request.Request(f"{base_url}/mock/reset", method="POST",
+                                     data=json.dumps({"groups": groups, "tickets": tickets}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request):
+        pass
+
+
+def configure_environment(base_url, cache_dir):
+    # config is read once at import, so this must run before the project's
+    # modules are loaded
+    os.environ["GRAPH_API_URL"] = f"{base_url}{GRAPH_PREFIX}"
+    os.environ["SOLARWINDS_API_URL"] = f"{base_url}{SOLARWINDS_PREFIX}"
+    os.environ["CACHE_DIR"] = cache_dir
+
+
+def make_users(count, run_id):
+    return [{"firstName": f"User{number}", "lastName": f"Bench{run_id}", "email": f"user{number}.{run_id}@example.com",
+             "department": "Benchmarking", "jobTitle": "Tester"} for number in range(count)]
+
+
+def run_create_users(count, args, run_id):
+    from migration_core import TenantService
+    service = TenantService(MockCredential(), "benchmark", use_cache=not args.no_cache)
+    statuses = {}
+
+    def on_user(upn, status):
+        statuses[status.split(":")[0]] = statuses.get(status.split(":")[0], 0) + 1
+
+    try:
+        service.create_users(make_users(count, run_id), BENCHMARK_GROUP_ID if args.group else None, on_user=on_user)
+    finally:
+        service.close()
+    return statuses
+
+
+def run_invite_guests(count, args, run_id):
+    from migration_core import TenantService
+    service = TenantService(MockCredential(), "benchmark", use_cache=not args.no_cache)
+    statuses = {}
+
+    def on_user(email, status):
+        statuses[status] = statuses.get(status, 0) + 1
+
+    try:
+        service.invite_guests(make_users(count, run_id), BENCHMARK_GROUP_ID if args.group else None, on_user=on_user)
+    finally:
+        service.close()
+    return statuses
+
+
+def run_tickets(count, args, run_id):
+    import config
+    from solarwinds_api import SolarWindsAPI
+    api = SolarWindsAPI("mock-token", config.SOLARWINDS_API_URL,
+                        cursor_path=os.path.join(config.CACHE_DIR, f"cursor-{run_id}.json"))
+    records = api.fetch_ticket_records()
+    return {"read": len(records)}
+
+
+RUNNERS = {
+    "create-users": run_create_users,
+    "invite-guests": run_invite_guests,
+    "tickets": run_tickets,
+}
+
+
+def run_one(base_url, scenario, count, args, timer, run_id):
+    reset_server(base_url, args.groups, count if scenario == "tickets" else 0)
+    timer.reset()
+    started = time.perf_counter()
+    statuses = RUNNERS[scenario](count, args, run_id)
+    elapsed = time.perf_counter() - started
+    latencies = timer.reset()
+    return {
+        "scenario": scenario,
+        "items": count,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(count / elapsed, 1) if elapsed > 0 else None,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "statuses": statuses,
+    }
+
+
+def format_row(result):
+    statuses = ", ".join(f"{name}={value}" for name, value in sorted(result["statuses"].items()))
+    return (f"{result['scenario']:<14} {result['items']:>7} {result['seconds']:>9.2f} "
+            f"{result['items_per_second'] or 0:>9.1f} {result['requests']:>8} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}  {statuses}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark provisioning against a local mock Graph/SolarWinds.")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="create-users")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000],
+                        help="Run sizes, e.g. --users 1000 10000 100000")
+    parser.add_argument("--group", action="store_true", help="Also add every user to a group")
+    parser.add_argument("--groups", type=int, default=10, help="Groups the mock tenant starts with")
+    parser.add_argument("--no-cache", action="store_true", help="Run without the local directory cache")
+    parser.add_argument("--in-process", action="store_true", help="Serve the mock from a thread of this process")
+    parser.add_argument("--json", help="Also write the results to this file")
+    add_fault_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    faults = {"latency": args.latency, "jitter": args.jitter, "throttle_rate": args.throttle_rate,
+              "retry_after": args.retry_after, "error_rate": args.error_rate, "seed": args.seed}
+
+    results = []
+    with ServerProcess(args.groups, faults, args.in_process) as base_url:
+        configure_environment(base_url, tempfile.mkdtemp(prefix="migration-benchmark-"))
+        timer = RequestTimer()
+        timer.install()
+        print(f"{'scenario':<14} {'items':>7} {'seconds':>9} {'items/s':>9} {'requests':>8} {'p50 ms':>8} "
+              f"{'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for scenario in scenarios:
+            for count in args.users:
+                result = run_one(base_url, scenario, count, args, timer, uuid.uuid4().hex[:8])
+                results.append(result)
+                print(format_row(result), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
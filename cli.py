@@ -0,0 +1,243 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from graph_paging import iter_groups
+from metrics import get_metrics
+from migration_core import TenantService, read_manifest
+from migration_journal import TICKET_UPDATED, MigrationJournal
+from migration_planner import CONFLICT, MigrationPlanner
+from notifications import get_dispatcher, notify_account_created
+from ticket_writeback import account_created_note, get_ticket_writeback, note_ticket
+
+# Headless entry point. It never imports PyQt, and azure.identity is only
+# imported once a credential is actually needed.
+
+
+def build_credential(args):
+    from azure.identity import ClientSecretCredential, DefaultAzureCredential
+    client_secret = os.getenv("AZURE_CLIENT_SECRET")
+    if args.tenant_id and args.client_id and client_secret:
+        return ClientSecretCredential(args.tenant_id, args.client_id, client_secret)
+    return DefaultAzureCredential(exclude_interactive_browser_credential=True)
+
+
+class Stats:
+    def __init__(self, total):
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+    def record(self, key, status):
+        if status in ("skipped", "exists"):
+            self.skipped += 1
+        elif status.startswith(("failed", "conflict")):
+            self.failed += 1
+            print(f"{key}\t{status}", file=sys.stderr)
+        else:
+            self.succeeded += 1
+        done = self.succeeded + self.failed + self.skipped
+        if done % 100 == 0 or done == self.total:
+            print(f"{done}/{self.total} ({self.rate():.1f}/s)", file=sys.stderr)
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return (self.succeeded + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self, label):
+        elapsed = time.monotonic() - self.started
+        return (f"{label}: {self.succeeded} succeeded, {self.failed} failed, {self.skipped} skipped of {self.total} "
+                f"in {elapsed:.1f}s ({self.rate():.1f} users/s)")
+
+
+def open_journal(service, args, stage=None):
+    if args.journal:
+        return MigrationJournal(args.journal, resume=args.resume)
+    return MigrationJournal.for_tenant(service.tenant_id, resume=args.resume, stage=stage)
+
+
+def print_plan(plan):
+    for entry in plan.by_action(CONFLICT):
+        print(f"{entry.key}\tconflict: {entry.reason}")
+    for entry in plan.entries:
+        if entry.changes:
+            changes = ", ".join(f"{field}={value}" for field, value in entry.changes.items())
+            print(f"{entry.key}\tupdate: {changes}")
+    print(f"plan: {plan.summary()}")
+
+
+def create_users(service, args):
+    users = list(read_manifest(args.manifest))
+    stats = Stats(len(users))
+    journal = open_journal(service, args)
+    dispatcher = get_dispatcher()
+    users_by_upn = {service.build_user_payload(user_data)['userPrincipalName']: user_data for user_data in users}
+
+    writeback = get_ticket_writeback()
+
+    def on_user(upn, status):
+        stats.record(upn, status)
+        if status not in ("created", "skipped"):
+            return
+        user_data = users_by_upn[upn]
+        if not journal.is_done(upn, TICKET_UPDATED):
+            note_ticket(user_data, upn, account_created_note(upn, args.group_id), journal, writeback)
+        if args.notify:
+            notify_account_created(user_data, upn, journal, dispatcher,
+                                   on_sent=lambda to_email: note_ticket(
+                                       user_data, upn, f"Account details emailed to {to_email}",
+                                       writeback=writeback))
+
+    try:
+        planner = MigrationPlanner(service)
+        plan = planner.plan_users(users, args.group_id, journal)
+        if args.plan:
+            print_plan(plan)
+            return True
+        print(f"plan: {plan.summary()}", file=sys.stderr)
+        planner.execute(plan, on_user=on_user, journal=journal)
+    finally:
+        dispatcher.flush()
+        if writeback is not None:
+            writeback.flush()
+        journal.close()
+    print(stats.summary("create-users"))
+    return stats.failed == 0
+
+
+def invite_guests(service, args):
+    users = list(read_manifest(args.manifest))
+    stats = Stats(len(users))
+    journal = open_journal(service, args, stage="guests")
+    try:
+        planner = MigrationPlanner(service)
+        plan = planner.plan_guests(users, args.group_id, journal)
+        if args.plan:
+            print_plan(plan)
+            return True
+        print(f"plan: {plan.summary()}", file=sys.stderr)
+        planner.execute(plan, on_user=stats.record, journal=journal)
+    finally:
+        journal.close()
+    print(stats.summary("invite-guests"))
+    return stats.failed == 0
+
+
+def list_groups(service, args):
+    if service.directory_cache is not None:
+        service.directory_cache.sync_groups(service.graph_headers)
+        pages = [service.directory_cache.groups()]
+    else:
+        pages = iter_groups(service.graph_headers)
+    count = 0
+    for page in pages:
+        for group in page:
+            print(f"{group['id']}\t{group['displayName']}")
+            count += 1
+    print(f"list-groups: {count} groups", file=sys.stderr)
+    return True
+
+
+def orchestrate(args):
+    # Runs in place of the single-tenant commands: every job signs in itself
+    from tenant_orchestrator import TenantOrchestrator, load_jobs, summarize
+    jobs = load_jobs(args.jobs)
+    orchestrator = TenantOrchestrator(jobs, args.processes, logging.getLogger().level)
+    last_printed = [0.0]
+
+    def on_progress(done, total, rate):
+        now = time.monotonic()
+        if now - last_printed[0] >= 2 or done == total:
+            last_printed[0] = now
+            print(f"{done}/{total} ({rate:.1f}/s)", file=sys.stderr)
+
+    def on_item(name, key, status):
+        print(f"{name}\t{key}\t{status}", file=sys.stderr)
+
+    def on_job(summary):
+        print(f"{summary['name']} finished in {summary['seconds']:.1f}s"
+              f"{'' if summary['ok'] else ': ' + summary['error']}", file=sys.stderr)
+
+    started = time.monotonic()
+    print(f"Running {len(jobs)} jobs in {orchestrator.processes} processes", file=sys.stderr)
+    summaries = orchestrator.run(on_progress=on_progress, on_item=on_item, on_job=on_job)
+    for line in summarize(summaries, time.monotonic() - started):
+        print(line)
+    return all(summary["ok"] and not any(counts.get("failed") or counts.get("conflict")
+                                         for counts in summary["stages"].values())
+               for summary in summaries)
+
+
+COMMANDS = {
+    "create-users": create_users,
+    "invite-guests": invite_guests,
+    "list-groups": list_groups,
+}
+
+
+def add_journal_arguments(parser):
+    parser.add_argument("--journal", help="Journal file (default: one per tenant in the cache directory)")
+    parser.add_argument("--resume", action="store_true", help="Skip steps the journal records as done")
+    parser.add_argument("--plan", action="store_true",
+                        help="Only print what would be created, updated or skipped, and any conflicts")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run Azure migration operations without the GUI.")
+    parser.add_argument("--tenant-id", default=os.getenv("AZURE_TENANT_ID"))
+    parser.add_argument("--client-id", default=os.getenv("AZURE_CLIENT_ID"),
+                        help="App registration id; the secret is read from AZURE_CLIENT_SECRET")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the local directory cache")
+    parser.add_argument("--metrics-out", help="Write request metrics here at the end (.json, else Prometheus text)")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create-users", help="Create users from a CSV or JSONL manifest")
+    create.add_argument("manifest")
+    create.add_argument("--group-id", help="Add every created user to this group")
+    create.add_argument("--notify", action="store_true",
+                        help="Email account details to managerEmail/email from the manifest (SMTP_* settings)")
+    add_journal_arguments(create)
+
+    guests = commands.add_parser("invite-guests", help="Invite guests from a CSV or JSONL manifest")
+    guests.add_argument("manifest")
+    guests.add_argument("--group-id", help="Add every invited guest to this group")
+    add_journal_arguments(guests)
+
+    commands.add_parser("list-groups", help="Print the id and name of every group")
+
+    jobs = commands.add_parser("orchestrate", help="Migrate several source/destination tenant pairs in parallel")
+    jobs.add_argument("jobs", help="JSON or JSONL job list (see tenant_orchestrator.load_jobs)")
+    jobs.add_argument("--processes", type=int, help="Worker processes (default: one per job, up to ORCHESTRATOR_MAX_PROCESSES)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "orchestrate":
+        try:
+            ok = orchestrate(args)
+        except Exception as e:
+            logging.error(f"Failed to run migration jobs: {e}")
+            ok = False
+        finally:
+            if args.metrics_out:
+                get_metrics().export(args.metrics_out)
+        return 0 if ok else 1
+    service = TenantService(build_credential(args), args.tenant_id, use_cache=not args.no_cache)
+    try:
+        ok = COMMANDS[args.command](service, args)
+    finally:
+        service.close()
+        if args.metrics_out:
+            get_metrics().export(args.metrics_out)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
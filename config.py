@@ -8,3 +8,51 @@ SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.office365.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USERNAME)
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", 3))
+
+# Microsoft Graph endpoint; point at benchmarks/mock_server.py for offline runs
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.microsoft.com/v1.0")
+
+# Shared HTTP transport (see http_transport.py)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", 0.5))
+
+# Local per-tenant directory cache (see directory_cache.py)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".azure_migration_app"))
+
+# Interactive sign-ins are kept in an encrypted token cache (see credential_store.py).
+# Where the OS offers no encryption (Linux without a keyring) the cache is only
+# used if unencrypted storage is allowed here.
+TOKEN_CACHE_NAME = os.getenv("TOKEN_CACHE_NAME", "azure_migration_app")
+TOKEN_CACHE_ALLOW_UNENCRYPTED = os.getenv("TOKEN_CACHE_ALLOW_UNENCRYPTED", "false").lower() in ("1", "true", "yes")
+
+# Adaptive concurrency for bulk Graph work (see migration_executor.py)
+MIGRATION_INITIAL_CONCURRENCY = int(os.getenv("MIGRATION_INITIAL_CONCURRENCY", 4))
+MIGRATION_MAX_CONCURRENCY = int(os.getenv("MIGRATION_MAX_CONCURRENCY", 16))
+MIGRATION_TARGET_LATENCY = float(os.getenv("MIGRATION_TARGET_LATENCY", 5))
+MIGRATION_MAX_ATTEMPTS = int(os.getenv("MIGRATION_MAX_ATTEMPTS", 5))
+
+# OneDrive file migration (see file_migration.py). Upload chunks are rounded
+# down to a multiple of 320 KiB as Graph requires; a limit of 0 means unlimited.
+FILE_CHUNK_SIZE = int(os.getenv("FILE_CHUNK_SIZE", 5 * 1024 * 1024))
+FILE_PREFETCH_CHUNKS = int(os.getenv("FILE_PREFETCH_CHUNKS", 2))
+FILE_MIGRATION_WORKERS = int(os.getenv("FILE_MIGRATION_WORKERS", 4))
+FILE_TRANSFER_CONCURRENCY = int(os.getenv("FILE_TRANSFER_CONCURRENCY", 8))
+FILE_BANDWIDTH_LIMIT_MBPS = float(os.getenv("FILE_BANDWIDTH_LIMIT_MBPS", 0))
+FILE_MAX_ATTEMPTS = int(os.getenv("FILE_MAX_ATTEMPTS", 5))
+
+# Parallel tenant-pair migrations (see tenant_orchestrator.py), one process per
+# job up to this many. Workers mostly wait on Graph, so this may exceed the
+# number of CPU cores.
+ORCHESTRATOR_MAX_PROCESSES = int(os.getenv("ORCHESTRATOR_MAX_PROCESSES", 8))
+
+# SolarWinds Service Desk (see solarwinds_api.py)
+SOLARWINDS_API_URL = os.getenv("SOLARWINDS_API_URL", "https://api.solarwinds.com/v1")
+SOLARWINDS_API_TOKEN = os.getenv("SOLARWINDS_API_TOKEN")
+SOLARWINDS_WRITEBACK_WORKERS = int(os.getenv("SOLARWINDS_WRITEBACK_WORKERS", 4))
@@ -0,0 +1,120 @@
+import logging
+import os
+import time
+from azure.identity import (AuthenticationRecord, AuthenticationRequiredError, InteractiveBrowserCredential,
+                            TokenCachePersistenceOptions)
+import config
+from token_manager import GRAPH_SCOPE, extract_tenant_id, get_token_manager, release_token_managers
+
+# Interactive sign-ins are remembered across sessions. Tokens live in the
+# encrypted MSAL cache shared by all credentials (keyed there by tenant and
+# account); each profile ("source", "destination", ...) only stores the
+# AuthenticationRecord that says which account to take from it.
+
+
+def record_path(profile):
+    return os.path.join(config.CACHE_DIR, "accounts", f"{profile}.json")
+
+
+def load_record(profile):
+    try:
+        with open(record_path(profile), encoding="utf-8") as record_file:
+            return AuthenticationRecord.deserialize(record_file.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Failed to read saved account for {profile}: {e}")
+        return None
+
+
+def save_record(profile, record):
+    path = record_path(profile)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as record_file:
+        record_file.write(record.serialize())
+    os.replace(temporary_path, path)
+
+
+def has_saved_account(profile):
+    return os.path.exists(record_path(profile))
+
+
+def forget_account(profile):
+    try:
+        os.remove(record_path(profile))
+    except FileNotFoundError:
+        pass
+
+
+def persistence_options():
+    return TokenCachePersistenceOptions(name=config.TOKEN_CACHE_NAME,
+                                        allow_unencrypted_storage=config.TOKEN_CACHE_ALLOW_UNENCRYPTED)
+
+
+def session(credential):
+    # The Graph token is needed anyway; the tenant id is read from it
+    return credential, extract_tenant_id(get_token_manager(credential).get_token())
+
+
+def cached_sign_in(profile):
+    """(credential, tenant_id) from the token cache, or None if the account must sign in again."""
+    record = load_record(profile)
+    if record is None:
+        return None
+    started = time.perf_counter()
+    # Probe without a browser fallback first, so an expired sign-in is
+    # reported instead of opening a login window
+    probe = InteractiveBrowserCredential(tenant_id=record.tenant_id, authentication_record=record,
+                                         cache_persistence_options=persistence_options(),
+                                         disable_automatic_authentication=True)
+    try:
+        probe.get_token(GRAPH_SCOPE)
+    except AuthenticationRequiredError:
+        logging.info(f"Saved sign-in for {profile} ({record.username}) has expired")
+        return None
+    except Exception as e:
+        logging.warning(f"Failed to reuse saved sign-in for {profile}: {e}")
+        return None
+    # The session credential may fall back to the browser when the refresh
+    # token runs out mid-session
+    credential = InteractiveBrowserCredential(tenant_id=record.tenant_id, authentication_record=record,
+                                              cache_persistence_options=persistence_options())
+    try:
+        result = session(credential)
+    except Exception:
+        release_token_managers(credential)
+        raise
+    logging.info(f"Restored sign-in for {profile} ({record.username}) in {time.perf_counter() - started:.2f}s")
+    return result
+
+
+def interactive_sign_in(profile):
+    try:
+        credential = InteractiveBrowserCredential(cache_persistence_options=persistence_options())
+        record = credential.authenticate(scopes=[GRAPH_SCOPE])
+    except ValueError as e:
+        # No encrypted storage on this machine and unencrypted storage not allowed
+        logging.warning(f"Token cache unavailable, this sign-in will not be remembered: {e}")
+        credential = InteractiveBrowserCredential()
+        credential.authenticate(scopes=[GRAPH_SCOPE])
+        return session(credential)
+    try:
+        save_record(profile, record)
+    except Exception as e:
+        logging.error(f"Failed to save account for {profile}: {e}")
+    return session(credential)
+
+
+def sign_in(profile, interactive=True):
+    """Returns (credential, tenant_id) for profile.
+
+    A saved account is reused silently from the token cache. Otherwise the
+    browser login runs, or None is returned when interactive is False. Call
+    forget_account() first to switch accounts. Blocks, so call it from a
+    worker.
+    """
+    result = cached_sign_in(profile)
+    if result is not None or not interactive:
+        return result
+    return interactive_sign_in(profile)
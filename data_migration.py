@@ -1,21 +1,38 @@
 import logging
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QComboBox, QListWidget, QListWidgetItem, QLabel
-from PyQt5.QtCore import Qt
-from azure.identity import InteractiveBrowserCredential
-import jwt
-import requests
-from email.mime.text import MIMEText
-import smtplib
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QComboBox, QLabel, QCheckBox
+import credential_store
+from data_selection import DataListingModule
+from file_migration import FileMigrator
+from list_models import CompactListModel, filter_edit, selected_payloads
+from membership_migration import MembershipMigrator
+from migration_core import TenantService
+from migration_journal import TICKET_UPDATED, MigrationJournal, migrated_accounts
+from migration_planner import MigrationPlanner
+from notifications import account_email_body, get_dispatcher, notify_account_created
+from source_cleanup import SourceCleanup, open_deletion_record
+from source_enumerator import FILES, GROUPS, USERS, SourceEnumerator, user_data_from_payload
+from ticket_writeback import account_created_note, get_ticket_writeback, guest_invited_note, note_ticket
+from token_manager import extract_tenant_id
+from workers import JobRunner
 
 
 class DataMigrationApp(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         logging.debug('Initializing DataMigrationApp...')
+        self.job_runner = JobRunner()
+        self.active_job = None
+        self.active_unit = "users"  # What the active job's progress counts
+        self.listing_job = None
+        self.listing_kind = None
+        self.listing_search = ''
+        self.listing_owners = {}  # Source user id -> user data, for the Files listing
         self.initUI()
         self.credential_source = None
         self.credential_destination = None
-        self.groups = []
+        self.source = None
+        self.destination = None
+        self.restore_sessions()
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -34,15 +51,23 @@ class DataMigrationApp(QWidget):
         self.authenticate_destination_button.clicked.connect(self.authenticate_destination_tenant)
         layout.addWidget(self.authenticate_destination_button)
 
+        self.group_model = CompactListModel(self)
+        self.group_filter = filter_edit(self.group_model, 'Filter groups...')
+        layout.addWidget(self.group_filter)
+
         self.domain_selector = QComboBox()
+        self.domain_selector.setModel(self.group_model)
         layout.addWidget(self.domain_selector)
 
         self.fetch_groups_button = QPushButton('Fetch Groups')
         self.fetch_groups_button.clicked.connect(self.fetch_groups)
         layout.addWidget(self.fetch_groups_button)
 
-        self.user_list = QListWidget()
-        layout.addWidget(self.user_list)
+        # Users/Groups/Files of the source tenant, streamed in as the list is scrolled
+        self.data_listing = DataListingModule(self)
+        self.user_model = self.data_listing.item_model
+        self.user_list = self.data_listing.item_list
+        layout.addWidget(self.data_listing)
 
         self.create_user_button = QPushButton('Create User')
         self.create_user_button.clicked.connect(self.create_user)
@@ -52,245 +77,517 @@ class DataMigrationApp(QWidget):
         self.create_guest_button.clicked.connect(self.create_guest)
         layout.addWidget(self.create_guest_button)
 
+        self.migrate_memberships_button = QPushButton('Migrate Group Memberships')
+        self.migrate_memberships_button.clicked.connect(self.migrate_group_memberships)
+        layout.addWidget(self.migrate_memberships_button)
+
+        self.migrate_files_button = QPushButton('Migrate Files')
+        self.migrate_files_button.clicked.connect(self.migrate_selected_files)
+        layout.addWidget(self.migrate_files_button)
+
+        self.resume_checkbox = QCheckBox('Resume Previous Run (skip completed steps)')
+        layout.addWidget(self.resume_checkbox)
+
+        self.delete_checkbox = QCheckBox('Delete Users from Source Tenant After Migration')
+        layout.addWidget(self.delete_checkbox)
+
+        self.restore_button = QPushButton('Restore Users Deleted from Source')
+        self.restore_button.clicked.connect(self.restore_source_users)
+        layout.addWidget(self.restore_button)
+
+        self.progress_label = QLabel('Idle')
+        layout.addWidget(self.progress_label)
+
+        self.item_status_label = QLabel('')
+        layout.addWidget(self.item_status_label)
+
+        self.pause_button = QPushButton('Pause')
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause)
+        layout.addWidget(self.pause_button)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_job)
+        layout.addWidget(self.cancel_button)
+
         self.setLayout(layout)
         self.setWindowTitle('Azure Tenant Migration Tool')
 
     def cleanup_resources(self):
         logging.debug('Cleaning up DataMigrationApp resources...')
         # Ensure any external resources are properly closed
+        self.job_runner.cancel_all()
+        self.close_source()
+        self.close_destination()
+        self.group_model.clear()
+
+    def close_source(self):
+        if self.source is not None:
+            self.source.close()
+            self.source = None
         self.credential_source = None
+
+    def close_destination(self):
+        if self.destination is not None:
+            self.destination.close()
+            self.destination = None
         self.credential_destination = None
-        self.groups = []
 
-    def __del__(self):
-        logging.debug('Deleting DataMigrationApp...')
-        self.cleanup_resources()
+    def restore_sessions(self):
+        # Tenants signed in to before come back from the token cache, without a browser
+        for profile, label, name, on_result in (
+                ("source", self.source_tenant_label, 'Source Tenant', self.on_source_authenticated),
+                ("destination", self.destination_tenant_label, 'Destination Tenant', self.on_destination_authenticated)):
+            if credential_store.has_saved_account(profile):
+                label.setText(f'{name}: Restoring session...')
+                self.job_runner.start(self.sign_in, profile, False, False, on_result=on_result,
+                                      on_error=lambda error, profile=profile: self.on_restore_failed(profile, error))
+
+    def on_restore_failed(self, profile, error):
+        logging.warning(f"Failed to restore {profile} session: {error}")
+        if profile == "source":
+            self.on_source_authenticated(None)
+        else:
+            self.on_destination_authenticated(None)
 
     def authenticate_source_tenant(self):
-        try:
-            self.credential_source = InteractiveBrowserCredential()
-            token = self.credential_source.get_token("https://management.azure.com/.default")
-            tenant_id = self.extract_tenant_id(token.token)
-            self.source_tenant_label.setText(f'Source Tenant: {tenant_id}')
-            logging.info(f"Authenticated Source Tenant: {tenant_id}")
-        except Exception as e:
-            logging.error(f"Failed to authenticate source tenant: {e}")
+        # Signing in again while signed in switches to another account
+        switch = self.source is not None
+        self.close_source()
+        self.source_tenant_label.setText('Source Tenant: Authenticating...')
+        self.job_runner.start(self.sign_in, "source", switch, on_result=self.on_source_authenticated,
+                              on_error=self.on_source_authentication_failed)
+
+    def on_source_authenticated(self, result):
+        if result is None:
+            self.source_tenant_label.setText('Source Tenant: Not Authenticated')
+            return
+        self.credential_source, tenant_id = result
+        self.source = TenantService(self.credential_source, tenant_id, use_cache=False)
+        self.source_tenant_label.setText(f'Source Tenant: {tenant_id}')
+        logging.info(f"Authenticated Source Tenant: {tenant_id}")
+
+    def on_source_authentication_failed(self, error):
+        logging.error(f"Failed to authenticate source tenant: {error}")
+        self.source_tenant_label.setText('Source Tenant: Not Authenticated')
 
     def authenticate_destination_tenant(self):
+        switch = self.destination is not None
+        self.close_destination()
+        self.destination_tenant_label.setText('Destination Tenant: Authenticating...')
+        self.job_runner.start(self.sign_in, "destination", switch, on_result=self.on_destination_authenticated,
+                              on_error=self.on_destination_authentication_failed)
+
+    def on_destination_authenticated(self, result):
+        if result is None:
+            self.destination_tenant_label.setText('Destination Tenant: Not Authenticated')
+            return
+        self.credential_destination, tenant_id = result
+        self.destination = TenantService(self.credential_destination, tenant_id)
+        self.destination_tenant_label.setText(f'Destination Tenant: {tenant_id}')
+        logging.info(f"Authenticated Destination Tenant: {tenant_id}")
+        self.job_runner.start(self.sync_directory_cache)
+
+    def on_destination_authentication_failed(self, error):
+        logging.error(f"Failed to authenticate destination tenant: {error}")
+        self.destination_tenant_label.setText('Destination Tenant: Not Authenticated')
+
+    def sign_in(self, job, profile, switch=False, interactive=True):
+        # Runs on a worker thread: the browser sign-in blocks until completed
+        if switch:
+            credential_store.forget_account(profile)
+        return credential_store.sign_in(profile, interactive)
+
+    def sync_directory_cache(self, job):
         try:
-            self.credential_destination = InteractiveBrowserCredential()
-            token = self.credential_destination.get_token("https://management.azure.com/.default")
-            tenant_id = self.extract_tenant_id(token.token)
-            self.destination_tenant_label.setText(f'Destination Tenant: {tenant_id}')
-            logging.info(f"Authenticated Destination Tenant: {tenant_id}")
+            self.destination.sync_directory()
         except Exception as e:
-            logging.error(f"Failed to authenticate destination tenant: {e}")
+            logging.error(f"Failed to sync directory cache: {e}")
 
     def extract_tenant_id(self, token):
-        try:
-            decoded = jwt.decode(token, options={"verify_signature": False})
-            return decoded['tid']
-        except Exception as e:
-            logging.error(f"Failed to extract tenant ID: {e}")
-            return None
+        return extract_tenant_id(token)
+
+    def graph_headers(self):
+        return self.destination.graph_headers()
 
     def fetch_groups(self):
-        try:
-            token = self.credential_destination.get_token("https://graph.microsoft.com/.default").token
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            url = "https://graph.microsoft.com/v1.0/groups"
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            groups_data = response.json().get('value', [])
-            self.populate_group_selector(groups_data)
-        except Exception as e:
-            logging.error(f"Failed to fetch groups: {e}")
+        if self.destination is None:
+            logging.error("Destination tenant not authenticated.")
+            return
+        self.group_model.clear()
+        self.fetch_groups_button.setEnabled(False)
+        self.job_runner.start(self.load_groups, on_partial=self.on_groups_loaded,
+                              on_result=lambda _: logging.info(f"Fetched {len(self.group_model)} groups."),
+                              on_error=lambda error: logging.error(f"Failed to fetch groups: {error}"),
+                              on_finished=lambda: self.fetch_groups_button.setEnabled(True))
+
+    def load_groups(self, job):
+        # Pages are handed to the GUI thread as (replace, groups) while they arrive
+        self.destination.load_groups(lambda replace, groups: job.emit_partial((replace, groups)),
+                                     checkpoint=job.checkpoint)
+
+    def on_groups_loaded(self, update):
+        replace, groups_data = update
+        if replace:
+            self.group_model.clear()
+        self.populate_group_selector(group for group in groups_data if '@removed' not in group)
 
     def populate_group_selector(self, groups_data):
-        self.domain_selector.clear()
-        for group in groups_data:
-            self.domain_selector.addItem(group['displayName'], group['id'])
+        self.group_model.append_rows((group['id'], group['displayName']) for group in groups_data)
 
     def create_user(self):
         try:
-            selected_items = self.user_list.selectedItems()
-            if not selected_items:
+            users = self.selected_users()
+            if not users:
                 logging.info("No user selected.")
                 return
 
-            for item in selected_items:
-                user_data = item.data(Qt.UserRole)
-                self.create_user_in_azure(user_data)
-                # Logic for updating ticket and sending email here
+            delete_source = self.delete_checkbox.isChecked()
+            if delete_source and self.source is None:
+                logging.error("Source tenant not authenticated; cannot delete migrated users.")
+                return
+            self.start_bulk_job(self.migrate_users, users, self.domain_selector.currentData(),
+                                self.resume_checkbox.isChecked(), delete_source)
         except Exception as e:
             logging.error(f"Failed to create user: {e}")
 
-    def create_user_in_azure(self, user_data):
+    def selected_users(self):
+        if self.listing_kind != USERS:
+            return []
+        return [user_data_from_payload(payload) for payload in selected_payloads(self.user_list)]
+
+    def list_data(self, item):
+        self.start_listing(item.text())
+
+    def filter_data(self, text):
+        # The listing only holds what has been scrolled through, so search on the server
+        self.listing_search = text.strip()
+        if self.listing_kind is not None:
+            self.start_listing(self.listing_kind)
+
+    def start_listing(self, kind):
+        if self.source is None:
+            logging.error("Source tenant not authenticated.")
+            return
+        owner_ids = []
+        if kind == FILES:
+            if self.listing_kind == USERS:
+                self.listing_owners = {payload[0]: user_data_from_payload(payload)
+                                       for payload in selected_payloads(self.user_list)}
+            owner_ids = list(self.listing_owners) if self.listing_kind in (USERS, FILES) else []
+            if not owner_ids:
+                logging.info("Select the users whose files should be listed.")
+                return
+        if self.listing_job is not None:
+            self.listing_job.cancel()
+        self.listing_kind = kind
+        self.user_model.clear()
+        self.user_model.more_available = True
+        self.listing_job = self.job_runner.start(self.stream_listing, kind, self.listing_search, owner_ids,
+                                                 on_partial=self.on_listing_page,
+                                                 on_error=lambda error: self.on_listing_failed(kind, error))
+        self.user_model.on_more = self.listing_job.resume
+
+    def stream_listing(self, job, kind, search, owner_ids):
+        # Runs on a worker. After each page the job pauses itself until the
+        # list is scrolled near its end and the model asks for more.
+        enumerator = SourceEnumerator(self.source.graph_headers)
+        for rows in enumerator.pages(kind, search or None, owner_ids):
+            job.pause()
+            job.emit_partial((job, rows))
+            job.checkpoint()
+        job.emit_partial((job, None))
+
+    def on_listing_page(self, update):
+        job, rows = update
+        if job is not self.listing_job:
+            return
+        if rows is None:
+            self.user_model.more_available = False
+            self.listing_job = None
+            return
+        self.user_model.append_rows(rows)
+        if self.user_model.rowCount() < self.user_model.batch_size and self.user_model.total() == self.user_model.rowCount():
+            # Page was filtered down to less than a screen; keep reading
+            job.resume()
+
+    def on_listing_failed(self, kind, error):
+        logging.error(f"Failed to list {kind}: {error}")
+        self.user_model.more_available = False
+
+    def migrate_selected_items(self):
+        self.create_user()
+
+    def migrate_users(self, job, users, group_id, resume=False, delete_source=False):
+        journal = MigrationJournal.for_tenant(self.destination.tenant_id, resume)
+        dispatcher = get_dispatcher()
+        users_by_upn = {self.build_user_payload(user_data)['userPrincipalName']: user_data for user_data in users}
+
+        writeback = get_ticket_writeback()
+
+        def on_user(upn, status):
+            job.report_item(upn, status)
+            # Emails and ticket notes are only queued here and sent in the background
+            if status in ("created", "skipped"):
+                user_data = users_by_upn[upn]
+                if not journal.is_done(upn, TICKET_UPDATED):
+                    note_ticket(user_data, upn, account_created_note(upn, group_id), journal, writeback)
+                notify_account_created(user_data, upn, journal, dispatcher,
+                                       on_sent=lambda to_email: note_ticket(
+                                           user_data, upn, f"Account details emailed to {to_email}",
+                                           writeback=writeback))
+
+        try:
+            # Existing accounts and conflicts are found up front instead of
+            # failing one create at a time
+            planner = MigrationPlanner(self.destination)
+            plan = planner.plan_users(users, group_id, journal)
+            logging.info(f"Migration plan: {plan.summary()}")
+            job.report_item("Plan", plan.summary())
+            planner.execute(plan, checkpoint=job.checkpoint, on_user=on_user, on_progress=job.report_progress,
+                            journal=journal)
+            if delete_source:
+                self.delete_source_users(job, plan, journal)
+        finally:
+            # Queued emails and notes record themselves in the journal, so drain
+            # them first; sent emails add ticket notes, so emails go first
+            dispatcher.flush()
+            if writeback is not None:
+                writeback.flush()
+            journal.close()
+
+    def delete_source_users(self, job, plan, journal):
+        # Only users the plan migrated are deleted; see SourceCleanup
+        record = open_deletion_record(self.source.tenant_id)
+        try:
+            stats = SourceCleanup(self.source, self.destination, record).delete(
+                plan, journal, checkpoint=job.checkpoint, on_user=job.report_item, on_progress=job.report_progress)
+            logging.info(f"Source cleanup: {stats['deleted']} deleted, {stats['kept']} kept, "
+                         f"{stats['failed']} failed")
+            return stats
+        finally:
+            record.close()
+
+    def restore_source_users(self):
         try:
-            token = self.credential_destination.get_token("https://graph.microsoft.com/.default").token
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-
-            user_payload = {
-                "accountEnabled": True,
-                "displayName": f"{user_data['firstName']} {user_data['lastName']}",
-                "mailNickname": f"{user_data['firstName']}.{user_data['lastName']}".lower(),
-                "userPrincipalName": f"{user_data['firstName']}.{user_data['lastName']}@yourdomain.com".lower(),
-                "passwordProfile": {
-                    "forceChangePasswordNextSignIn": True,
-                    "password": "TempP@ssword123"
-                },
-                "department": user_data.get("department", "N/A"),
-                "jobTitle": user_data.get("jobTitle", "N/A"),
-                "companyName": user_data.get("companyName", "N/A")
-            }
-
-            create_user_url = "https://graph.microsoft.com/v1.0/users"
-            response = requests.post(create_user_url, headers=headers, json=user_payload)
-            response.raise_for_status()
-            logging.info(f"User created: {user_data['firstName']} {user_data['lastName']}")
-
-            self.add_user_to_group(user_data)
+            if self.source is None or self.destination is None:
+                logging.error("Source and destination tenants must be authenticated.")
+                return
+            self.start_bulk_job(self.restore_deleted_users)
         except Exception as e:
-            logging.error(f"Failed to create user in Azure AD: {e}")
+            logging.error(f"Failed to restore source users: {e}")
 
-    def add_user_to_group(self, user_data):
+    def restore_deleted_users(self, job):
+        record = open_deletion_record(self.source.tenant_id)
         try:
-            token = self.credential_destination.get_token("https://graph.microsoft.com/.default").token
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-
+            stats = SourceCleanup(self.source, self.destination, record).restore(
+                checkpoint=job.checkpoint, on_user=job.report_item, on_progress=job.report_progress)
+            logging.info(f"Restored {stats['restored']} source users, {stats['failed']} failed")
+            return stats
+        finally:
+            record.close()
+
+    def start_bulk_job(self, fn, *args, unit="users"):
+        # unit names what the job's progress counts
+        if self.destination is None:
+            logging.error("Destination tenant not authenticated.")
+            return
+        if self.active_job is not None:
+            logging.info("A migration job is already running.")
+            return
+        self.progress_label.setText('Starting...')
+        self.active_unit = unit
+        self.active_job = self.job_runner.start(fn, *args, on_progress=self.on_job_progress,
+                                                on_item=self.on_item_status,
+                                                on_finished=self.on_job_finished)
+        self.pause_button.setEnabled(True)
+        self.cancel_button.setEnabled(True)
+
+    def toggle_pause(self):
+        if self.active_job is None:
+            return
+        if self.active_job.paused:
+            self.active_job.resume()
+            self.pause_button.setText('Pause')
+        else:
+            self.active_job.pause()
+            self.pause_button.setText('Resume')
+            self.progress_label.setText(f'{self.progress_label.text()} - paused')
+
+    def cancel_job(self):
+        if self.active_job is not None:
+            self.active_job.cancel()
+            self.progress_label.setText('Cancelling...')
+
+    def on_job_progress(self, done, total, rate):
+        self.progress_label.setText(f'{done}/{total} {self.active_unit} ({rate:.1f}/s)')
+
+    def on_item_status(self, key, status):
+        self.item_status_label.setText(f'{key}: {status}')
+
+    def on_job_finished(self):
+        self.active_job = None
+        self.pause_button.setText('Pause')
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+        self.progress_label.setText(f'Finished - {self.progress_label.text()}')
+
+    def build_user_payload(self, user_data):
+        return self.destination.build_user_payload(user_data)
+
+    def create_users_in_azure(self, users, group_id=None, job=None, journal=None):
+        if group_id is None and job is None:
             group_id = self.domain_selector.currentData()
-            user_id = self.get_user_id(user_data['userPrincipalName'])
-            add_to_group_url = f"https://graph.microsoft.com/v1.0/groups/{group_id}/members/$ref"
-            add_to_group_payload = {
-                "@odata.id": f"https://graph.microsoft.com/v1.0/users/{user_id}"
-            }
-            response = requests.post(add_to_group_url, headers=headers, json=add_to_group_payload)
-            response.raise_for_status()
-            logging.info(f"User added to group: {user_data['firstName']} {user_data['lastName']}")
-        except Exception as e:
-            logging.error(f"Failed to add user to group: {e}")
+        if job is None:
+            return self.destination.create_users(users, group_id, journal=journal)
+        return self.destination.create_users(users, group_id, checkpoint=job.checkpoint, on_user=job.report_item,
+                                             on_progress=job.report_progress, journal=journal)
 
-    def get_user_id(self, user_principal_name):
+    def create_user_in_azure(self, user_data):
         try:
-            token = self.credential_destination.get_token("https://graph.microsoft.com/.default").token
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            url = f"https://graph.microsoft.com/v1.0/users/{user_principal_name}"
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            user_info = response.json()
-            return user_info['id']
+            return self.create_users_in_azure([user_data])
         except Exception as e:
-            logging.error(f"Failed to get user ID: {e}")
-            return None
+            logging.error(f"Failed to create user in Azure AD: {e}")
+
+    def add_user_to_group(self, user_data, group_id=None, user_id=None):
+        if group_id is None:
+            group_id = self.domain_selector.currentData()
+        self.destination.add_user_to_group(user_data, group_id, user_id)
+
+    def get_user_id(self, user_principal_name):
+        return self.destination.get_user_id(user_principal_name)
 
     def create_guest(self):
         try:
-            selected_items = self.user_list.selectedItems()
-            if not selected_items:
+            users = self.selected_users()
+            if not users:
                 logging.info("No guest selected.")
                 return
 
-            for item in selected_items:
-                user_data = item.data(Qt.UserRole)
-                self.create_guest_in_azure(user_data)
-                # Logic for updating ticket here
+            self.start_bulk_job(self.invite_guests, users, self.domain_selector.currentData(),
+                                self.resume_checkbox.isChecked(), unit="guests")
         except Exception as e:
             logging.error(f"Failed to create guest: {e}")
 
-    def create_guest_in_azure(self, user_data):
-        try:
-            token = self.credential_destination.get_token("https://graph.microsoft.com/.default").token
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-
-            guest_payload = {
-                "invitedUserDisplayName": f"{user_data['firstName']} {user_data['lastName']}",
-                "invitedUserEmailAddress": f"{user_data['email']}",
-                "inviteRedirectUrl": "https://myapps.microsoft.com",
-                "sendInvitationMessage": True
-            }
-
-            create_guest_url = "https://graph.microsoft.com/v1.0/invitations"
-            response = requests.post(create_guest_url, headers=headers, json=guest_payload)
-            response.raise_for_status()
-            logging.info(f"Guest created: {user_data['firstName']} {user_data['lastName']}")
-
-            self.add_guest_to_group(user_data)
-        except Exception as e:
-            logging.error(f"Failed to create guest in Azure AD: {e}")
+    def invite_guests(self, job, users, group_id, resume=False):
+        journal = MigrationJournal.for_tenant(self.destination.tenant_id, resume, stage="guests")
+        users_by_email = {user_data['email']: user_data for user_data in users}
+        writeback = get_ticket_writeback()
+
+        def on_user(email, status):
+            job.report_item(email, status)
+            # Ticket notes are only queued here and written in the background
+            if status in ("invited", "added to group", "skipped") and not journal.is_done(email, TICKET_UPDATED):
+                note_ticket(users_by_email[email], email, guest_invited_note(email, group_id), journal, writeback)
 
-    def add_guest_to_group(self, user_data):
         try:
-            token = self.credential_destination.get_token("https://graph.microsoft.com/.default").token
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+            planner = MigrationPlanner(self.destination)
+            plan = planner.plan_guests(users, group_id, journal)
+            logging.info(f"Invitation plan: {plan.summary()}")
+            job.report_item("Plan", plan.summary())
+            return planner.execute(plan, checkpoint=job.checkpoint, on_user=on_user,
+                                   on_progress=job.report_progress, journal=journal)
+        finally:
+            # Queued notes record themselves in the journal
+            if writeback is not None:
+                writeback.flush()
+            journal.close()
+
+    def create_guest_in_azure(self, user_data, group_id=None):
+        if group_id is None:
+            group_id = self.domain_selector.currentData()
+        return self.destination.create_guest(user_data, group_id)
 
+    def add_guest_to_group(self, user_data, group_id=None, guest_user_id=None):
+        if group_id is None:
             group_id = self.domain_selector.currentData()
-            guest_user_id = self.get_user_id(user_data['email'])
+        self.destination.add_guest_to_group(user_data, group_id, guest_user_id)
 
-            if not guest_user_id:
-                logging.error(f"Guest user ID not found for {user_data['email']}")
+    def migrate_group_memberships(self):
+        try:
+            if self.source is None:
+                logging.error("Source tenant not authenticated.")
                 return
-
-            add_to_group_url = f"https://graph.microsoft.com/v1.0/groups/{group_id}/members/$ref"
-            add_to_group_payload = {
-                "@odata.id": f"https://graph.microsoft.com/v1.0/users/{guest_user_id}"
-            }
-            response = requests.post(add_to_group_url, headers=headers, json=add_to_group_payload)
-            response.raise_for_status()
-            logging.info(f"Guest added to group: {user_data['firstName']} {user_data['lastName']}")
+            # The groups selected in the Groups listing, or every source group
+            group_ids = None
+            if self.listing_kind == GROUPS:
+                group_ids = [payload[0] for payload in selected_payloads(self.user_list)] or None
+            self.start_bulk_job(self.migrate_memberships, group_ids, unit="memberships")
         except Exception as e:
-            logging.error(f"Failed to add guest to group: {e}")
-
-    def send_email(self, user_data, subject, body, to_email):
+            logging.error(f"Failed to migrate group memberships: {e}")
+
+    def migrate_memberships(self, job, group_ids):
+        migrator = MembershipMigrator(self.source, self.destination, self.migrated_accounts())
+        stats = migrator.migrate(group_ids, checkpoint=job.checkpoint, on_group=job.report_item,
+                                 on_progress=job.report_progress)
+        logging.info(f"Group memberships: {stats['added']} added, {stats['present']} already present, "
+                     f"{stats['unresolved']} without a destination user, {stats['failed']} failed "
+                     f"across {stats['groups']} groups ({stats['failed_groups']} could not be read)")
+        return stats
+
+    def migrate_selected_files(self):
+        # The selected files of the Files listing, or every file of the selected users
         try:
-            smtp_server = "smtp.office365.com"  # Microsoft 365 SMTP server
-            smtp_port = 587  # Microsoft 365 SMTP port
-            smtp_username = "yourusername@yourdomain.com"  # Your Microsoft 365 email
-            smtp_password = "yourpassword"  # Your Microsoft 365 email password
-            from_email = smtp_username  # Same as smtp_username for Microsoft 365
-
-            msg = MIMEText(body)
-            msg['Subject'] = subject
-            msg['From'] = from_email
-            msg['To'] = to_email
-
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(smtp_username, smtp_password)
-                server.sendmail(from_email, [to_email], msg.as_string())
-
-            logging.info(f"Sent email to {user_data['firstName']} {user_data['lastName']}")
+            if self.source is None:
+                logging.error("Source tenant not authenticated.")
+                return
+            if self.destination is None:
+                logging.error("Destination tenant not authenticated.")
+                return
+            files = None
+            if self.listing_kind == FILES:
+                files = selected_payloads(self.user_list)
+                users = self.listing_owners
+            else:
+                users = {user_data['sourceId']: user_data for user_data in self.selected_users()}
+            if not users or files == []:
+                logging.info("Select users or files to migrate.")
+                return
+            self.start_bulk_job(self.migrate_files, files, dict(users), self.resume_checkbox.isChecked(),
+                                unit="files")
         except Exception as e:
-            logging.error(f"Failed to send email: {e}")
+            logging.error(f"Failed to migrate files: {e}")
 
-    def generate_email_body(self, user_data):
-        return f"""
-        Dear {user_data['firstName']} {user_data['lastName']},
-
-        Your account has been created successfully. Here are your credentials:
-
-        Username: {user_data['firstName']}.{user_data['lastName']}@yourdomain.com
-        Temporary Password: TempP@ssword123
+    def migrated_accounts(self):
+        # Source -> destination user ids the user and guest migrations journaled
+        journals = [MigrationJournal.for_tenant(self.destination.tenant_id, stage=stage) for stage in (None, "guests")]
+        try:
+            return migrated_accounts(*journals)
+        finally:
+            for journal in journals:
+                journal.close()
+
+    def migrate_files(self, job, files, users, resume=False):
+        # Each owner's files go to the OneDrive of the account the user
+        # migration created or matched for that very source user
+        accounts = self.migrated_accounts()
+        owners = {}
+        for owner_id, user_data in users.items():
+            if owner_id in accounts:
+                owners[owner_id] = accounts[owner_id]
+            else:
+                name = f"{user_data['firstName']} {user_data['lastName']}"
+                logging.warning(f"Not copying files of {name}: no destination account migrated from this user")
+                job.report_item(name, "skipped: not migrated")
+        if files is not None:
+            files = [item for item in files if item[0] in owners]
+        if not owners:
+            return {}
+        journal = MigrationJournal.for_tenant(self.destination.tenant_id, resume, stage="files")
+        try:
+            migrator = FileMigrator(self.source, self.destination, journal)
+            if files is None:
+                return migrator.migrate_drives(owners, checkpoint=job.checkpoint, on_file=job.report_item,
+                                               on_user=job.report_item, on_progress=job.report_progress)
+            return migrator.migrate(files, owners, checkpoint=job.checkpoint, on_file=job.report_item,
+                                    on_user=job.report_item, on_progress=job.report_progress)
+        finally:
+            journal.close()
 
-        Please change your password upon first login.
+    def send_email(self, user_data, subject, body, to_email):
+        get_dispatcher().send(to_email, subject, body)
+        logging.info(f"Queued email to {user_data['firstName']} {user_data['lastName']}")
 
-        Regards,
-        IT Team
-        """
+    def generate_email_body(self, user_data):
+        return account_email_body(user_data)
@@ -1,4 +1,5 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QListWidget, QTextEdit, QListWidgetItem, QComboBox, QPushButton, QCheckBox
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QListWidget, QListView, QTextEdit, QComboBox, QPushButton, QCheckBox, QAbstractItemView
+from list_models import CompactListModel, filter_edit
 class DataListingModule(QWidget):
     def __init__(self, parent):
         super().__init__()
@@ -13,7 +14,14 @@ class DataListingModule(QWidget):
         self.data_list.itemClicked.connect(self.parent.list_data)
         layout.addWidget(self.data_list)
 
-        self.item_list = QListWidget()
+        # A parent that streams the listing searches on the server instead
+        self.item_model = CompactListModel(self)
+        layout.addWidget(filter_edit(self.item_model, on_filter=getattr(self.parent, 'filter_data', None)))
+
+        self.item_list = QListView()
+        self.item_list.setModel(self.item_model)
+        self.item_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.item_list.setUniformItemSizes(True)
         layout.addWidget(self.item_list)
 
         self.setLayout(layout)
@@ -27,7 +35,11 @@ class DomainSelectorModule(QWidget):
     def initUI(self):
         layout = QVBoxLayout()
 
+        self.domain_model = CompactListModel(self)
+        layout.addWidget(filter_edit(self.domain_model, 'Filter domains...'))
+
         self.domain_selector = QComboBox()
+        self.domain_selector.setModel(self.domain_model)
         layout.addWidget(self.domain_selector)
 
         self.data_display = QTextEdit()
@@ -0,0 +1,176 @@
+import logging
+import os
+import sqlite3
+import threading
+import config
+from graph_paging import GRAPH_API_URL, MAX_PAGE_SIZE, iter_delta_pages
+
+USER_FIELDS = "id,displayName,userPrincipalName,mail"
+GROUP_FIELDS = "id,displayName,members"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    display_name TEXT,
+    user_principal_name TEXT,
+    mail TEXT
+);
+CREATE INDEX IF NOT EXISTS users_upn ON users (user_principal_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS users_mail ON users (mail COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS groups (
+    id TEXT PRIMARY KEY,
+    display_name TEXT
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    group_id TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    PRIMARY KEY (group_id, member_id)
+);
+CREATE INDEX IF NOT EXISTS memberships_member ON memberships (member_id);
+CREATE TABLE IF NOT EXISTS delta_state (
+    resource TEXT PRIMARY KEY,
+    delta_link TEXT
+);
+"""
+
+
+class DirectoryCache:
+    """Persistent SQLite index of one tenant's users, groups and memberships.
+
+    The first sync of a resource downloads it in full; after that only the
+    changes since the stored deltaLink are fetched.
+    """
+
+    def __init__(self, tenant_id, cache_dir=None):
+        self.tenant_id = tenant_id
+        cache_dir = cache_dir or config.CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"{tenant_id}.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        logging.debug(f"Opened directory cache {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def sync(self, get_headers):
+        return self.sync_users(get_headers) + self.sync_groups(get_headers)
+
+    def sync_users(self, get_headers, on_page=None):
+        return self._sync("users", f"{GRAPH_API_URL}/users/delta", USER_FIELDS,
+                          self._apply_user, get_headers, on_page)
+
+    def sync_groups(self, get_headers, on_page=None):
+        return self._sync("groups", f"{GRAPH_API_URL}/groups/delta", GROUP_FIELDS,
+                          self._apply_group, get_headers, on_page)
+
+    def _sync(self, resource, url, fields, apply, get_headers, on_page):
+        delta_link = self._get_delta_link(resource)
+        try:
+            return self._run_delta(resource, url, fields, apply, get_headers, on_page, delta_link)
+        except Exception as e:
+            if delta_link and getattr(getattr(e, 'response', None), 'status_code', None) == 410:
+                # The delta token expired; Graph requires a full resync
+                logging.warning(f"Delta token for {resource} expired, resyncing {self.tenant_id}")
+                return self._run_delta(resource, url, fields, apply, get_headers, on_page, None)
+            raise
+
+    def _run_delta(self, resource, url, fields, apply, get_headers, on_page, delta_link):
+        full_sync = delta_link is None
+        if full_sync:
+            pages = iter_delta_pages(url, get_headers, {"$select": fields, "$top": MAX_PAGE_SIZE})
+        else:
+            pages = iter_delta_pages(delta_link, get_headers)
+
+        changes = 0
+        first_page = True
+        for page, next_delta_link in pages:
+            with self._lock, self._conn:
+                if full_sync and first_page:
+                    self._clear(resource)
+                for item in page:
+                    apply(item)
+                if next_delta_link:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO delta_state (resource, delta_link) VALUES (?, ?)",
+                        (resource, next_delta_link))
+            first_page = False
+            changes += len(page)
+            if on_page is not None:
+                on_page(page)
+        logging.info(f"Synced {changes} {resource} changes for tenant {self.tenant_id}")
+        return changes
+
+    def _get_delta_link(self, resource):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT delta_link FROM delta_state WHERE resource = ?", (resource,)).fetchone()
+        return row[0] if row else None
+
+    def _clear(self, resource):
+        if resource == "groups":
+            self._conn.execute("DELETE FROM memberships")
+        self._conn.execute(f"DELETE FROM {resource}")
+
+    def _apply_user(self, item):
+        if '@removed' in item:
+            self._conn.execute("DELETE FROM users WHERE id = ?", (item['id'],))
+            self._conn.execute("DELETE FROM memberships WHERE member_id = ?", (item['id'],))
+            return
+        # Delta pages only carry changed properties, so keep known values
+        self._conn.execute(
+            "INSERT INTO users (id, display_name, user_principal_name, mail) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET "
+            "display_name = COALESCE(excluded.display_name, display_name), "
+            "user_principal_name = COALESCE(excluded.user_principal_name, user_principal_name), "
+            "mail = COALESCE(excluded.mail, mail)",
+            (item['id'], item.get('displayName'), item.get('userPrincipalName'), item.get('mail')))
+
+    def _apply_group(self, item):
+        if '@removed' in item:
+            self._conn.execute("DELETE FROM groups WHERE id = ?", (item['id'],))
+            self._conn.execute("DELETE FROM memberships WHERE group_id = ?", (item['id'],))
+            return
+        self._conn.execute(
+            "INSERT INTO groups (id, display_name) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET display_name = COALESCE(excluded.display_name, display_name)",
+            (item['id'], item.get('displayName')))
+        for member in item.get('members@delta', []):
+            if '@removed' in member:
+                self._conn.execute("DELETE FROM memberships WHERE group_id = ? AND member_id = ?",
+                                   (item['id'], member['id']))
+            else:
+                self._conn.execute("INSERT OR IGNORE INTO memberships (group_id, member_id) VALUES (?, ?)",
+                                   (item['id'], member['id']))
+
+    def get_user_id(self, user_principal_name_or_mail):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM users WHERE user_principal_name = ? COLLATE NOCASE "
+                "OR mail = ? COLLATE NOCASE LIMIT 1",
+                (user_principal_name_or_mail, user_principal_name_or_mail)).fetchone()
+        return row[0] if row else None
+
+    def put_user(self, user_id, user_principal_name, mail=None, display_name=None):
+        with self._lock, self._conn:
+            self._apply_user({"id": user_id, "userPrincipalName": user_principal_name,
+                              "mail": mail, "displayName": display_name})
+
+    def groups(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, display_name FROM groups ORDER BY display_name").fetchall()
+        return [{"id": group_id, "displayName": name} for group_id, name in rows]
+
+    def group_member_ids(self, group_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT member_id FROM memberships WHERE group_id = ?", (group_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def add_membership(self, group_id, member_id):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO memberships (group_id, member_id) VALUES (?, ?)",
+                               (group_id, member_id))
@@ -0,0 +1,396 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+from requests import HTTPError
+import config
+import http_transport
+from graph_paging import GRAPH_API_URL
+from http_transport import RETRY_STATUSES, retry_after_seconds
+from metrics import get_metrics
+from migration_journal import FILE_COPIED, FILE_UPLOAD_STARTED
+from quickxor import QuickXorHash
+from source_enumerator import SourceEnumerator
+
+UPLOAD_FRAGMENT = 320 * 1024  # Upload session chunks must be a multiple of this
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024  # Files up to this size go up in a single PUT
+READ_BLOCK = 64 * 1024
+MB = 1024 * 1024
+EXPIRED_URL_STATUSES = (401, 403, 404, 410)  # A pre-authenticated download URL that has run out
+
+
+class TransientError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransferError(Exception):
+    pass
+
+
+class BandwidthLimiter:
+    """Token bucket shared by every transfer; rate in bytes per second, 0 for no limit."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._available = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going into debt and sleeping it off keeps the average at rate
+            self._available -= size
+            wait = -self._available / self.rate if self._available < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class OwnerStats:
+    __slots__ = ('files', 'failed', 'skipped', 'bytes', 'started', 'finished')
+
+    def __init__(self):
+        self.files = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+
+    def rate(self):
+        # MB/s over the time the owner's files were in flight
+        elapsed = (self.finished or time.monotonic()) - (self.started or time.monotonic())
+        return self.bytes / MB / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.files} files, {self.bytes / MB:.1f} MB at {self.rate():.1f} MB/s"
+                f"{f', {self.skipped} already copied' if self.skipped else ''}"
+                f"{f', {self.failed} failed' if self.failed else ''}")
+
+
+def destination_path(parent_path, name):
+    # parentReference.path is "/drive/root:/Folder/Sub", or the part after the colon
+    folder = parent_path.split(':', 1)[-1] if ':' in parent_path else parent_path
+    return f"{folder.strip('/')}/{name}".lstrip('/')
+
+
+class FileMigrator:
+    """Copies OneDrive files from source users to destination users.
+
+    Each file is downloaded with ranged GETs on its pre-authenticated download
+    URL and uploaded through a Graph upload session, one chunk at a time, so
+    no more than a few chunks per file are ever held in memory. Upload
+    sessions take chunks strictly in order, so the parallelism is in the
+    downloads, which run FILE_PREFETCH_CHUNKS ahead of the upload, and in
+    copying several files at once. All transfers share one concurrency limit
+    and one bandwidth budget.
+
+    With a journal, a started upload session is recorded and an interrupted
+    copy resumes from the next byte the session expects; finished files are
+    skipped. Copies are checked against the source's quickXorHash.
+    """
+
+    def __init__(self, source, destination, journal=None, chunk_size=None, prefetch=None, workers=None,
+                 concurrency=None, bandwidth_mbps=None, max_attempts=None):
+        self.source = source
+        self.destination = destination
+        self.journal = journal
+        chunk_size = chunk_size or config.FILE_CHUNK_SIZE
+        self.chunk_size = max(UPLOAD_FRAGMENT, chunk_size // UPLOAD_FRAGMENT * UPLOAD_FRAGMENT)
+        self.prefetch = config.FILE_PREFETCH_CHUNKS if prefetch is None else prefetch
+        self.workers = workers or config.FILE_MIGRATION_WORKERS
+        self.concurrency = concurrency or config.FILE_TRANSFER_CONCURRENCY
+        self.transfers = threading.BoundedSemaphore(self.concurrency)
+        mbps = config.FILE_BANDWIDTH_LIMIT_MBPS if bandwidth_mbps is None else bandwidth_mbps
+        self.bandwidth = BandwidthLimiter(mbps * MB)
+        self.max_attempts = max_attempts or config.FILE_MAX_ATTEMPTS
+        self.download_pool = None
+
+    def migrate_drives(self, owners, checkpoint=None, on_file=None, on_user=None, on_progress=None):
+        """Copies every file of each source owner; owners maps source user id to destination UPN or id."""
+        enumerator = SourceEnumerator(self.source.graph_headers)
+        files = []
+        for rows in enumerator.drive_items(list(owners)):
+            if checkpoint is not None:
+                checkpoint()
+            files.extend(payload for _, _, payload in rows)
+        return self.migrate(files, owners, checkpoint, on_file, on_user, on_progress)
+
+    def migrate(self, files, owners, checkpoint=None, on_file=None, on_user=None, on_progress=None):
+        """Copies files, the (owner_id, item_id, name, size, path) payloads of the Files listing.
+
+        Returns {owner_id: OwnerStats}; on_user(owner_id, summary) is called
+        once all of an owner's files are done.
+        """
+        stats = {}
+        remaining = {}
+        for owner_id, *_ in files:
+            stats.setdefault(owner_id, OwnerStats())
+            remaining[owner_id] = remaining.get(owner_id, 0) + 1
+        lock = threading.Lock()
+        finished = [0]
+
+        def copy(item):
+            owner_id = item[0]
+            with lock:
+                if stats[owner_id].started is None:
+                    stats[owner_id].started = time.monotonic()
+            try:
+                status, size = self.copy_file(item, owners[owner_id], checkpoint)
+            except Exception as e:
+                logging.error(f"Failed to copy {item[2]} of {owner_id}: {e}")
+                status, size = f"failed: {e}", 0
+            with lock:
+                owner = stats[owner_id]
+                if status.startswith("failed"):
+                    owner.failed += 1
+                elif status == "skipped":
+                    owner.skipped += 1
+                else:
+                    owner.files += 1
+                    owner.bytes += size
+                remaining[owner_id] -= 1
+                owner_done = remaining[owner_id] == 0
+                if owner_done:
+                    owner.finished = time.monotonic()
+                finished[0] += 1
+                done = finished[0]
+            if on_file is not None:
+                on_file(destination_path(item[4] or '', item[2]), status)
+            if owner_done:
+                get_metrics().observe("file_owner_seconds", owner.finished - owner.started)
+                logging.info(f"Files of {owner_id}: {owner.summary()}")
+                if on_user is not None:
+                    on_user(owner_id, owner.summary())
+            if on_progress is not None:
+                on_progress(done, len(files))
+
+        # Downloads get their own pool so a file waiting on its next chunk
+        # never holds a worker another file's download needs
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.download_pool, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(copy, item) for item in files]
+            for future in as_completed(futures):
+                future.result()
+        self.download_pool = None
+        return stats
+
+    def copy_file(self, item, destination_user, checkpoint=None):
+        # Returns (status, bytes copied)
+        owner_id, item_id, name, size, parent_path = item
+        key = f"file:{owner_id}:{item_id}"
+        if self.journal is not None and self.journal.is_done(key, FILE_COPIED):
+            return "skipped", 0
+        if checkpoint is not None:
+            checkpoint()
+
+        metadata = self.source_item(owner_id, item_id)
+        size = metadata.get('size', size) or 0
+        source_hash = ((metadata.get('file') or {}).get('hashes') or {}).get('quickXorHash')
+        download_url = [metadata.get('@microsoft.graph.downloadUrl')]
+        target = destination_path(parent_path or '', name)
+        started = time.perf_counter()
+
+        if size <= SIMPLE_UPLOAD_LIMIT:
+            uploaded, local_hash = self.simple_copy(owner_id, item_id, download_url, size, destination_user, target)
+        else:
+            uploaded, local_hash = self.session_copy(key, owner_id, item_id, download_url, size, destination_user,
+                                                     target, checkpoint)
+
+        verified = self.verify(target, source_hash, local_hash, uploaded)
+        get_metrics().observe("file_copy_seconds", time.perf_counter() - started)
+        if self.journal is not None:
+            self.journal.record(key, FILE_COPIED, id=(uploaded or {}).get('id'), target=target)
+        return ("copied" if verified else "copied (unverified)"), size
+
+    def verify(self, target, source_hash, local_hash, uploaded):
+        destination_hash = (((uploaded or {}).get('file') or {}).get('hashes') or {}).get('quickXorHash')
+        if local_hash and source_hash and local_hash != source_hash:
+            raise TransferError(f"Downloaded content of {target} does not match the source hash")
+        expected = source_hash or local_hash
+        if expected and destination_hash:
+            if expected != destination_hash:
+                raise TransferError(f"Hash of uploaded {target} does not match the source")
+            return True
+        logging.warning(f"No content hash to verify {target} with")
+        return False
+
+    def source_item(self, owner_id, item_id):
+        url = f"{GRAPH_API_URL}/users/{owner_id}/drive/items/{item_id}"
+
+        def attempt():
+            response = http_transport.get(url, headers=self.source.graph_headers())
+            self.raise_for_retry(response)
+            response.raise_for_status()
+            return response.json()
+        return self.with_attempts(attempt, f"read {item_id}")
+
+    def refresh_download_url(self, owner_id, item_id, download_url):
+        download_url[0] = self.source_item(owner_id, item_id).get('@microsoft.graph.downloadUrl')
+
+    # Transfers
+
+    def simple_copy(self, owner_id, item_id, download_url, size, destination_user, target):
+        data = self.download(owner_id, item_id, download_url, 0, size) if size else b""
+        hasher = QuickXorHash()
+        hasher.update(data)
+        url = f"{GRAPH_API_URL}/users/{destination_user}/drive/root:/{quote(target)}:/content"
+
+        def attempt():
+            headers = dict(self.destination.graph_headers(), **{"Content-Type": "application/octet-stream"})
+            with self.transfers:
+                self.bandwidth.consume(len(data))
+                response = http_transport.put(url, headers=headers, data=data)
+            self.raise_for_retry(response)
+            response.raise_for_status()
+            return response.json()
+        uploaded = self.with_attempts(attempt, f"upload {target}")
+        get_metrics().count("file_bytes_total", len(data), direction="upload")
+        return uploaded, hasher.b64digest()
+
+    def session_copy(self, key, owner_id, item_id, download_url, size, destination_user, target, checkpoint=None):
+        upload_url, offset = self.resume_session(key)
+        if upload_url is None:
+            upload_url = self.create_upload_session(destination_user, target)
+            offset = 0
+            if self.journal is not None:
+                self.journal.record(key, FILE_UPLOAD_STARTED, upload_url=upload_url)
+        # After a resume the bytes sent earlier are not downloaded again, so
+        # only the server-side hashes can be compared
+        hasher = QuickXorHash() if offset == 0 else None
+        if offset:
+            logging.info(f"Resuming upload of {target} at {offset / MB:.1f} MB")
+
+        # Chunks are downloaded up to `prefetch` ahead and uploaded in order
+        pending = deque()
+        next_offset = offset
+        uploaded = None
+        while next_offset < size or pending:
+            while next_offset < size and len(pending) <= self.prefetch:
+                length = min(self.chunk_size, size - next_offset)
+                pending.append(self.download_pool.submit(self.download, owner_id, item_id, download_url,
+                                                         next_offset, length))
+                next_offset += length
+            if checkpoint is not None:
+                checkpoint()
+            data = pending.popleft().result()
+            if hasher is not None:
+                hasher.update(data)
+            uploaded = self.upload_chunk(upload_url, data, offset, size)
+            offset += len(data)
+        return uploaded, hasher.b64digest() if hasher is not None else None
+
+    def resume_session(self, key):
+        # (upload URL, next expected byte) of an unfinished upload, or (None, 0)
+        if self.journal is None or not self.journal.is_done(key, FILE_UPLOAD_STARTED):
+            return None, 0
+        upload_url = self.journal.data(key).get('upload_url')
+        offset = self.session_offset(upload_url) if upload_url else None
+        if offset is None:
+            return None, 0
+        return upload_url, offset
+
+    def create_upload_session(self, destination_user, target):
+        url = f"{GRAPH_API_URL}/users/{destination_user}/drive/root:/{quote(target)}:/createUploadSession"
+        payload = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+
+        def attempt():
+            response = http_transport.post(url, headers=self.destination.graph_headers(), json=payload)
+            self.raise_for_retry(response)
+            response.raise_for_status()
+            return response.json()['uploadUrl']
+        return self.with_attempts(attempt, f"start upload of {target}")
+
+    def session_offset(self, upload_url):
+        # Next byte the upload session expects, or None once it has expired
+        response = http_transport.get(upload_url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        ranges = response.json().get('nextExpectedRanges') or ["0-"]
+        return int(ranges[0].split('-', 1)[0])
+
+    def download(self, owner_id, item_id, download_url, start, length):
+        # Upload session URLs and download URLs are pre-authenticated, so no
+        # Authorization header is sent to either
+        def attempt():
+            with self.transfers:
+                response = http_transport.get(download_url[0], headers={"Range": f"bytes={start}-{start + length - 1}"},
+                                              stream=True)
+                try:
+                    if response.status_code in EXPIRED_URL_STATUSES:
+                        self.refresh_download_url(owner_id, item_id, download_url)
+                        raise TransientError(f"Download URL expired (HTTP {response.status_code})", 0)
+                    self.raise_for_retry(response)
+                    response.raise_for_status()
+                    if response.status_code != 206 and (start or length != int(response.headers.get(
+                            'Content-Length') or -1)):
+                        raise TransferError("Server ignored the byte range")
+                    data = bytearray()
+                    for block in response.iter_content(READ_BLOCK):
+                        self.bandwidth.consume(len(block))
+                        data += block
+                finally:
+                    response.close()
+            if len(data) != length:
+                raise TransientError(f"Short read: {len(data)} of {length} bytes")
+            return bytes(data)
+        data = self.with_attempts(attempt, f"download {item_id} at {start}")
+        get_metrics().count("file_bytes_total", length, direction="download")
+        return data
+
+    def upload_chunk(self, upload_url, data, offset, size):
+        # The driveItem once the last chunk is in, else None
+        headers = {"Content-Length": str(len(data)),
+                   "Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{size}"}
+
+        def attempt():
+            with self.transfers:
+                self.bandwidth.consume(len(data))
+                response = http_transport.put(upload_url, headers=headers, data=data)
+            if response.status_code in (200, 201):
+                return response.json()
+            if response.status_code == 202:
+                return None
+            if response.status_code in (409, 416):
+                # A retried fragment the session already has
+                if (self.session_offset(upload_url) or 0) >= offset + len(data):
+                    return None
+            self.raise_for_retry(response)
+            response.raise_for_status()
+            raise TransferError(f"Unexpected upload response (HTTP {response.status_code})")
+        result = self.with_attempts(attempt, f"upload at {offset}")
+        get_metrics().count("file_bytes_total", len(data), direction="upload")
+        return result
+
+    # Retries on top of what HttpTransport already retries
+
+    def raise_for_retry(self, response):
+        if response.status_code in RETRY_STATUSES:
+            raise TransientError(f"HTTP {response.status_code}", retry_after_seconds(response.headers))
+
+    def with_attempts(self, fn, what):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn()
+            except HTTPError:
+                # A 4xx from raise_for_status(); retrying will not help
+                raise
+            except (TransientError, OSError) as e:
+                # requests' connection and read errors are OSErrors
+                if attempt == self.max_attempts:
+                    raise TransferError(f"Failed to {what} after {attempt} attempts: {e}")
+                retry_after = getattr(e, 'retry_after', None)
+                delay = retry_after if retry_after is not None else random.uniform(0, min(30, 2 ** attempt))
+                get_metrics().count("retries_total", source="file_migration")
+                logging.info(f"Retrying {what} in {delay:.1f}s: {e}")
+                time.sleep(delay)
@@ -0,0 +1,135 @@
+import logging
+import http_transport
+from graph_paging import GRAPH_API_URL
+from http_transport import THROTTLE_STATUSES, ThrottledError, retry_after_seconds
+from metrics import get_metrics
+
+GRAPH_BATCH_URL = f"{GRAPH_API_URL}/$batch"
+MAX_BATCH_SIZE = 20  # Microsoft Graph limit for sub-requests in one $batch
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class GraphBatchClient:
+    """Packs Graph operations into JSON $batch requests.
+
+    Work is submitted as units: a key plus an ordered list of steps
+    ``(step_name, method, url, body)``. Every step of a unit is placed in the
+    same batch and chained with ``dependsOn`` so it only runs once the
+    previous step has succeeded. Results are reported per unit key.
+    """
+
+    def __init__(self, get_headers, batch_url=GRAPH_BATCH_URL, batch_size=MAX_BATCH_SIZE):
+        self.get_headers = get_headers
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+
+    def run(self, units):
+        results = {}
+        for batch in self.pack(units):
+            results.update(self.send(batch))
+        return results
+
+    def pack(self, units):
+        batch = []
+        size = 0
+        for key, steps in units:
+            if len(steps) > self.batch_size:
+                raise ValueError(f"Unit {key} has {len(steps)} steps, more than fit in one batch")
+            if size + len(steps) > self.batch_size:
+                yield batch
+                batch = []
+                size = 0
+            batch.append((key, steps))
+            size += len(steps)
+        if batch:
+            yield batch
+
+    def send(self, batch):
+        requests_payload = []
+        index = {}
+        results = {}
+        for key, steps in batch:
+            results[key] = {}
+            previous_id = None
+            for step_name, method, url, body in steps:
+                request_id = str(len(requests_payload) + 1)
+                sub_request = {"id": request_id, "method": method, "url": url}
+                if body is not None:
+                    sub_request["body"] = body
+                    sub_request["headers"] = {"Content-Type": "application/json"}
+                if previous_id is not None:
+                    sub_request["dependsOn"] = [previous_id]
+                requests_payload.append(sub_request)
+                index[request_id] = (key, step_name)
+                previous_id = request_id
+
+        response = None
+        try:
+            response = http_transport.post(self.batch_url, headers=self.get_headers(), json={"requests": requests_payload})
+            if response.status_code in THROTTLE_STATUSES:
+                raise ThrottledError(f"Graph batch throttled (HTTP {response.status_code})",
+                                     retry_after_seconds(response.headers))
+            response.raise_for_status()
+            responses = response.json().get('responses', [])
+        except ThrottledError:
+            raise
+        except Exception as e:
+            logging.error(f"Graph batch request failed: {e}")
+            status = response.status_code if response is not None else None
+            for request_id, (key, step_name) in index.items():
+                results[key][step_name] = {"status": status, "body": None, "error": str(e), "retry_after": None}
+            return results
+
+        # Sub-responses may come back in any order
+        metrics = get_metrics()
+        for sub_response in responses:
+            key, step_name = index[sub_response['id']]
+            status = sub_response.get('status')
+            metrics.count("batch_steps_total", step=step_name, status=str(status))
+            body = sub_response.get('body')
+            error = None
+            if status is None or status >= 400:
+                error = sub_response_error(status, body)
+            results[key][step_name] = {"status": status, "body": body, "error": error,
+                                       "retry_after": retry_after_seconds(sub_response.get('headers'))}
+        return results
+
+
+def sub_response_error(status, body):
+    if isinstance(body, dict) and isinstance(body.get('error'), dict):
+        return body['error'].get('message', f"HTTP {status}")
+    return f"HTTP {status}"
+
+
+def split_retryable(batch, results):
+    """Splits a sent batch into finished units and units worth retrying.
+
+    A unit is retried from its first failed step when that step failed with a
+    transient status (throttling, 5xx or no response at all); steps that
+    already succeeded are not sent again. Returns (finished_keys, retry_units,
+    retry_after) where retry_after is the longest Retry-After seen, 0 for a
+    throttle without one, and None when nothing was throttled.
+    """
+    finished = []
+    retry_units = []
+    retry_after = None
+    for key, steps in batch:
+        unit_result = results.get(key, {})
+        for position, (step_name, _, _, _) in enumerate(steps):
+            step = unit_result.get(step_name)
+            if step is None or step['error'] is None:
+                continue
+            if step['status'] is None or step['status'] in RETRYABLE_STATUSES:
+                retry_units.append((key, steps[position:]))
+                if step['status'] in THROTTLE_STATUSES or step.get('retry_after') is not None:
+                    retry_after = max(retry_after or 0, step.get('retry_after') or 0)
+            else:
+                finished.append(key)
+            break
+        else:
+            finished.append(key)
+    return finished, retry_units, retry_after
+
+
+def unit_succeeded(unit_result):
+    return bool(unit_result) and all(step['error'] is None for step in unit_result.values())
@@ -0,0 +1,39 @@
+import config
+import http_transport
+
+GRAPH_API_URL = config.GRAPH_API_URL
+MAX_PAGE_SIZE = 999  # Largest $top accepted by the directory collections
+
+
+def iter_pages(url, get_headers, params=None):
+    """Yields one list of objects per page, following @odata.nextLink.
+
+    The nextLink already carries the original query, so params are only sent
+    with the first request.
+    """
+    while url:
+        response = http_transport.get(url, headers=get_headers(), params=params)
+        response.raise_for_status()
+        data = response.json()
+        yield data.get('value', [])
+        url = data.get('@odata.nextLink')
+        params = None
+
+
+def iter_groups(get_headers, select=("id", "displayName"), page_size=MAX_PAGE_SIZE):
+    params = {"$select": ",".join(select), "$top": page_size}
+    return iter_pages(f"{GRAPH_API_URL}/groups", get_headers, params)
+
+
+def iter_delta_pages(url, get_headers, params=None):
+    """Like iter_pages for delta queries; yields (page, delta_link).
+
+    delta_link is None on every page but the last one of the round.
+    """
+    while url:
+        response = http_transport.get(url, headers=get_headers(), params=params)
+        response.raise_for_status()
+        data = response.json()
+        url = data.get('@odata.nextLink')
+        yield data.get('value', []), data.get('@odata.deltaLink')
+        params = None
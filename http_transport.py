@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+from metrics import endpoint_of, get_metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+
+
+class ThrottledError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers):
+    # Graph sends Retry-After as a number of seconds
+    value = (headers or {}).get('Retry-After') or (headers or {}).get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def transferred_bytes(response, streamed=False):
+    # (request body, response body, retries urllib3 made) for the metrics;
+    # a streamed body is not read here, only its Content-Length is used
+    body = response.request.body if response.request is not None else None
+    sent = len(body) if isinstance(body, (bytes, str)) else 0
+    received = int(response.headers.get('Content-Length') or 0)
+    if not received and not streamed:
+        received = len(response.content or b"")
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+    return sent, received, len(retries)
+
+
+class HttpTransport:
+    """Owns one pooled keep-alive requests.Session per host.
+
+    Connection failures are retried for every method since the request never
+    reached the server. Status-based retries (honouring Retry-After) only apply
+    to idempotent methods, so a POST that creates an object is never replayed.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_factor=None):
+        self.pool_size = pool_size or config.HTTP_POOL_SIZE
+        self.timeout = (connect_timeout or config.HTTP_CONNECT_TIMEOUT,
+                        read_timeout or config.HTTP_READ_TIMEOUT)
+        self.max_retries = config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._create_session(host)
+                    self._sessions[host] = session
+        return session
+
+    def _create_session(self, host):
+        logging.debug(f"Opening HTTP session pool for {host}")
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount(host, adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        service, endpoint = endpoint_of(url)
+        started = time.perf_counter()
+        try:
+            response = self.session_for(url).request(method, url, **kwargs)
+        except Exception:
+            get_metrics().record_request(service, method, endpoint, "error", time.perf_counter() - started)
+            raise
+        get_metrics().record_request(service, method, endpoint, response.status_code,
+                                     time.perf_counter() - started, *transferred_bytes(response, kwargs.get('stream')))
+        return response
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HttpTransport()
+    return _transport
+
+
+def request(method, url, **kwargs):
+    return get_transport().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import OrderedDict
+from graph_paging import GRAPH_API_URL, iter_pages
+
+DEFAULT_CAPACITY = 50000
+FILTER_CHUNK_SIZE = 15  # Graph allows at most 15 values in one "in" clause
+
+
+class IdResolver:
+    """Maps UPNs and email addresses to object ids.
+
+    Ids returned by create calls are remembered so they never need looking
+    up. Misses go to the directory cache when there is one, and whatever is
+    left is fetched with ``$filter=userPrincipalName in (...)`` queries
+    instead of one GET per user. Keys are case-insensitive.
+    """
+
+    def __init__(self, get_headers, directory_cache=None, capacity=DEFAULT_CAPACITY):
+        self.get_headers = get_headers
+        self.directory_cache = directory_cache
+        self.capacity = capacity
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, key, object_id):
+        if not key or not object_id:
+            return
+        with self._lock:
+            self._ids[key.lower()] = object_id
+            self._ids.move_to_end(key.lower())
+            while len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            object_id = self._ids.get(key.lower())
+            if object_id is not None:
+                self._ids.move_to_end(key.lower())
+            return object_id
+
+    def resolve(self, key):
+        return self.resolve_many([key]).get(key)
+
+    def resolve_many(self, keys):
+        resolved = {}
+        missing = []
+        for key in keys:
+            object_id = self.get(key)
+            if object_id is None and self.directory_cache is not None:
+                object_id = self.directory_cache.get_user_id(key)
+                self.remember(key, object_id)
+            if object_id is None:
+                missing.append(key)
+            else:
+                resolved[key] = object_id
+
+        for start in range(0, len(missing), FILTER_CHUNK_SIZE):
+            chunk = missing[start:start + FILTER_CHUNK_SIZE]
+            resolved.update(self._lookup(chunk))
+        return resolved
+
+    def _lookup(self, keys):
+        values = ",".join("'" + key.replace("'", "''") + "'" for key in keys)
+        params = {
+            "$filter": f"userPrincipalName in ({values}) or mail in ({values})",
+            "$select": "id,userPrincipalName,mail,displayName"
+        }
+        wanted = {key.lower(): key for key in keys}
+        found = {}
+        for page in iter_pages(f"{GRAPH_API_URL}/users", self.get_headers, params):
+            for user in page:
+                for attribute in ('userPrincipalName', 'mail'):
+                    key = wanted.get((user.get(attribute) or '').lower())
+                    if key is not None:
+                        found[key] = user['id']
+                        self.remember(key, user['id'])
+                if self.directory_cache is not None:
+                    self.directory_cache.put_user(user['id'], user.get('userPrincipalName'),
+                                                  user.get('mail'), user.get('displayName'))
+        for key in keys:
+            if key not in found:
+                logging.warning(f"No directory object found for {key}")
+        return found
@@ -0,0 +1,229 @@
+import bisect
+import re
+from array import array
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer
+from PyQt5.QtWidgets import QLineEdit
+
+FETCH_BATCH = 500  # Rows handed to the view per fetchMore
+FILTER_DELAY_MS = 150  # Debounce for type-ahead filtering
+KEY_ROLE = Qt.UserRole + 1
+
+_WORD = re.compile(r"[\w'.@-]+")
+
+
+class CompactListModel(QAbstractListModel):
+    """List model over parallel key/label/payload columns.
+
+    Rows are exposed to the view FETCH_BATCH at a time through fetchMore, so
+    appending 200k rows costs no more than appending the first batch. Qt.UserRole
+    gives the row's payload (or its key when there is none) and KEY_ROLE the
+    key, matching what the QListWidget/QComboBox item data used to hold.
+
+    set_filter() keeps only rows where some word of the label starts with the
+    text. Matching uses a sorted (word, row) index, built on the first filter
+    and re-sorted cheaply as rows are appended.
+
+    A model fed by a stream sets more_available while the source has more
+    pages; once the view has fetched all but the last batch of loaded rows,
+    fetchMore calls on_more() to ask the producer for the next page.
+    """
+
+    def __init__(self, parent=None, batch_size=FETCH_BATCH):
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self._keys = []
+        self._labels = []
+        self._payloads = []
+        self._rows_by_key = {}
+        self._visible = None  # array of store rows matching the filter; None means all
+        self._filter = ""
+        self._fetched = 0
+        self._words = []
+        self._indexed = 0  # Store rows already in _words
+        self.more_available = False
+        self.on_more = None
+
+    # Store
+
+    def __len__(self):
+        return len(self._keys)
+
+    def total(self):
+        return len(self._keys) if self._visible is None else len(self._visible)
+
+    def append_rows(self, rows):
+        # rows: iterable of (key, label) or (key, label, payload)
+        start = len(self._keys)
+        for row in rows:
+            key, label = row[0], row[1]
+            payload = row[2] if len(row) > 2 else None
+            existing = self._rows_by_key.get(key)
+            if existing is not None:
+                self._update_row(existing, label, payload)
+                continue
+            self._rows_by_key[key] = len(self._keys)
+            self._keys.append(key)
+            self._labels.append(label)
+            self._payloads.append(payload)
+        if len(self._keys) == start:
+            return
+        if self._visible is not None:
+            matches = self._match(self._filter, start)
+            if not matches:
+                return
+            self._visible.extend(matches)
+        # Fill the first screen right away; the rest waits for fetchMore
+        self._expose(self.batch_size - self._fetched)
+
+    def clear(self):
+        self.beginResetModel()
+        self._keys = []
+        self._labels = []
+        self._payloads = []
+        self._rows_by_key = {}
+        self._visible = None if not self._filter else array('l')
+        self._fetched = 0
+        self._words = []
+        self._indexed = 0
+        self.endResetModel()
+
+    def _update_row(self, row, label, payload):
+        # An active filter is not re-evaluated for a relabelled row
+        self._labels[row] = label
+        self._payloads[row] = payload
+        if row < self._indexed:
+            # Re-index from this row on the next filter
+            self._words = [entry for entry in self._words if entry[1] < row]
+            self._indexed = row
+        view_row = row if self._visible is None else self._view_row(row)
+        if view_row is not None and view_row < self._fetched:
+            index = self.index(view_row)
+            self.dataChanged.emit(index, index)
+
+    def _view_row(self, store_row):
+        position = bisect.bisect_left(self._visible, store_row)
+        if position < len(self._visible) and self._visible[position] == store_row:
+            return position
+        return None
+
+    # Row access by view row (what the view's indexes refer to)
+
+    def store_row(self, row):
+        return row if self._visible is None else self._visible[row]
+
+    def key(self, row):
+        return self._keys[self.store_row(row)]
+
+    def label(self, row):
+        return self._labels[self.store_row(row)]
+
+    def payload(self, row):
+        store_row = self.store_row(row)
+        payload = self._payloads[store_row]
+        return self._keys[store_row] if payload is None else payload
+
+    def row_for_key(self, key):
+        # View row of key, fetching up to it if needed; None if filtered out
+        store_row = self._rows_by_key.get(key)
+        if store_row is None:
+            return None
+        row = store_row if self._visible is None else self._view_row(store_row)
+        if row is not None and row >= self._fetched:
+            self._expose(row + 1 - self._fetched)
+        return row
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+        if role == Qt.DisplayRole or role == Qt.ToolTipRole:
+            return self.label(index.row())
+        if role == Qt.UserRole:
+            return self.payload(index.row())
+        if role == KEY_ROLE:
+            return self.key(index.row())
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self._fetched < self.total() or self.more_available)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self._expose(self.batch_size)
+        if self.more_available and self.on_more is not None and self.total() - self._fetched < self.batch_size:
+            self.on_more()
+
+    def _expose(self, count):
+        count = min(count, self.total() - self._fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    # Filtering
+
+    def set_filter(self, text):
+        text = text.strip().lower()
+        if text == self._filter:
+            return
+        self.beginResetModel()
+        self._filter = text
+        self._visible = array('l', self._match(text)) if text else None
+        self._fetched = min(self.batch_size, self.total())
+        self.endResetModel()
+
+    def _match(self, text, start=0):
+        # Store rows >= start with a word starting with every word of text, in store order
+        self._index_words()
+        rows = None
+        for term in _WORD.findall(text) or [text]:
+            position = bisect.bisect_left(self._words, (term, -1))
+            matched = set()
+            while position < len(self._words) and self._words[position][0].startswith(term):
+                if self._words[position][1] >= start:
+                    matched.add(self._words[position][1])
+                position += 1
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                return []
+        return sorted(rows)
+
+    def _index_words(self):
+        if self._indexed == len(self._labels):
+            return
+        for row in range(self._indexed, len(self._labels)):
+            for word in set(_WORD.findall(str(self._labels[row]).lower())):
+                self._words.append((word, row))
+        # Timsort sorts the new tail and merges it with the sorted prefix, not a full re-sort
+        self._words.sort()
+        self._indexed = len(self._labels)
+
+
+def filter_edit(model, placeholder="Filter...", parent=None, on_filter=None):
+    """A QLineEdit that filters model as the user types, debounced.
+
+    on_filter(text) replaces the local filtering, e.g. to search on the server.
+    """
+    edit = QLineEdit(parent)
+    edit.setPlaceholderText(placeholder)
+    edit.setClearButtonEnabled(True)
+    timer = QTimer(edit)
+    timer.setSingleShot(True)
+    timer.setInterval(FILTER_DELAY_MS)
+    timer.timeout.connect(lambda: (on_filter or model.set_filter)(edit.text()))
+    edit.textChanged.connect(lambda _: timer.start())
+    return edit
+
+
+def selected_payloads(view):
+    # Payloads of the selected rows of a QListView, in view order
+    model = view.model()
+    rows = sorted({index.row() for index in view.selectionModel().selectedIndexes()})
+    return [model.payload(row) for row in rows]
+
@@ -1,19 +1,44 @@
+import time
+STARTED = time.perf_counter()  # Taken before the Qt imports so they count towards startup
+
 import sys
 import logging
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
+from metrics import get_metrics
 from ui_design import MainApp
 
+IMPORTED = time.perf_counter()
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[
     logging.FileHandler("app.log"),
     logging.StreamHandler()
 ])
 
+
+def report_startup(marks):
+    # marks: (phase, perf_counter) in order, starting from STARTED
+    phases = []
+    previous = STARTED
+    for phase, at in marks:
+        get_metrics().observe("startup_seconds", at - previous, phase=phase)
+        phases.append(f"{phase} {at - previous:.2f}s")
+        previous = at
+    get_metrics().observe("startup_seconds", previous - STARTED, phase="total")
+    logging.info(f"Startup: {', '.join(phases)} (total {previous - STARTED:.2f}s)")
+
+
 def main():
     logging.info('Starting application...')
     app = QApplication(sys.argv)
+    app_ready = time.perf_counter()
     main_app = MainApp()
+    window_ready = time.perf_counter()
     main_app.show()
+    # Runs once the event loop has processed the first show and paint
+    QTimer.singleShot(0, lambda: report_startup([("imports", IMPORTED), ("qt", app_ready),
+                                                 ("window", window_ready), ("shown", time.perf_counter())]))
     logging.info('Application started.')
     sys.exit(app.exec_())
 
@@ -0,0 +1,205 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import config
+import http_transport
+from graph_paging import GRAPH_API_URL, MAX_PAGE_SIZE, iter_groups, iter_pages
+from http_transport import THROTTLE_STATUSES, RETRY_STATUSES, ThrottledError, retry_after_seconds
+from metrics import get_metrics
+from migration_executor import MigrationExecutor
+
+MAX_BIND_MEMBERS = 20  # Graph limit for members@odata.bind in one PATCH
+
+ADDED = "added"
+PRESENT = "present"
+
+
+def already_exists(response):
+    try:
+        message = response.json().get('error', {}).get('message', '')
+    except ValueError:
+        return False
+    return "already exist" in message
+
+
+class MembershipMigrator:
+    """Reproduces source group memberships in the destination tenant.
+
+    Source groups are matched to destination groups by display name. Source
+    members are mapped through accounts, {source user id: destination user
+    id} as the migration journals record it (migrated_accounts), so a member
+    only ever becomes the account migrated from that very user; members that
+    were not migrated count as unresolved. Members the destination group
+    already has are left out, so a rerun only sends what is missing. The rest is added with PATCH
+    members@odata.bind, 20 per request; requests for all groups run
+    concurrently under the usual adaptive limit.
+    """
+
+    def __init__(self, source, destination, accounts, prepare_workers=None, executor=None):
+        self.source = source
+        self.destination = destination
+        self.accounts = accounts
+        self.prepare_workers = prepare_workers or config.MIGRATION_INITIAL_CONCURRENCY
+        self.executor = executor or MigrationExecutor()
+
+    def migrate(self, source_group_ids=None, checkpoint=None, on_group=None, on_progress=None):
+        """Returns counts: groups, added, present, unresolved, failed, missing_groups, failed_groups."""
+        stats = {"groups": 0, "added": 0, "present": 0, "unresolved": 0, "failed": 0, "missing_groups": 0,
+                 "failed_groups": 0}
+        source_groups = self.source_groups(source_group_ids)
+        if source_group_ids:
+            stats["failed_groups"] += len(source_group_ids) - len(source_groups)
+        destination_ids = self.destination_group_ids()
+        pairs = []
+        for group in source_groups:
+            destination_id = destination_ids.get((group.get('displayName') or '').lower())
+            if destination_id is None:
+                logging.warning(f"No destination group named '{group.get('displayName')}', skipping its members")
+                stats["missing_groups"] += 1
+                continue
+            pairs.append((group, destination_id))
+
+        # Reading members and resolving ids is done for several groups at once
+        chunks = []
+        with ThreadPoolExecutor(max_workers=self.prepare_workers) as pool:
+            for group, destination_id, member_ids, present, unresolved, error in pool.map(self.prepare_group, pairs):
+                if checkpoint is not None:
+                    checkpoint()
+                if error is not None:
+                    # One unreadable group does not stop the others
+                    stats["failed_groups"] += 1
+                    if on_group is not None:
+                        on_group(group.get('displayName'), f"failed: {error}")
+                    continue
+                stats["groups"] += 1
+                stats["present"] += present
+                stats["unresolved"] += unresolved
+                for start in range(0, len(member_ids), MAX_BIND_MEMBERS):
+                    chunks.append((destination_id, member_ids[start:start + MAX_BIND_MEMBERS]))
+                if on_group is not None:
+                    on_group(group.get('displayName'), f"{len(member_ids)} to add, {present} present")
+
+        total = sum(len(member_ids) for _, member_ids in chunks)
+        finished = [0]
+
+        cache = self.destination.directory_cache
+
+        def on_done(key, status):
+            stats["added" if status == ADDED else "present" if status == PRESENT else "failed"] += 1
+            if cache is not None and status in (ADDED, PRESENT):
+                cache.add_membership(*key)
+            finished[0] += 1
+            if on_progress is not None:
+                on_progress(finished[0], total)
+
+        def on_failed(chunk, error):
+            group_id, member_ids = chunk
+            for member_id in member_ids:
+                logging.error(f"Failed to add {member_id} to group {group_id}: {error or 'retries exhausted'}")
+                on_done((group_id, member_id), "failed")
+
+        logging.info(f"Adding {total} memberships in {len(chunks)} requests")
+        self.executor.run(chunks, self.add_chunk, on_done=on_done, on_failed=on_failed, checkpoint=checkpoint)
+        return stats
+
+    def source_groups(self, group_ids=None):
+        if group_ids:
+            groups = []
+            for group_id in group_ids:
+                # A selected group that cannot be read is left out, not the run
+                try:
+                    response = http_transport.get(f"{GRAPH_API_URL}/groups/{group_id}",
+                                                  headers=self.source.graph_headers(),
+                                                  params={"$select": "id,displayName"})
+                    response.raise_for_status()
+                    groups.append(response.json())
+                except Exception as e:
+                    logging.error(f"Failed to read source group {group_id}: {e}")
+            return groups
+        return [group for page in iter_groups(self.source.graph_headers) for group in page]
+
+    def destination_group_ids(self):
+        cache = self.destination.directory_cache
+        if cache is not None:
+            cache.sync_groups(self.destination.graph_headers)
+            groups = cache.groups()
+        else:
+            groups = [group for page in iter_groups(self.destination.graph_headers) for group in page]
+        by_name = {}
+        for group in groups:
+            name = (group.get('displayName') or '').lower()
+            if name in by_name:
+                logging.warning(f"Several destination groups are named '{group.get('displayName')}'; using the first")
+                continue
+            by_name[name] = group['id']
+        return by_name
+
+    def prepare_group(self, pair):
+        # (group, destination_id, member ids to add, already present, unresolved, error)
+        group, destination_id = pair
+        try:
+            return self.read_group(group, destination_id) + (None,)
+        except Exception as e:
+            logging.error(f"Failed to read members of group '{group.get('displayName')}': {e}")
+            return group, destination_id, [], 0, 0, e
+
+    def read_group(self, group, destination_id):
+        source_members = list(self.member_pages(self.source, group['id'], ("id",)))
+        existing = {member['id'] for member in self.member_pages(self.destination, destination_id, ("id",))}
+
+        to_add = []
+        present = 0
+        unresolved = 0
+        for member in source_members:
+            member_id = self.accounts.get(member['id'])
+            if member_id is None:
+                unresolved += 1
+            elif member_id in existing:
+                present += 1
+            else:
+                existing.add(member_id)
+                to_add.append(member_id)
+        return group, destination_id, to_add, present, unresolved
+
+    def member_pages(self, service, group_id, fields):
+        # Only user members; nested groups and devices are not migrated
+        url = f"{GRAPH_API_URL}/groups/{group_id}/members/microsoft.graph.user"
+        params = {"$select": ",".join(fields), "$top": MAX_PAGE_SIZE}
+        for page in iter_pages(url, service.graph_headers, params):
+            yield from page
+
+    def add_chunk(self, chunk):
+        # MigrationExecutor work function: returns (done, retry_item, retry_after)
+        group_id, member_ids = chunk
+        payload = {"members@odata.bind": [f"{GRAPH_API_URL}/directoryObjects/{member_id}" for member_id in member_ids]}
+        response = http_transport.patch(f"{GRAPH_API_URL}/groups/{group_id}", headers=self.destination.graph_headers(),
+                                        json=payload)
+        if response.status_code in THROTTLE_STATUSES:
+            raise ThrottledError(f"Group update throttled (HTTP {response.status_code})",
+                                 retry_after_seconds(response.headers))
+        if response.status_code in RETRY_STATUSES:
+            return [], chunk, None
+        if response.ok:
+            return [((group_id, member_id), ADDED) for member_id in member_ids], None, None
+
+        # The whole PATCH is rejected when one member is already there (added
+        # since the members were read) or cannot be bound, so add this chunk
+        # one by one to find out which
+        logging.info(f"Bulk add to group {group_id} failed ({response.status_code}), adding members one by one")
+        get_metrics().count("membership_fallbacks_total")
+        return [((group_id, member_id), self.add_single(group_id, member_id)) for member_id in member_ids], None, None
+
+    def add_single(self, group_id, member_id):
+        # Throttled and 5xx responses are retried with Retry-After honoured
+        try:
+            response = self.destination.post_with_retries(
+                f"{GRAPH_API_URL}/groups/{group_id}/members/$ref",
+                {"@odata.id": f"{GRAPH_API_URL}/directoryObjects/{member_id}"})
+        except Exception as e:
+            logging.error(f"Failed to add {member_id} to group {group_id}: {e}")
+            return "failed"
+        if response.ok:
+            return ADDED
+        if response.status_code == 400 and already_exists(response):
+            return PRESENT
+        logging.error(f"Failed to add {member_id} to group {group_id}: HTTP {response.status_code}")
+        return "failed"
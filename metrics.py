@@ -0,0 +1,247 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds; a final +Inf bucket is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Path segments that identify an object rather than an endpoint: GUIDs,
+# numbers, UPNs, and OneDrive item ids ("01BYE5RZ...", "D4648F06C91D9D3D!54927")
+_ID_SEGMENT = re.compile(r"^(?:[0-9a-fA-F-]{32,36}|\d+|[^/]*@[^/]*|[^/]*%40[^/]*|[0-9A-Z]{16,}"
+                         r"|[0-9A-Fa-f]+![0-9A-Za-z.]+)$")
+# Segments after these are always an id, whatever they look like
+_ID_COLLECTIONS = ("items", "drives", "sites", "deletedItems", "personal")
+# Path-based drive addressing, e.g. root:/Docs/report.xlsx:/content
+_DRIVE_PATH = re.compile(r"root:[^:]*:")
+# Function parameters in a path, e.g. search(q='budget 2026') -> search(q={q})
+_FUNCTION_ARG = re.compile(r"([(,]\s*)(\w+)=(?:'[^']*'|[^,)]*)")
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        # Linear interpolation inside the bucket, like Prometheus' histogram_quantile
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(self.counts):
+            upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return LATENCY_BUCKETS[-1]
+
+
+class MetricsRegistry:
+    """Process-wide counters and latency histograms for outbound calls.
+
+    Series are keyed by name and a sorted tuple of label pairs. Everything is
+    kept in memory; export with to_prometheus() or to_json(), or write either
+    to a file with export().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.started = time.time()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        # Times the block into <name>_seconds; a failure is counted in <name>_errors_total
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.count(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    def record_request(self, service, method, endpoint, status, seconds, bytes_sent=0, bytes_received=0,
+                       retries=0):
+        labels = {"service": service, "method": method, "endpoint": endpoint}
+        self.count("requests_total", status=str(status), **labels)
+        self.observe("request_seconds", seconds, **labels)
+        if bytes_sent:
+            self.count("request_bytes_total", bytes_sent, **labels)
+        if bytes_received:
+            self.count("response_bytes_total", bytes_received, **labels)
+        if status in (429, 503):
+            self.count("throttled_total", **labels)
+        if retries:
+            self.count("retries_total", retries, source="transport", **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self.started = time.time()
+
+    def merge(self, snapshot):
+        """Adds the counters and histograms of another registry's snapshot()."""
+        counters, histograms = snapshot
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (counts, total, count, _, _, _) in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, counts)]
+                histogram.total += total
+                histogram.count += count
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.total, h.count, h.quantile(0.5), h.quantile(0.95),
+                                h.quantile(0.99)) for key, h in self._histograms.items()}
+        return counters, histograms
+
+    def endpoint_summary(self):
+        """Rows of per-endpoint totals for display, busiest first."""
+        counters, histograms = self.snapshot()
+        rows = {}
+        for (name, labels), (_, total, count, p50, p95, p99) in histograms.items():
+            if name != "request_seconds":
+                continue
+            rows[labels] = {"service": dict(labels)["service"], "method": dict(labels)["method"],
+                            "endpoint": dict(labels)["endpoint"], "requests": count, "errors": 0, "throttled": 0,
+                            "retries": 0, "bytes": 0, "seconds": total, "p50": p50, "p95": p95, "p99": p99}
+        for (name, labels), value in counters.items():
+            label_map = dict(labels)
+            status = label_map.pop("status", None)
+            label_map.pop("source", None)
+            row = rows.get(tuple(sorted(label_map.items())))
+            if row is None:
+                continue
+            if name == "requests_total" and (status == "error" or int(status) >= 400):
+                row["errors"] += value
+            elif name == "throttled_total":
+                row["throttled"] += value
+            elif name == "retries_total":
+                row["retries"] += value
+            elif name in ("request_bytes_total", "response_bytes_total"):
+                row["bytes"] += value
+        return sorted(rows.values(), key=lambda row: row["requests"], reverse=True)
+
+    def to_json(self):
+        counters, histograms = self.snapshot()
+        return json.dumps({
+            "started": self.started,
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(counters.items())],
+            "histograms": [{"name": name, "labels": dict(labels), "buckets": list(LATENCY_BUCKETS),
+                            "counts": counts, "sum": total, "count": count, "p50": p50, "p95": p95, "p99": p99}
+                           for (name, labels), (counts, total, count, p50, p95, p99) in sorted(histograms.items())],
+        }, indent=2)
+
+    def to_prometheus(self, prefix="azure_migration_"):
+        counters, histograms = self.snapshot()
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count, _, _, _) in sorted(histograms.items()):
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # Prometheus text format unless the file name ends in .json
+        content = self.to_json() if path.lower().endswith(".json") else self.to_prometheus()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as export_file:
+            export_file.write(content)
+        os.replace(temporary_path, path)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def endpoint_of(url):
+    """Returns (service, endpoint template) for a URL, with object ids replaced by {id}."""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if "graph.microsoft" in host or "/v1.0" in parts.path:
+        service = "graph"
+    elif "solarwinds" in host or "/solarwinds" in parts.path or "samanage" in host:
+        service = "solarwinds"
+    elif host.startswith("login.") or "management.azure" in host:
+        service = "identity"
+    elif host.endswith(".sharepoint.com"):
+        # Pre-authenticated OneDrive download and upload session URLs
+        service = "sharepoint"
+    else:
+        service = host
+    segments = []
+    previous = None
+    path = _FUNCTION_ARG.sub(lambda match: f"{match.group(1)}{match.group(2)}={{{match.group(2)}}}",
+                             _DRIVE_PATH.sub("root:{path}:", parts.path))
+    for segment in path.split("/"):
+        segments.append("{id}" if previous in _ID_COLLECTIONS or _ID_SEGMENT.match(segment) else segment)
+        previous = segment
+    return service, "/".join(segments) or "/"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry()
+    return _metrics
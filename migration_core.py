@@ -0,0 +1,324 @@
+import csv
+import json
+import logging
+import time
+import http_transport
+from directory_cache import DirectoryCache
+from graph_batch import GraphBatchClient, split_retryable, unit_succeeded
+from graph_paging import GRAPH_API_URL, iter_groups
+from id_resolver import IdResolver
+from metrics import get_metrics
+from http_transport import RETRY_STATUSES, THROTTLE_STATUSES, ThrottledError, retry_after_seconds
+from migration_executor import AdaptiveLimiter, MigrationExecutor
+from migration_journal import CREATED, group_step
+from token_manager import extract_tenant_id, get_token_manager, release_token_managers
+
+# Nothing in this module may import PyQt: it is shared by the Qt screens and
+# the headless CLI (cli.py).
+
+
+class TenantService:
+    """Graph operations against one tenant, independent of any UI.
+
+    Progress is reported through plain callbacks and ``checkpoint`` is called
+    between units of work, which is where a caller can pause or cancel.
+    """
+
+    def __init__(self, credential, tenant_id=None, use_cache=True):
+        self.credential = credential
+        self.tenant_id = tenant_id or extract_tenant_id(get_token_manager(credential).get_token())
+        self.directory_cache = DirectoryCache(self.tenant_id) if use_cache and self.tenant_id else None
+        self.id_resolver = IdResolver(self.graph_headers, self.directory_cache)
+
+    def graph_headers(self):
+        return get_token_manager(self.credential).get_headers()
+
+    def close(self):
+        release_token_managers(self.credential)
+        if self.directory_cache is not None:
+            self.directory_cache.close()
+            self.directory_cache = None
+
+    def sync_directory(self):
+        if self.directory_cache is not None:
+            self.directory_cache.sync_users(self.graph_headers)
+
+    def load_groups(self, on_groups, checkpoint=None):
+        # on_groups(replace, groups) is called as pages arrive; replace=True
+        # means the groups supersede everything reported so far.
+        if self.directory_cache is None:
+            for page in iter_groups(self.graph_headers):
+                if checkpoint is not None:
+                    checkpoint()
+                on_groups(False, page)
+            return
+
+        # Show what is already indexed right away, then pull only the changes.
+        # On a first sync the groups are reported page by page as they arrive.
+        cached = self.directory_cache.groups()
+        if cached:
+            on_groups(False, cached)
+            if self.directory_cache.sync_groups(self.graph_headers):
+                on_groups(True, self.directory_cache.groups())
+        else:
+            self.directory_cache.sync_groups(self.graph_headers, on_page=lambda page: on_groups(False, page))
+
+    def build_user_payload(self, user_data):
+        return {
+            "accountEnabled": True,
+            "displayName": f"{user_data['firstName']} {user_data['lastName']}",
+            "mailNickname": f"{user_data['firstName']}.{user_data['lastName']}".lower(),
+            "userPrincipalName": f"{user_data['firstName']}.{user_data['lastName']}@yourdomain.com".lower(),
+            "passwordProfile": {
+                "forceChangePasswordNextSignIn": True,
+                "password": "TempP@ssword123"
+            },
+            "department": user_data.get("department", "N/A"),
+            "jobTitle": user_data.get("jobTitle", "N/A"),
+            "companyName": user_data.get("companyName", "N/A")
+        }
+
+    def create_users(self, users, group_id=None, checkpoint=None, on_user=None, on_progress=None, journal=None):
+        # Create + group add for each user go out in the same $batch, the add
+        # chained on the create with dependsOn. The new user is referenced by
+        # UPN so no lookup of the generated object id is needed. Steps the
+        # journal already has are left out, and fully done users are skipped.
+        units = []
+        skipped = []
+        for user_data in users:
+            user_payload = self.build_user_payload(user_data)
+            upn = user_payload['userPrincipalName']
+            steps = []
+            if journal is None or not journal.is_done(upn, CREATED):
+                steps.append(("create", "POST", "/users", user_payload))
+            if group_id and (journal is None or not journal.added_to_group(upn, group_id)):
+                steps.append(("group", "POST", f"/groups/{group_id}/members/$ref", {
+                    "@odata.id": f"{GRAPH_API_URL}/users/{upn}"
+                }))
+            if steps:
+                units.append((upn, steps))
+            else:
+                skipped.append(upn)
+
+        # Batches run concurrently under an adaptive limit. Units that were
+        # throttled or hit a transient error are resent from the failed step.
+        client = GraphBatchClient(self.graph_headers)
+        results = {upn: {} for upn, _ in units}
+        first_sent = {}  # upn -> perf_counter of its first batch, for per-user timing
+        metrics = get_metrics()
+        finished = []
+        total = len(units) + len(skipped)
+        for upn in skipped:
+            finished.append(upn)
+            if on_user is not None:
+                on_user(upn, "skipped")
+        if skipped:
+            logging.info(f"Skipping {len(skipped)} users already completed in the journal")
+
+        def send_batch(batch):
+            now = time.perf_counter()
+            for upn, _ in batch:
+                first_sent.setdefault(upn, now)
+            batch_results = client.send(batch)
+            for upn, steps in batch_results.items():
+                results[upn].update(steps)
+            done, retry_units, retry_after = split_retryable(batch, batch_results)
+            return [(upn, results[upn]) for upn in done], retry_units, retry_after
+
+        def on_done(upn, steps):
+            status = self.finish_user(upn, group_id, steps, journal)
+            if upn in first_sent:
+                metrics.observe("user_seconds", time.perf_counter() - first_sent[upn], operation="create_user",
+                                outcome=status.split(":")[0])
+            finished.append(upn)
+            if on_user is not None:
+                on_user(upn, status)
+            if on_progress is not None:
+                on_progress(len(finished), total)
+
+        def on_failed(batch, error):
+            for upn, remaining in batch:
+                for step_name, _, _, _ in remaining:
+                    results[upn].setdefault(step_name, {"status": None, "body": None, "retry_after": None,
+                                                        "error": str(error or "retries exhausted")})
+                on_done(upn, results[upn])
+
+        MigrationExecutor().run(list(client.pack(units)), send_batch, on_done=on_done, on_failed=on_failed,
+                                checkpoint=checkpoint)
+        return results
+
+    def finish_user(self, upn, group_id, steps, journal=None):
+        self.record_batch_result(upn, group_id, steps)
+        if journal is not None:
+            created = steps.get("create")
+            if created and not created['error']:
+                journal.record(upn, CREATED, id=(created['body'] or {}).get('id'))
+            if "group" in steps and not steps["group"]['error']:
+                journal.record(upn, group_step(group_id))
+        if unit_succeeded(steps):
+            logging.info(f"User created and added to group: {upn}")
+            return "created"
+        failed = {name: step['error'] for name, step in steps.items() if step['error']}
+        for step_name, error in failed.items():
+            logging.error(f"Failed step '{step_name}' for {upn}: {error}")
+        return f"failed: {', '.join(failed)}"
+
+    def record_batch_result(self, upn, group_id, steps):
+        created = steps.get("create")
+        if not created or created['error'] or not isinstance(created['body'], dict):
+            return
+        user = created['body']
+        self.id_resolver.remember(upn, user['id'])
+        if self.directory_cache is None:
+            return
+        self.directory_cache.put_user(user['id'], upn, user.get('mail'), user.get('displayName'))
+        if "group" in steps and not steps["group"]['error']:
+            self.directory_cache.add_membership(group_id, user['id'])
+
+    def create_account(self, user_payload):
+        response = http_transport.post(f"{GRAPH_API_URL}/users", headers=self.graph_headers(), json=user_payload)
+        response.raise_for_status()
+        user = response.json()
+        self.id_resolver.remember(user_payload['userPrincipalName'], user.get('id'))
+        return user
+
+    def add_user_to_group(self, user_data, group_id, user_id=None):
+        try:
+            if user_id is None:
+                upn = user_data.get('userPrincipalName') or self.build_user_payload(user_data)['userPrincipalName']
+                user_id = self.get_user_id(upn)
+            self.add_member(group_id, user_id)
+            logging.info(f"User added to group: {user_data['firstName']} {user_data['lastName']}")
+        except Exception as e:
+            logging.error(f"Failed to add user to group: {e}")
+
+    def add_member(self, group_id, object_id, executor=None):
+        add_to_group_url = f"{GRAPH_API_URL}/groups/{group_id}/members/$ref"
+        add_to_group_payload = {
+            "@odata.id": f"{GRAPH_API_URL}/users/{object_id}"
+        }
+        response = self.post_with_retries(add_to_group_url, add_to_group_payload, executor)
+        response.raise_for_status()
+
+    def post_with_retries(self, url, payload, executor=None):
+        """POSTs one Graph request under a MigrationExecutor.
+
+        urllib3 never replays a POST on its status, so throttled (429/503)
+        and 5xx responses are retried here, honouring Retry-After. Returns the
+        last response; raises once the attempts run out.
+        """
+        outcome = {}
+
+        def attempt(item):
+            response = http_transport.post(url, headers=self.graph_headers(), json=payload)
+            if response.status_code in THROTTLE_STATUSES:
+                raise ThrottledError(f"Graph throttled (HTTP {response.status_code})",
+                                     retry_after_seconds(response.headers))
+            if response.status_code in RETRY_STATUSES:
+                return [], item, None
+            return [(url, response)], None, None
+
+        def on_done(key, response):
+            outcome['response'] = response
+
+        def on_failed(item, error):
+            outcome['error'] = error
+
+        executor = executor or MigrationExecutor(AdaptiveLimiter(initial=1, maximum=1))
+        executor.run([url], attempt, on_done=on_done, on_failed=on_failed)
+        if 'response' not in outcome:
+            raise RuntimeError(f"Giving up on POST {url}: {outcome.get('error') or 'retries exhausted'}")
+        return outcome['response']
+
+    def get_user_id(self, user_principal_name):
+        try:
+            return self.id_resolver.resolve(user_principal_name)
+        except Exception as e:
+            logging.error(f"Failed to get user ID: {e}")
+            return None
+
+    def invite_guests(self, users, group_id=None, checkpoint=None, on_user=None, on_progress=None, journal=None):
+        # Invitations go out one at a time. They share one executor, so a
+        # Retry-After from one request holds back the next.
+        executor = MigrationExecutor(AdaptiveLimiter(initial=1, maximum=1))
+        results = {}
+        for done, user_data in enumerate(users, start=1):
+            if checkpoint is not None:
+                checkpoint()
+            email = user_data['email']
+            started = time.perf_counter()
+            if journal is not None and journal.is_done(email, CREATED):
+                if group_id and not journal.added_to_group(email, group_id):
+                    created = self.add_guest_to_group(user_data, group_id, journal.data(email).get('id'), journal,
+                                                      executor)
+                    status = "added to group" if created else "failed"
+                else:
+                    created, status = True, "skipped"
+            else:
+                created = self.create_guest(user_data, group_id, journal, executor)
+                status = "invited" if created else "failed"
+            if status != "skipped":
+                get_metrics().observe("user_seconds", time.perf_counter() - started, operation="invite_guest",
+                                      outcome=status)
+            results[email] = created
+            if on_user is not None:
+                on_user(email, status)
+            if on_progress is not None:
+                on_progress(done, len(users))
+        return results
+
+    def create_guest(self, user_data, group_id=None, journal=None, executor=None):
+        try:
+            guest_payload = {
+                "invitedUserDisplayName": f"{user_data['firstName']} {user_data['lastName']}",
+                "invitedUserEmailAddress": f"{user_data['email']}",
+                "inviteRedirectUrl": "https://myapps.microsoft.com",
+                "sendInvitationMessage": True
+            }
+
+            create_guest_url = f"{GRAPH_API_URL}/invitations"
+            response = self.post_with_retries(create_guest_url, guest_payload, executor)
+            response.raise_for_status()
+            logging.info(f"Guest created: {user_data['firstName']} {user_data['lastName']}")
+
+            # The invitation already carries the guest's object id
+            guest_user_id = response.json().get('invitedUser', {}).get('id')
+            self.id_resolver.remember(user_data['email'], guest_user_id)
+            if journal is not None:
+                journal.record(user_data['email'], CREATED, id=guest_user_id)
+            if group_id:
+                return self.add_guest_to_group(user_data, group_id, guest_user_id, journal, executor)
+            return True
+        except Exception as e:
+            logging.error(f"Failed to create guest in Azure AD: {e}")
+            return False
+
+    def add_guest_to_group(self, user_data, group_id, guest_user_id=None, journal=None, executor=None):
+        try:
+            if guest_user_id is None:
+                guest_user_id = self.get_user_id(user_data['email'])
+
+            if not guest_user_id:
+                logging.error(f"Guest user ID not found for {user_data['email']}")
+                return False
+
+            self.add_member(group_id, guest_user_id, executor)
+            logging.info(f"Guest added to group: {user_data['firstName']} {user_data['lastName']}")
+            if journal is not None:
+                journal.record(user_data['email'], group_step(group_id))
+            return True
+        except Exception as e:
+            logging.error(f"Failed to add guest to group: {e}")
+            return False
+
+
+def read_manifest(path):
+    """Yields one user dict per row of a CSV (with header) or JSONL manifest."""
+    with open(path, newline='', encoding='utf-8') as manifest:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line in manifest:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(manifest):
+                yield {key: value for key, value in row.items() if value not in (None, '')}
@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import config
+from http_transport import ThrottledError
+from metrics import get_metrics
+
+BASE_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+
+class AdaptiveLimiter:
+    """In-flight limit tuned like AIMD congestion control.
+
+    Each completed request adds 1/limit (about +1 per round of requests). A
+    throttled response halves the limit and holds back new requests until the
+    Retry-After time has passed. Latency above the target trims it by 10%.
+    """
+
+    def __init__(self, initial=None, minimum=1, maximum=None, target_latency=None):
+        self.minimum = minimum
+        self.maximum = maximum or config.MIGRATION_MAX_CONCURRENCY
+        self.limit = float(min(initial or config.MIGRATION_INITIAL_CONCURRENCY, self.maximum))
+        self.target_latency = target_latency or config.MIGRATION_TARGET_LATENCY
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if time.monotonic() < self.blocked_until or self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, throttled=False, retry_after=None):
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                logging.debug(f"Throttled, concurrency limit now {self.limit:.1f}")
+            elif latency > self.target_latency:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class MigrationExecutor:
+    """Runs work items concurrently under an AdaptiveLimiter.
+
+    ``fn(item)`` returns ``(done, retry_item, retry_after)``: the finished
+    ``(key, result)`` pairs, the part of the item that should be tried again
+    (or None) and the Retry-After the server asked for (or None). An exception
+    retries the whole item. Retries use jittered exponential backoff, or the
+    server's Retry-After plus jitter, up to ``max_attempts``.
+    """
+
+    def __init__(self, limiter=None, max_attempts=None):
+        self.limiter = limiter or AdaptiveLimiter()
+        self.max_attempts = max_attempts or config.MIGRATION_MAX_ATTEMPTS
+
+    def run(self, items, fn, on_done=None, on_failed=None, checkpoint=None):
+        sequence = itertools.count()
+        ready = [(0.0, next(sequence), item, 1) for item in items]
+        heapq.heapify(ready)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.limiter.maximum) as pool:
+            while ready or running:
+                if checkpoint is not None:
+                    checkpoint()
+                now = time.monotonic()
+                while ready and ready[0][0] <= now and self.limiter.try_acquire():
+                    _, _, item, attempt = heapq.heappop(ready)
+                    future = pool.submit(fn, item)
+                    running[future] = (item, attempt, time.monotonic())
+
+                if not running:
+                    time.sleep(min(max(ready[0][0] - now, 0.05), 0.5))
+                    continue
+
+                finished, _ = wait(list(running), timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item, attempt, started = running.pop(future)
+                    latency = time.monotonic() - started
+                    try:
+                        done, retry_item, retry_after = future.result()
+                        error = None
+                    except Exception as e:
+                        done, retry_item = [], item
+                        retry_after = (e.retry_after or 0) if isinstance(e, ThrottledError) else None
+                        error = e
+                    # A Retry-After of 0 still marks the response as throttled
+                    self.limiter.release(latency, throttled=retry_after is not None, retry_after=retry_after)
+
+                    if on_done is not None:
+                        for key, result in done:
+                            on_done(key, result)
+                    if not retry_item:
+                        continue
+                    if attempt >= self.max_attempts:
+                        logging.error(f"Giving up after {attempt} attempts: {error or 'retryable failures'}")
+                        get_metrics().count("retries_exhausted_total", source="executor")
+                        if on_failed is not None:
+                            on_failed(retry_item, error)
+                        continue
+                    delay = self.backoff(attempt, retry_after)
+                    get_metrics().count("retries_total", source="executor",
+                                        reason="throttled" if retry_after is not None else "transient")
+                    logging.info(f"Retrying in {delay:.1f}s (attempt {attempt + 1})")
+                    heapq.heappush(ready, (time.monotonic() + delay, next(sequence), retry_item, attempt + 1))
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after:
+            return retry_after + random.uniform(0, BASE_RETRY_DELAY)
+        return random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt))
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import threading
+import time
+import config
+
+CREATED = "created"
+GROUP_ADDED = "group_added"  # Suffixed with the group id, see group_step()
+TICKET_UPDATED = "ticket_updated"
+EMAILED = "emailed"
+SOURCE_DELETED = "source_deleted"
+SOURCE_RESTORED = "source_restored"
+FILE_UPLOAD_STARTED = "file_upload_started"
+FILE_COPIED = "file_copied"
+MIGRATED = "migrated"  # data: id (destination), source_id
+
+FSYNC_EVERY = 100  # Records per fsync
+FSYNC_INTERVAL = 1.0  # Seconds a record may wait for its fsync
+
+
+def group_step(group_id):
+    # Adds are journaled per group, so adding a user to a second group is
+    # never mistaken for the add to the first
+    return f"{GROUP_ADDED}:{group_id}"
+
+
+class MigrationJournal:
+    """Append-only JSON-lines record of per-user step completion.
+
+    Writes are flushed to the OS immediately but fsynced in groups, so at most
+    the last group of records can be lost on a crash. Opening an existing
+    journal with ``resume=True`` replays it into an in-memory index that
+    answers is_done() in O(1); with ``resume=False`` the old journal is moved
+    aside and a fresh one is started.
+    """
+
+    def __init__(self, path, resume=True, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._completed = {}
+        self._data = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path):
+            if resume:
+                self._replay()
+            else:
+                os.replace(path, f"{path}.prev")
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def for_tenant(cls, tenant_id, resume=True, stage=None):
+        # Stages that run on their own (guest invitations, file copies) get a
+        # journal of their own, so starting one fresh never moves the user
+        # migration's aside
+        name = f"{tenant_id}-{stage}" if stage else tenant_id
+        return cls(os.path.join(config.CACHE_DIR, "journals", f"{name}.jsonl"), resume)
+
+    def _replay(self):
+        count = 0
+        valid_size = 0
+        with open(self.path, "rb") as journal:
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    # A torn final line from a crash mid-write
+                    break
+                valid_size += len(line)
+                try:
+                    self._apply(json.loads(line))
+                    count += 1
+                except ValueError:
+                    logging.warning(f"Skipping unreadable journal entry in {self.path}")
+        if valid_size < os.path.getsize(self.path):
+            # Drop the torn tail so new records start on a line of their own
+            with open(self.path, "r+b") as journal:
+                journal.truncate(valid_size)
+        logging.info(f"Replayed {count} journal entries from {self.path}")
+
+    def _apply(self, entry):
+        user = entry['user'].lower()
+        self._completed.setdefault(user, set()).add(entry['step'])
+        if entry.get('data'):
+            self._data.setdefault(user, {}).update(entry['data'])
+
+    def is_done(self, user, step):
+        return step in self._completed.get(user.lower(), ())
+
+    def added_to_group(self, user, group_id):
+        if self.is_done(user, group_step(group_id)):
+            return True
+        # Journals written before adds were keyed by group
+        return self.is_done(user, GROUP_ADDED) and self.data(user).get('group_id') == group_id
+
+    def completed(self, user):
+        return self._completed.get(user.lower(), set())
+
+    def data(self, user):
+        return self._data.get(user.lower(), {})
+
+    def users_with(self, step):
+        with self._lock:
+            return [user for user, steps in self._completed.items() if step in steps]
+
+    def record(self, user, step, **data):
+        entry = {"user": user, "step": step, "ts": time.time()}
+        if data:
+            entry["data"] = data
+        with self._lock:
+            self._apply(entry)
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+            elif self._timer is None:
+                # Pending records get their fsync within the interval even
+                # when no further record comes along
+                self._timer = threading.Timer(self.fsync_interval, self._sync_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_on_timer(self):
+        with self._lock:
+            self._timer = None
+            if not self._file.closed:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._sync_locked()
+            self._file.close()
+
+
+def migrated_accounts(*journals):
+    """{source user id: destination user id} of every user the journals record as MIGRATED.
+
+    A destination account recorded for more than one source user maps none of
+    them, so nothing of one user is ever written to another's account.
+    """
+    accounts = {}
+    holders = {}
+    for journal in journals:
+        for key in journal.users_with(MIGRATED):
+            data = journal.data(key)
+            if data.get('source_id') and data.get('id'):
+                accounts[data['source_id']] = data['id']
+                holders.setdefault(data['id'], set()).add(data['source_id'])
+    return {source_id: destination_id for source_id, destination_id in accounts.items()
+            if holders[destination_id] == {source_id}}
@@ -0,0 +1,358 @@
+import logging
+import math
+import config
+from graph_batch import MAX_BATCH_SIZE, GraphBatchClient, split_retryable, unit_succeeded
+from graph_paging import GRAPH_API_URL, MAX_PAGE_SIZE, iter_pages
+from metrics import get_metrics
+from migration_executor import MigrationExecutor
+from migration_journal import CREATED, MIGRATED
+
+CREATE = "create"
+UPDATE = "update"
+SKIP = "skip"
+CONFLICT = "conflict"
+ACTIONS = (CREATE, UPDATE, SKIP, CONFLICT)
+
+# Attributes an existing destination user is brought in line with
+COMPARED_FIELDS = ("displayName", "department", "jobTitle", "companyName")
+INDEX_FIELDS = ("id", "userPrincipalName", "mail", "userType") + COMPARED_FIELDS
+DEFAULT_REQUEST_SECONDS = 1.0  # Assumed Graph latency until some requests have been timed
+
+
+class DestinationIndex:
+    """Destination users keyed by lowercased UPN and mail, read in one pass."""
+
+    def __init__(self, users=()):
+        self.by_upn = {}
+        self.by_mail = {}
+        self.requests = 0
+        for user in users:
+            self.add(user)
+
+    @classmethod
+    def load(cls, get_headers, page_size=MAX_PAGE_SIZE):
+        index = cls()
+        params = {"$select": ",".join(INDEX_FIELDS), "$top": page_size}
+        for page in iter_pages(f"{GRAPH_API_URL}/users", get_headers, params):
+            index.requests += 1
+            for user in page:
+                index.add(user)
+        return index
+
+    def add(self, user):
+        if user.get('userPrincipalName'):
+            self.by_upn[user['userPrincipalName'].lower()] = user
+        if user.get('mail'):
+            self.by_mail[user['mail'].lower()] = user
+
+    def __len__(self):
+        return len(self.by_upn)
+
+    def find(self, key):
+        # The user whose UPN or mail is key
+        key = (key or '').lower()
+        return self.by_upn.get(key) or self.by_mail.get(key)
+
+
+class PlanEntry:
+    __slots__ = ('action', 'key', 'user_data', 'existing', 'changes', 'add_to_group', 'steps', 'reason')
+
+    def __init__(self, action, key, user_data, existing=None, changes=None, add_to_group=False, steps=0,
+                 reason=''):
+        self.action = action
+        self.key = key  # UPN for members, email for guests
+        self.user_data = user_data
+        self.existing = existing  # The destination user, if there is one
+        self.changes = changes or {}  # Attributes an update sets
+        self.add_to_group = add_to_group  # An existing user still missing from the group
+        self.steps = steps  # Graph sub-requests execution will send for this entry
+        self.reason = reason
+
+
+class MigrationPlan:
+    """What migrating a selection would do, worked out before anything is sent."""
+
+    def __init__(self, entries, group_id=None, guests=False, index=None):
+        self.entries = entries
+        self.group_id = group_id
+        self.guests = guests
+        self.index = index  # The DestinationIndex the plan was made against
+        self.index_requests = index.requests if index is not None else 0
+
+    def by_action(self, action):
+        return [entry for entry in self.entries if entry.action == action]
+
+    def migrated(self, journal=None):
+        """Splits entries into ([(entry, destination_id)] migrated, [(key, reason)] not migrated).
+
+        An entry counts as migrated when the destination account is the one
+        the plan matched (an existing user) or the journal recorded creating,
+        and no other entry of the plan already holds that account.
+        """
+        migrated = []
+        kept = []
+        claimed = set()  # Destination ids already matched to a source user
+        for entry in self.entries:
+            if entry.action == CONFLICT:
+                kept.append((entry.key, f"conflict: {entry.reason}"))
+                continue
+            if not entry.user_data.get('sourceId'):
+                kept.append((entry.key, "no source object id"))
+                continue
+            if entry.action == CREATE:
+                created = journal is not None and journal.is_done(entry.key, CREATED)
+                destination_id = journal.data(entry.key).get('id') if created else None
+                if not destination_id:
+                    kept.append((entry.key, "not created in the destination"))
+                    continue
+            else:
+                destination_id = entry.existing['id']
+            # The index was read before this run's creates, so a created
+            # account is either missing from it or (created by an earlier run)
+            # has the journaled id; an existing one must be the account matched
+            holder = self.index.find(entry.key) if self.guests else self.index.by_upn.get(entry.key.lower())
+            holder_id = (holder or {}).get('id')
+            if holder_id != destination_id and not (entry.action == CREATE and holder_id is None):
+                kept.append((entry.key, "destination account does not match the migrated one"))
+            elif destination_id in claimed:
+                kept.append((entry.key, "destination account already matched to another source user"))
+            else:
+                claimed.add(destination_id)
+                migrated.append((entry, destination_id))
+        return migrated, kept
+
+    def counts(self):
+        counts = dict.fromkeys(ACTIONS, 0)
+        for entry in self.entries:
+            counts[entry.action] += 1
+        return counts
+
+    def estimated_requests(self):
+        # Requests execution sends. Members and all follow-up steps go out in
+        # $batch requests of 20; invitations are sent one by one.
+        create_steps = sum(entry.steps for entry in self.by_action(CREATE))
+        apply_steps = sum(entry.steps for entry in self.entries if entry.action in (UPDATE, SKIP))
+        creates = create_steps if self.guests else math.ceil(create_steps / MAX_BATCH_SIZE)
+        return {CREATE: creates, UPDATE: math.ceil(apply_steps / MAX_BATCH_SIZE)}
+
+    def estimated_seconds(self, request_seconds=None, concurrency=None):
+        request_seconds = request_seconds or observed_request_seconds()
+        concurrency = concurrency or config.MIGRATION_INITIAL_CONCURRENCY
+        requests = self.estimated_requests()
+        # Invitations run one after another
+        create_concurrency = 1 if self.guests else concurrency
+        return (requests[CREATE] / create_concurrency + requests[UPDATE] / concurrency) * request_seconds
+
+    def summary(self):
+        counts = self.counts()
+        requests = self.estimated_requests()
+        return (f"{counts[CREATE]} to create, {counts[UPDATE]} to update, {counts[SKIP]} already present, "
+                f"{counts[CONFLICT]} conflicts; about {sum(requests.values())} requests "
+                f"(~{self.estimated_seconds():.0f}s)")
+
+
+def observed_request_seconds():
+    # Mean Graph request time measured so far in this process
+    _, histograms = get_metrics().snapshot()
+    total = 0.0
+    count = 0
+    for (name, labels), (_, seconds, observations, _, _, _) in histograms.items():
+        if name == "request_seconds" and dict(labels).get("service") == "graph":
+            total += seconds
+            count += observations
+    return total / count if count else DEFAULT_REQUEST_SECONDS
+
+
+def migrated_elsewhere(journal, key, user_data):
+    # An earlier run gave this destination account to a different source user
+    source_id = journal.data(key).get('source_id') if journal is not None else None
+    return bool(source_id and user_data.get('sourceId') and source_id != user_data['sourceId'])
+
+
+class MigrationPlanner:
+    """Diffs a selection of source users against the destination directory.
+
+    The destination users are read once into a DestinationIndex, after which
+    each selected user is classified with dictionary lookups: create when
+    neither the UPN nor the email is taken, update or skip when the UPN
+    already exists, and conflict when the selection holds the same UPN twice
+    or the email belongs to another destination user. execute() then sends
+    only the requests the plan needs.
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+
+    def load_index(self):
+        index = DestinationIndex.load(self.destination.graph_headers)
+        logging.info(f"Indexed {len(index)} destination users in {index.requests} requests")
+        return index
+
+    def group_member_ids(self, group_id):
+        params = {"$select": "id", "$top": MAX_PAGE_SIZE}
+        return {member['id'] for page in iter_pages(f"{GRAPH_API_URL}/groups/{group_id}/members",
+                                                    self.destination.graph_headers, params) for member in page}
+
+    def plan_users(self, users, group_id=None, journal=None, index=None):
+        if index is None:
+            index = self.load_index()
+        members = self.group_member_ids(group_id) if group_id else set()
+        entries = []
+        seen = set()
+        for user_data in users:
+            payload = self.destination.build_user_payload(user_data)
+            upn = payload['userPrincipalName']
+            if upn in seen:
+                entries.append(PlanEntry(CONFLICT, upn, user_data, reason="UPN appears twice in the selection"))
+                continue
+            seen.add(upn)
+            if migrated_elsewhere(journal, upn, user_data):
+                entries.append(PlanEntry(CONFLICT, upn, user_data,
+                                         reason="UPN already migrated from another source user"))
+                continue
+
+            # Users an earlier run created go back to create_users, which
+            # finishes whatever that run left and skips the rest
+            resumed = journal is not None and journal.is_done(upn, CREATED)
+            existing = None if resumed else index.by_upn.get(upn)
+            if existing is None:
+                holder = None if resumed else index.find(user_data.get('email'))
+                if holder is not None:
+                    entries.append(PlanEntry(CONFLICT, upn, user_data, existing=holder,
+                                             reason=f"{user_data['email']} already belongs to "
+                                                    f"{holder.get('userPrincipalName')}"))
+                    continue
+                steps = 0 if resumed else 1
+                if group_id and (journal is None or not journal.added_to_group(upn, group_id)):
+                    steps += 1
+                entries.append(PlanEntry(CREATE, upn, user_data, steps=steps))
+                continue
+
+            # Only attributes the source actually has are compared, so missing
+            # values never overwrite what the destination holds
+            changes = {field: payload[field] for field in COMPARED_FIELDS
+                       if (field == "displayName" or user_data.get(field)) and payload[field] != existing.get(field)}
+            add_to_group = bool(group_id) and existing['id'] not in members
+            entries.append(PlanEntry(UPDATE if changes else SKIP, upn, user_data, existing=existing, changes=changes,
+                                     add_to_group=add_to_group, steps=bool(changes) + add_to_group))
+        return MigrationPlan(entries, group_id, guests=False, index=index)
+
+    def plan_guests(self, users, group_id=None, journal=None, index=None):
+        if index is None:
+            index = self.load_index()
+        members = self.group_member_ids(group_id) if group_id else set()
+        entries = []
+        seen = set()
+        for user_data in users:
+            email = user_data['email']
+            if email.lower() in seen:
+                entries.append(PlanEntry(CONFLICT, email, user_data, reason="Email appears twice in the selection"))
+                continue
+            seen.add(email.lower())
+            if migrated_elsewhere(journal, email, user_data):
+                entries.append(PlanEntry(CONFLICT, email, user_data,
+                                         reason="Email already migrated from another source user"))
+                continue
+
+            resumed = journal is not None and journal.is_done(email, CREATED)
+            existing = None if resumed else index.find(email)
+            if existing is None:
+                steps = 0 if resumed else 1
+                if group_id and (journal is None or not journal.added_to_group(email, group_id)):
+                    steps += 1
+                entries.append(PlanEntry(CREATE, email, user_data, steps=steps))
+                continue
+            # Already a member or guest of the destination: no new invitation
+            add_to_group = bool(group_id) and existing['id'] not in members
+            entries.append(PlanEntry(SKIP, email, user_data, existing=existing, add_to_group=add_to_group,
+                                     steps=int(add_to_group)))
+        return MigrationPlan(entries, group_id, guests=True, index=index)
+
+    def execute(self, plan, checkpoint=None, on_user=None, on_progress=None, journal=None):
+        """Runs the plan: creates, then updates and group adds for existing users.
+
+        Conflicts are only reported, as "conflict: <reason>". Existing users
+        that need nothing are reported as "exists". Each migrated entry is
+        journaled as MIGRATED with its destination and source ids, which later
+        stages (files, memberships) map source users through.
+        """
+        total = len(plan.entries)
+        finished = [0]
+
+        def report(key, status):
+            finished[0] += 1
+            if on_user is not None:
+                on_user(key, status)
+            if on_progress is not None:
+                on_progress(finished[0], total)
+
+        for entry in plan.by_action(CONFLICT):
+            logging.warning(f"Not migrating {entry.key}: {entry.reason}")
+            report(entry.key, f"conflict: {entry.reason}")
+        for entry in plan.entries:
+            if entry.action == SKIP and not entry.add_to_group:
+                report(entry.key, "exists")
+
+        creates = [entry.user_data for entry in plan.by_action(CREATE)]
+        if creates:
+            create = self.destination.invite_guests if plan.guests else self.destination.create_users
+            create(creates, plan.group_id, checkpoint=checkpoint, on_user=report, journal=journal)
+
+        pending = [entry for entry in plan.entries if entry.action in (UPDATE, SKIP) and entry.steps]
+        if pending:
+            self.apply_changes(pending, plan.group_id, checkpoint=checkpoint, on_user=report)
+
+        if journal is not None:
+            for entry, destination_id in plan.migrated(journal)[0]:
+                if not journal.is_done(entry.key, MIGRATED) or journal.data(entry.key).get('id') != destination_id:
+                    journal.record(entry.key, MIGRATED, id=destination_id, source_id=entry.user_data['sourceId'])
+
+    def apply_changes(self, entries, group_id, checkpoint=None, on_user=None):
+        # Attribute updates and group adds for existing users, chained per
+        # user in $batch requests like the creates
+        units = []
+        for entry in entries:
+            steps = []
+            if entry.changes:
+                steps.append(("update", "PATCH", f"/users/{entry.existing['id']}", entry.changes))
+            if entry.add_to_group:
+                steps.append(("group", "POST", f"/groups/{group_id}/members/$ref", {
+                    "@odata.id": f"{GRAPH_API_URL}/directoryObjects/{entry.existing['id']}"
+                }))
+            units.append((entry.key, steps))
+
+        client = GraphBatchClient(self.destination.graph_headers)
+        results = {key: {} for key, _ in units}
+
+        def send_batch(batch):
+            batch_results = client.send(batch)
+            for key, steps in batch_results.items():
+                results[key].update(steps)
+            done, retry_units, retry_after = split_retryable(batch, batch_results)
+            return [(key, results[key]) for key in done], retry_units, retry_after
+
+        def on_done(key, steps):
+            group_step = steps.get("group")
+            if group_step and group_step['error'] and "already exist" in group_step['error']:
+                # Joined the group after the plan was made
+                group_step['error'] = None
+            if unit_succeeded(steps):
+                status = "updated" if "update" in steps else "added to group"
+            else:
+                failed = {name: step['error'] for name, step in steps.items() if step['error']}
+                for step_name, error in failed.items():
+                    logging.error(f"Failed step '{step_name}' for {key}: {error}")
+                status = f"failed: {', '.join(failed)}"
+            if on_user is not None:
+                on_user(key, status)
+
+        def on_failed(batch, error):
+            for key, remaining in batch:
+                for step_name, _, _, _ in remaining:
+                    results[key].setdefault(step_name, {"status": None, "body": None, "retry_after": None,
+                                                        "error": str(error or "retries exhausted")})
+                on_done(key, results[key])
+
+        MigrationExecutor().run(list(client.pack(units)), send_batch, on_done=on_done, on_failed=on_failed,
+                                checkpoint=checkpoint)
+        return results
@@ -0,0 +1,178 @@
+import logging
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+import config
+from metrics import get_metrics
+from migration_journal import EMAILED
+
+IDLE_NOOP_AFTER = 60  # Check an idle connection with NOOP before reusing it
+RETRY_DELAY = 2.0
+
+_STOP = object()
+
+
+class NotificationDispatcher:
+    """Queues account emails and sends them from background threads.
+
+    Each worker keeps one authenticated SMTP connection open and reuses it,
+    reconnecting when the server drops it. Failed sends are retried up to
+    SMTP_MAX_ATTEMPTS times. Settings default to the SMTP_* values in config;
+    with SMTP_USE_TLS off and no username it talks to a plain local debugging
+    server such as ``python -m aiosmtpd -n -l localhost:1025``.
+    """
+
+    def __init__(self, server=None, port=None, username=None, password=None, from_address=None,
+                 use_tls=None, pool_size=None, max_attempts=None):
+        self.server = server or config.SMTP_SERVER
+        self.port = port or config.SMTP_PORT
+        self.username = username if username is not None else config.SMTP_USERNAME
+        self.password = password if password is not None else config.SMTP_PASSWORD
+        self.from_address = from_address or config.SMTP_FROM or self.username
+        self.use_tls = config.SMTP_USE_TLS if use_tls is None else use_tls
+        self.pool_size = pool_size or config.SMTP_POOL_SIZE
+        self.max_attempts = max_attempts or config.SMTP_MAX_ATTEMPTS
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for number in range(self.pool_size):
+                worker = threading.Thread(target=self._run, name=f"smtp-{number}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def send(self, to_email, subject, body, on_sent=None):
+        # Returns immediately; on_sent(ok) is called from a worker thread
+        self.start()
+        self._queue.put((to_email, subject, body, on_sent))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(_STOP)
+        for worker in workers:
+            worker.join()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.server, self.port, timeout=30)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _run(self):
+        metrics = get_metrics()
+        connection = None
+        last_used = 0.0
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    break
+                to_email, subject, body, on_sent = item
+                msg = MIMEText(body)
+                msg['Subject'] = subject
+                msg['From'] = self.from_address
+                msg['To'] = to_email
+
+                sent = False
+                for attempt in range(1, self.max_attempts + 1):
+                    try:
+                        if connection is not None and time.monotonic() - last_used > IDLE_NOOP_AFTER:
+                            if connection.noop()[0] != 250:
+                                raise smtplib.SMTPServerDisconnected("NOOP failed")
+                        if connection is None:
+                            with metrics.span("smtp_connect"):
+                                connection = self._connect()
+                        with metrics.span("smtp_send"):
+                            connection.sendmail(self.from_address, [to_email], msg.as_string())
+                        last_used = time.monotonic()
+                        sent = True
+                        break
+                    except Exception as e:
+                        logging.warning(f"Sending email to {to_email} failed (attempt {attempt}): {e}")
+                        metrics.count("retries_total", source="smtp")
+                        connection = self._discard(connection)
+                        if attempt < self.max_attempts:
+                            time.sleep(RETRY_DELAY * attempt)
+
+                if sent:
+                    logging.info(f"Sent email to {to_email}")
+                else:
+                    logging.error(f"Failed to send email to {to_email}")
+                if on_sent is not None:
+                    on_sent(sent)
+            except Exception as e:
+                logging.error(f"Notification worker error: {e}")
+            finally:
+                self._queue.task_done()
+        self._discard(connection)
+
+    def _discard(self, connection):
+        if connection is not None:
+            try:
+                connection.quit()
+            except Exception:
+                pass
+        return None
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher()
+    return _dispatcher
+
+
+def account_email_body(user_data, user_principal_name=None, password="TempP@ssword123"):
+    user_principal_name = user_principal_name or f"{user_data['firstName']}.{user_data['lastName']}@yourdomain.com"
+    return f"""
+        Dear {user_data['firstName']} {user_data['lastName']},
+
+        Your account has been created successfully. Here are your credentials:
+
+        Username: {user_principal_name}
+        Temporary Password: {password}
+
+        Please change your password upon first login.
+
+        Regards,
+        IT Team
+        """
+
+
+def notify_account_created(user_data, user_principal_name, journal=None, dispatcher=None, on_sent=None):
+    # Credentials go to the manager from the ticket when known, else to the
+    # address in the manifest. on_sent(to_email) follows a successful send.
+    to_email = user_data.get('managerEmail') or user_data.get('email')
+    if not to_email:
+        return False
+    if journal is not None and journal.is_done(user_principal_name, EMAILED):
+        return False
+
+    def on_result(ok):
+        if ok and journal is not None:
+            journal.record(user_principal_name, EMAILED, to=to_email)
+        if ok and on_sent is not None:
+            on_sent(to_email)
+
+    (dispatcher or get_dispatcher()).send(to_email, "Account Created",
+                                          account_email_body(user_data, user_principal_name), on_result)
+    return True
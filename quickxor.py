@@ -0,0 +1,67 @@
+import base64
+
+WIDTH_IN_BITS = 160
+SHIFT = 11
+_MASK = (1 << WIDTH_IN_BITS) - 1
+_ROW = WIDTH_IN_BITS  # Byte i lands on the same bit position as byte i + 160
+_ROWS_PER_BLOCK = 4096
+_BLOCK = _ROW * _ROWS_PER_BLOCK
+
+
+class QuickXorHash:
+    """The quickXorHash OneDrive for Business reports for every file.
+
+    Byte i of the content is XORed into a 160-bit register rotated left by
+    11 * i bits, and the total length is XORed into the last 8 bytes. Since
+    the rotation repeats every 160 bytes, the bytes are first XOR-folded into
+    160 columns with big-integer XORs over large blocks, and each column is
+    rotated once at the end, which keeps hashing close to memory speed.
+    """
+
+    def __init__(self):
+        self._length = 0
+        self._columns = bytearray(_ROW)  # Bytes that arrived before the input was row aligned
+        self._blocks = 0  # XOR of all aligned blocks, as a little-endian integer
+
+    def update(self, data):
+        data = memoryview(data).cast('B')
+        start = 0
+        # Bring the input to a row boundary so block bytes map to fixed columns
+        offset = self._length % _ROW
+        if offset:
+            head = min(len(data), _ROW - offset)
+            for index in range(head):
+                self._columns[offset + index] ^= data[index]
+            start = head
+        blocks = 0
+        for position in range(start, len(data), _BLOCK):
+            # A short final block is implicitly zero padded, which XOR ignores
+            blocks ^= int.from_bytes(data[position:position + _BLOCK], 'little')
+        self._blocks ^= blocks
+        self._length += len(data)
+
+    def digest(self):
+        folded = int.from_bytes(self._columns, 'little')
+        block_bytes = self._blocks.to_bytes(_BLOCK, 'little')
+        for position in range(0, _BLOCK, _ROW):
+            folded ^= int.from_bytes(block_bytes[position:position + _ROW], 'little')
+        columns = folded.to_bytes(_ROW, 'little')
+
+        register = 0
+        for column, value in enumerate(columns):
+            if value:
+                shift = (column * SHIFT) % WIDTH_IN_BITS
+                register ^= ((value << shift) | (value >> (WIDTH_IN_BITS - shift))) & _MASK
+        result = bytearray(register.to_bytes(WIDTH_IN_BITS // 8, 'little'))
+        for index, value in enumerate(self._length.to_bytes(8, 'little')):
+            result[WIDTH_IN_BITS // 8 - 8 + index] ^= value
+        return bytes(result)
+
+    def b64digest(self):
+        return base64.b64encode(self.digest()).decode('ascii')
+
+
+def quickxor_b64(data):
+    hasher = QuickXorHash()
+    hasher.update(data)
+    return hasher.b64digest()
@@ -1,44 +1,169 @@
+import json
 import logging
-import requests
+import os
+import config
+import http_transport
+from ticket_records import DEFAULT_MANAGER_EMAIL, TicketRecord, normalize_tickets, parse_timestamp
+
+PAGE_SIZE = 100
+
 
 class SolarWindsAPI:
-    def __init__(self, api_token):
-        self.api_url = "https://api.solarwinds.com/v1"  # Example base API URL, replace with actual
+    def __init__(self, api_token, api_url=None, cursor_path=None):
+        self.api_url = api_url or config.SOLARWINDS_API_URL
         self.api_token = api_token
         self.headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json"
         }
+        self.cursor_path = cursor_path or os.path.join(config.CACHE_DIR, "solarwinds_cursor.json")
 
     def fetch_user_requests(self):
         try:
-            url = f"{self.api_url}/requests"
-            response = requests.get(url, headers=self.headers)
+            return [ticket for page in self.iter_request_pages() for ticket in page]
+        except Exception as e:
+            logging.error(f"Failed to fetch user requests: {e}")
+            return []
+
+    def iter_request_pages(self, per_page=PAGE_SIZE, if_none_match=None):
+        """Yields pages of tickets, most recently updated first.
+
+        With if_none_match the first request is conditional; a 304 Not
+        Modified answer is yielded as a single None page.
+        """
+        url = f"{self.api_url}/requests"
+        params = {"per_page": per_page, "page": 1, "sort_by": "updated_at", "sort_order": "DESC"}
+        headers = dict(self.headers)
+        if if_none_match:
+            headers["If-None-Match"] = if_none_match
+        self.last_etag = None
+        page = 1
+        while url:
+            response = http_transport.get(url, headers=headers, params=params)
+            if response.status_code == 304:
+                yield None
+                return
             response.raise_for_status()
-            return response.json()
+            if page == 1:
+                self.last_etag = response.headers.get('ETag')
+            tickets = response.json()
+            yield tickets
+
+            headers = self.headers
+            page += 1
+            if 'next' in response.links:
+                url, params = response.links['next']['url'], None
+            elif params is not None and len(tickets) == per_page and page <= int(response.headers.get('X-Total-Pages', page)):
+                params = dict(params, page=page)
+            else:
+                url = None
+
+    def iter_new_user_requests(self, per_page=PAGE_SIZE):
+        """Yields only tickets created or updated since the previous poll.
+
+        Pages are read newest first and reading stops at the first ticket older
+        than the stored cursor, so an idle service desk costs a single
+        conditional request. The cursor and ETag are saved once the poll has
+        been read to the end.
+        """
+        cursor = self.load_cursor()
+        since = parse_timestamp(cursor['updated_at']) if cursor.get('updated_at') else None
+        # Tickets sharing the cursor's timestamp were not necessarily all seen
+        seen_at_cursor = set(cursor.get('ids', []))
+        newest = since
+        ids_at_newest = set(seen_at_cursor)
+
+        for tickets in self.iter_request_pages(per_page, cursor.get('etag') if since else None):
+            if tickets is None:
+                logging.info("No SolarWinds ticket changes since the last poll.")
+                return
+            reached_cursor = False
+            for ticket in tickets:
+                updated = parse_timestamp(ticket.get('updated_at') or ticket.get('created_at'))
+                if since is not None and updated is not None:
+                    if updated < since:
+                        reached_cursor = True
+                        break
+                    if updated == since and ticket.get('id') in seen_at_cursor:
+                        continue
+                if updated is not None:
+                    if newest is None or updated > newest:
+                        newest = updated
+                        ids_at_newest = set()
+                    if updated == newest:
+                        ids_at_newest.add(ticket.get('id'))
+                yield ticket
+            if reached_cursor:
+                break
+
+        self.save_cursor({"updated_at": newest.isoformat() if newest else None,
+                          "ids": sorted(ids_at_newest, key=str),
+                          "etag": self.last_etag or cursor.get('etag')})
+
+    def fetch_new_user_requests(self):
+        try:
+            return list(self.iter_new_user_requests())
+        except Exception as e:
+            logging.error(f"Failed to fetch new user requests: {e}")
+            return []
+
+    def fetch_ticket_records(self):
+        # Compact records instead of raw JSON; see ticket_records.py
+        try:
+            return [record for page in self.iter_request_pages() for record in normalize_tickets(page)]
         except Exception as e:
             logging.error(f"Failed to fetch user requests: {e}")
             return []
 
+    def fetch_new_ticket_records(self):
+        try:
+            return list(normalize_tickets(self.iter_new_user_requests()))
+        except Exception as e:
+            logging.error(f"Failed to fetch new user requests: {e}")
+            return []
+
+    def load_cursor(self):
+        try:
+            with open(self.cursor_path, encoding='utf-8') as cursor_file:
+                return json.load(cursor_file).get(self.api_url, {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_cursor(self, cursor):
+        try:
+            with open(self.cursor_path, encoding='utf-8') as cursor_file:
+                cursors = json.load(cursor_file)
+        except (OSError, ValueError):
+            cursors = {}
+        cursors[self.api_url] = cursor
+        os.makedirs(os.path.dirname(os.path.abspath(self.cursor_path)), exist_ok=True)
+        temporary_path = f"{self.cursor_path}.tmp"
+        with open(temporary_path, "w", encoding='utf-8') as cursor_file:
+            json.dump(cursors, cursor_file)
+        os.replace(temporary_path, self.cursor_path)
+
     def update_ticket(self, ticket_id, note):
+        # Blocking; bulk runs queue notes on ticket_writeback.TicketWriteback instead
         try:
-            url = f"{self.api_url}/requests/{ticket_id}"
-            payload = {"note": note}
-            response = requests.put(url, headers=self.headers, json=payload)
-            response.raise_for_status()
+            self.put_note(ticket_id, note)
             logging.info(f"Updated ticket {ticket_id}")
         except Exception as e:
             logging.error(f"Failed to update ticket {ticket_id}: {e}")
 
+    def put_note(self, ticket_id, note):
+        url = f"{self.api_url}/requests/{ticket_id}"
+        payload = {"note": note}
+        response = http_transport.put(url, headers=self.headers, json=payload)
+        response.raise_for_status()
+
     def get_manager_email(self, ticket):
         try:
-            # Assuming the ticket data contains a 'customFields' dictionary with manager email
-            custom_fields = ticket.get('customFields', [])
-            for field in custom_fields:
-                if field.get('name') == 'ManagerEmail':
-                    return field.get('value', 'manager@default.com')
-            logging.warning(f"Manager email not found in ticket {ticket.get('id', 'unknown')}")
-            return 'manager@default.com'
+            # Accepts a TicketRecord or a raw ticket dict
+            record = ticket if isinstance(ticket, TicketRecord) else TicketRecord.from_ticket(ticket)
+            if record.manager_email:
+                return record.manager_email
+            logging.warning(f"Manager email not found in ticket {record.id or 'unknown'}")
+            return DEFAULT_MANAGER_EMAIL
         except Exception as e:
             logging.error(f"Failed to extract manager email: {e}")
-            return 'manager@default.com'
+            return DEFAULT_MANAGER_EMAIL
@@ -0,0 +1,146 @@
+import logging
+import os
+import time
+import config
+from graph_batch import GraphBatchClient, split_retryable
+from migration_executor import MigrationExecutor
+from migration_journal import SOURCE_DELETED, SOURCE_RESTORED, MigrationJournal
+
+DELETED = "deleted"
+RESTORED = "restored"
+KEPT = "kept"
+
+
+def open_deletion_record(tenant_id):
+    # Kept apart from the migration journals, which a fresh run moves aside,
+    # so every deletion stays on record
+    return MigrationJournal(os.path.join(config.CACHE_DIR, "deleted", f"{tenant_id}.jsonl"), resume=True)
+
+
+def restorable_ids(record):
+    # Deleted source users that have not been restored since
+    ids = []
+    for source_id in record.users_with(SOURCE_DELETED):
+        data = record.data(source_id)
+        if data.get('deleted_at', 0) > data.get('restored_at', 0):
+            ids.append(source_id)
+    return ids
+
+
+class SourceCleanup:
+    """Deletes migrated users from the source tenant.
+
+    Works from the MigrationPlan that migrated the users. A source user is
+    only deleted when the destination account is the one the plan matched
+    (an existing user) or the journal recorded creating. That account is
+    checked against the plan's DestinationIndex under its UPN, or under its
+    email for guests, so checking is a dictionary lookup, not a GET.
+    Conflicts and users that were not created are kept. Deletes go out as
+    $batch DELETE requests of 20 under the same adaptive limit as the
+    migration.
+
+    Each deleted object id is appended to the deletion record. Deleted users
+    stay in the source tenant's deleted items for 30 days, and restore()
+    brings them back from there.
+    """
+
+    def __init__(self, source, destination, record, executor=None):
+        if source.tenant_id == destination.tenant_id:
+            raise ValueError("Source and destination are the same tenant; refusing to delete migrated users")
+        self.source = source
+        self.destination = destination
+        self.record = record
+        self.executor = executor or MigrationExecutor()
+
+    def verify(self, plan, journal=None):
+        """Splits plan entries into ([(source_id, key)] safe to delete, [(key, reason)] to keep)."""
+        migrated, kept = plan.migrated(journal)
+        return [(entry.user_data['sourceId'], entry.key) for entry, _ in migrated], kept
+
+    def delete(self, plan, journal=None, checkpoint=None, on_user=None, on_progress=None):
+        """Deletes the source accounts the plan migrated; returns counts: deleted, kept, failed."""
+        verified, kept = self.verify(plan, journal)
+        stats = {DELETED: 0, KEPT: len(kept), "failed": 0}
+        total = len(verified) + len(kept)
+        finished = [0]
+
+        def report(key, status):
+            finished[0] += 1
+            if on_user is not None:
+                on_user(key, status)
+            if on_progress is not None:
+                on_progress(finished[0], total)
+
+        for upn, reason in kept:
+            logging.warning(f"Keeping source account of {upn}: {reason}")
+            report(upn, f"{KEPT}: {reason}")
+
+        upns = dict(verified)
+
+        def on_done(source_id, step):
+            # A 404 means an earlier run already deleted it
+            if step['error'] is None or step['status'] == 404:
+                self.record.record(source_id, SOURCE_DELETED, upn=upns[source_id], deleted_at=time.time())
+                stats[DELETED] += 1
+                logging.info(f"Deleted source account of {upns[source_id]} ({source_id})")
+                report(upns[source_id], DELETED)
+            else:
+                logging.error(f"Failed to delete source account of {upns[source_id]}: {step['error']}")
+                stats["failed"] += 1
+                report(upns[source_id], f"failed: {step['error']}")
+
+        units = [(source_id, [("delete", "DELETE", f"/users/{source_id}", None)]) for source_id, _ in verified]
+        self.run(units, on_done, checkpoint)
+        return stats
+
+    def restore(self, source_ids=None, checkpoint=None, on_user=None, on_progress=None):
+        """Restores deleted source users, by default all the record still lists as deleted."""
+        if source_ids is None:
+            source_ids = restorable_ids(self.record)
+        stats = {RESTORED: 0, "failed": 0}
+        finished = [0]
+
+        def on_done(source_id, step):
+            upn = self.record.data(source_id).get('upn', source_id)
+            if step['error'] is None:
+                self.record.record(source_id, SOURCE_RESTORED, restored_at=time.time())
+                stats[RESTORED] += 1
+                status = RESTORED
+            else:
+                # A 404 here means the 30 days in deleted items have passed
+                logging.error(f"Failed to restore source account of {upn}: {step['error']}")
+                stats["failed"] += 1
+                status = f"failed: {step['error']}"
+            finished[0] += 1
+            if on_user is not None:
+                on_user(upn, status)
+            if on_progress is not None:
+                on_progress(finished[0], len(source_ids))
+
+        units = [(source_id, [("restore", "POST", f"/directory/deletedItems/{source_id}/restore", None)])
+                 for source_id in source_ids]
+        self.run(units, on_done, checkpoint)
+        return stats
+
+    def run(self, units, on_done, checkpoint=None):
+        # One step per unit; on_done(source_id, step_result) for each
+        client = GraphBatchClient(self.source.graph_headers)
+        results = {}
+
+        def send_batch(batch):
+            batch_results = client.send(batch)
+            results.update(batch_results)
+            done, retry_units, retry_after = split_retryable(batch, batch_results)
+            return [(key, results[key]) for key in done], retry_units, retry_after
+
+        def on_finished(key, steps):
+            on_done(key, next(iter(steps.values())))
+
+        def on_failed(batch, error):
+            for key, steps in batch:
+                step = results.get(key, {}).get(steps[0][0]) or {"status": None, "body": None, "retry_after": None,
+                                                                 "error": str(error or "retries exhausted")}
+                on_done(key, step)
+
+        self.executor.run(list(client.pack(units)), send_batch, on_done=on_finished, on_failed=on_failed,
+                          checkpoint=checkpoint)
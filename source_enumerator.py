@@ -0,0 +1,121 @@
+import logging
+import sys
+from graph_paging import GRAPH_API_URL, MAX_PAGE_SIZE, iter_pages
+
+# Only the fields the listing and the migration read are requested
+USER_FIELDS = ("id", "displayName", "givenName", "surname", "userPrincipalName", "mail", "department", "jobTitle",
+               "companyName")
+GROUP_FIELDS = ("id", "displayName", "mail", "description")
+DRIVE_ITEM_FIELDS = ("id", "name", "size", "file", "folder", "parentReference")
+
+USERS = "Users"
+GROUPS = "Groups"
+FILES = "Files"
+
+
+def quote(value):
+    # OData string literal
+    return "'" + value.replace("'", "''") + "'"
+
+
+def startswith_filter(fields, search):
+    return " or ".join(f"startswith({field},{quote(search)})" for field in fields)
+
+
+def _text(value):
+    # Interned so repeated departments, titles and companies share one string
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class SourceEnumerator:
+    """Pages through the objects of a source tenant for the data listing.
+
+    Each method yields one list of listing rows per Graph page, so callers
+    can stop reading at any point. A search term is applied on the server as
+    a startswith $filter.
+    """
+
+    def __init__(self, get_headers, page_size=MAX_PAGE_SIZE):
+        self.get_headers = get_headers
+        self.page_size = page_size
+
+    def users(self, search=None, extra_filter=None):
+        filters = [f"({startswith_filter(('displayName', 'userPrincipalName', 'mail'), search)})"] if search else []
+        if extra_filter:
+            filters.append(f"({extra_filter})")
+        params = {"$select": ",".join(USER_FIELDS), "$top": self.page_size}
+        if filters:
+            params["$filter"] = " and ".join(filters)
+        for page in iter_pages(f"{GRAPH_API_URL}/users", self.get_headers, params):
+            yield [user_row(user) for user in page]
+
+    def groups(self, search=None):
+        params = {"$select": ",".join(GROUP_FIELDS), "$top": self.page_size}
+        if search:
+            params["$filter"] = startswith_filter(("displayName", "mail"), search)
+        for page in iter_pages(f"{GRAPH_API_URL}/groups", self.get_headers, params):
+            yield [group_row(group) for group in page]
+
+    def drive_items(self, owner_ids, search=None):
+        # Files in the OneDrive of each owner. The delta of the drive root lists
+        # the whole tree flat, which avoids one request per folder.
+        for owner_id in owner_ids:
+            if search:
+                url = f"{GRAPH_API_URL}/users/{owner_id}/drive/root/search(q={quote(search)})"
+            else:
+                url = f"{GRAPH_API_URL}/users/{owner_id}/drive/root/delta"
+            params = {"$select": ",".join(DRIVE_ITEM_FIELDS), "$top": self.page_size}
+            try:
+                for page in iter_pages(url, self.get_headers, params):
+                    yield [drive_item_row(owner_id, item) for item in page if 'file' in item]
+            except Exception as e:
+                # Users without a OneDrive license have no drive
+                logging.warning(f"Failed to list files for {owner_id}: {e}")
+
+    def pages(self, kind, search=None, owner_ids=()):
+        if kind == USERS:
+            return self.users(search)
+        if kind == GROUPS:
+            return self.groups(search)
+        if kind == FILES:
+            return self.drive_items(owner_ids, search)
+        raise ValueError(f"Unknown listing kind: {kind}")
+
+
+# Listing rows are (key, label, payload) with a compact tuple payload; the
+# *_from_payload helpers turn a selected row back into the dicts the
+# migration code takes.
+
+def user_row(user):
+    upn = user.get('userPrincipalName') or ''
+    label = f"{user.get('displayName') or upn} <{upn}>"
+    given, surname = user.get('givenName'), user.get('surname')
+    if not given and not surname:
+        given, _, surname = (user.get('displayName') or upn.split('@')[0]).partition(' ')
+    payload = (user['id'], given or '', surname or '', user.get('mail') or upn, _text(user.get('department')),
+               _text(user.get('jobTitle')), _text(user.get('companyName')))
+    return user['id'], label, payload
+
+
+def user_data_from_payload(payload):
+    source_id, first_name, last_name, email, department, job_title, company_name = payload
+    user_data = {'sourceId': source_id, 'firstName': first_name, 'lastName': last_name, 'email': email}
+    for key, value in (('department', department), ('jobTitle', job_title), ('companyName', company_name)):
+        if value:
+            user_data[key] = value
+    return user_data
+
+
+def group_row(group):
+    label = group.get('displayName') or group['id']
+    if group.get('mail'):
+        label = f"{label} <{group['mail']}>"
+    return group['id'], label, (group['id'], group.get('displayName'), group.get('mail'))
+
+
+def drive_item_row(owner_id, item):
+    parent_path = (item.get('parentReference') or {}).get('path', '')
+    path = parent_path.split(':', 1)[-1] if ':' in parent_path else parent_path
+    size = item.get('size') or 0
+    label = f"{path.rstrip('/')}/{item.get('name')} ({size / 1024:.0f} KB)"
+    return f"{owner_id}:{item['id']}", label, (owner_id, item['id'], item.get('name'), size, path)
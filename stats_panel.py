@@ -0,0 +1,98 @@
+import logging
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QFileDialog, QHeaderView)
+from PyQt5.QtCore import Qt, QTimer
+from metrics import get_metrics
+
+COLUMNS = ("Service", "Method", "Endpoint", "Requests", "Errors", "Throttled", "Retries", "KB",
+           "p50 ms", "p95 ms", "p99 ms")
+REFRESH_INTERVAL_MS = 1000
+
+
+class StatsPanel(QWidget):
+    """Live view of the request metrics, refreshed once a second while shown."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle('Request Statistics')
+        self.resize(900, 400)
+        self.init_ui()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        self.summary_label = QLabel('')
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.export_button = QPushButton('Export...')
+        self.export_button.clicked.connect(self.export)
+        buttons.addWidget(self.export_button)
+
+        self.reset_button = QPushButton('Reset')
+        self.reset_button.clicked.connect(self.reset)
+        buttons.addWidget(self.reset_button)
+        layout.addLayout(buttons)
+
+        self.setLayout(layout)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(REFRESH_INTERVAL_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        metrics = get_metrics()
+        rows = metrics.endpoint_summary()
+        self.table.setRowCount(len(rows))
+        for row_number, row in enumerate(rows):
+            values = (row['service'], row['method'], row['endpoint'], row['requests'], row['errors'],
+                      row['throttled'], row['retries'], f"{row['bytes'] / 1024:.1f}",
+                      f"{row['p50'] * 1000:.0f}", f"{row['p95'] * 1000:.0f}", f"{row['p99'] * 1000:.0f}")
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if column >= 3:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row_number, column, item)
+
+        counters, histograms = metrics.snapshot()
+        time_in = {}
+        for (name, _), (_, total, _, _, _, _) in histograms.items():
+            if name in ("request_seconds", "token_acquire_seconds", "smtp_send_seconds", "smtp_connect_seconds"):
+                time_in[name] = time_in.get(name, 0.0) + total
+        users = sum(count for (name, _), (_, _, count, _, _, _) in histograms.items() if name == "user_seconds")
+        retries = sum(value for (name, _), value in counters.items() if name == "retries_total")
+        throttled_steps = sum(value for (name, labels), value in counters.items()
+                              if name == "batch_steps_total" and dict(labels).get("status") in ("429", "503"))
+        self.summary_label.setText(
+            f"Users: {users}   Retries: {retries}   Throttled batch steps: {throttled_steps}   "
+            f"HTTP: {time_in.get('request_seconds', 0.0):.1f}s   "
+            f"Token: {time_in.get('token_acquire_seconds', 0.0):.1f}s   "
+            f"SMTP: {time_in.get('smtp_send_seconds', 0.0) + time_in.get('smtp_connect_seconds', 0.0):.1f}s")
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export Metrics', 'metrics.prom',
+                                              'Prometheus text (*.prom *.txt);;JSON (*.json)')
+        if not path:
+            return
+        try:
+            get_metrics().export(path)
+            logging.info(f"Exported metrics to {path}")
+        except Exception as e:
+            logging.error(f"Failed to export metrics: {e}")
+
+    def reset(self):
+        get_metrics().reset()
+        self.refresh()
@@ -0,0 +1,290 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+import config
+from metrics import get_metrics
+
+# Runs several source -> destination migrations at once, one worker process
+# per tenant pair. Each worker signs in on its own and has its own HTTP
+# session pool, adaptive limiter and metrics, so independent pairs draw on
+# their own Graph throttling quotas and CPU cores. Like migration_core, this
+# module never imports PyQt.
+
+PROGRESS_INTERVAL = 0.5  # Seconds between progress messages from one worker
+
+_queue = None  # Set in each worker process by init_worker()
+
+
+def load_jobs(path):
+    """Job specs from a JSON list, or one JSON object per line.
+
+    A spec is {"name", "source": tenant, "destination": tenant, ...} where a
+    tenant is {"tenant_id", "client_id", "client_secret_env"} for an app
+    registration, or {"profile"} to reuse a sign-in saved by the GUI. Optional
+    keys: "user_filter" (Graph $filter on source users), "group_id",
+    "memberships", "files", "delete_source" and "resume".
+    """
+    with open(path, encoding="utf-8") as jobs_file:
+        content = jobs_file.read()
+    if content.lstrip().startswith("["):
+        jobs = json.loads(content)
+    else:
+        jobs = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for number, job in enumerate(jobs, 1):
+        job.setdefault("name", f"job{number}")
+        for side in ("source", "destination"):
+            if not isinstance(job.get(side), dict):
+                raise ValueError(f"Job {job['name']} has no {side} tenant")
+    names = [job["name"] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Job names must be unique")
+    return jobs
+
+
+def build_credential(tenant):
+    # Runs in the worker, so every process holds its own credential and tokens
+    if tenant.get("profile"):
+        import credential_store
+        result = credential_store.sign_in(tenant["profile"], interactive=False)
+        if result is None:
+            raise RuntimeError(f"No saved sign-in for profile {tenant['profile']}; sign in from the GUI first")
+        return result[0]
+    from azure.identity import ClientSecretCredential
+    secret = os.getenv(tenant.get("client_secret_env") or "AZURE_CLIENT_SECRET")
+    if not (tenant.get("tenant_id") and tenant.get("client_id") and secret):
+        raise ValueError("A tenant needs tenant_id, client_id and a secret in client_secret_env")
+    return ClientSecretCredential(tenant["tenant_id"], tenant["client_id"], secret)
+
+
+class Reporter:
+    """Sends a worker's progress and item results to the parent process."""
+
+    def __init__(self, name):
+        self.name = name
+        self.stage = None
+        self.counts = {}
+        self._last_sent = 0.0
+
+    def start(self, stage):
+        self.stage = stage
+        self.counts[stage] = {}
+        self._last_sent = 0.0
+
+    def item(self, key, status):
+        outcome = status.split(":", 1)[0]
+        counts = self.counts[self.stage]
+        counts[outcome] = counts.get(outcome, 0) + 1
+        if outcome in ("failed", "conflict"):
+            _queue.put(("item", self.name, self.stage, key, status))
+
+    def progress(self, done, total):
+        now = time.monotonic()
+        if done < total and now - self._last_sent < PROGRESS_INTERVAL:
+            return
+        self._last_sent = now
+        _queue.put(("progress", self.name, self.stage, done, total))
+
+
+def init_worker(progress_queue, log_level):
+    global _queue
+    _queue = progress_queue
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+
+
+def run_job(job, use_destination_cache=True):
+    """Runs one tenant pair in the current (worker) process; returns its summary."""
+    from file_migration import FileMigrator
+    from membership_migration import MembershipMigrator
+    from migration_core import TenantService
+    from migration_journal import MigrationJournal, migrated_accounts
+    from migration_planner import MigrationPlanner
+    from source_cleanup import SourceCleanup, open_deletion_record
+    from source_enumerator import SourceEnumerator, user_data_from_payload
+
+    started = time.monotonic()
+    # A pool process may run several jobs; each summary carries only its own metrics
+    get_metrics().reset()
+    reporter = Reporter(job["name"])
+    summary = {"name": job["name"], "ok": True, "error": None, "stages": reporter.counts}
+    source = destination = None
+    try:
+        source = TenantService(build_credential(job["source"]), job["source"].get("tenant_id"), use_cache=False)
+        destination = TenantService(build_credential(job["destination"]), job["destination"].get("tenant_id"),
+                                    use_cache=use_destination_cache)
+        _queue.put(("started", job["name"], source.tenant_id, destination.tenant_id))
+
+        users = []
+        for rows in SourceEnumerator(source.graph_headers).users(extra_filter=job.get("user_filter")):
+            users.extend(user_data_from_payload(payload) for _, _, payload in rows)
+
+        # A journal per pair, since several sources may share one destination
+        journal = MigrationJournal(os.path.join(config.CACHE_DIR, "journals",
+                                                f"{destination.tenant_id}-{source.tenant_id}.jsonl"),
+                                   resume=job.get("resume", True))
+        try:
+            reporter.start("users")
+            planner = MigrationPlanner(destination)
+            plan = planner.plan_users(users, job.get("group_id"), journal)
+            logging.info(f"{job['name']}: {plan.summary()}")
+            planner.execute(plan, on_user=reporter.item, on_progress=reporter.progress, journal=journal)
+
+            if job.get("memberships"):
+                reporter.start("memberships")
+                migrator = MembershipMigrator(source, destination, migrated_accounts(journal))
+                stats = migrator.migrate(on_progress=reporter.progress)
+                reporter.counts["memberships"] = stats
+
+            if job.get("files"):
+                reporter.start("files")
+                # Only users this plan migrated, each to the one destination
+                # account it holds, so no drive is copied into someone else's
+                migrated, skipped = plan.migrated(journal)
+                for key, reason in skipped:
+                    logging.info(f"{job['name']}: not copying files of {key}: {reason}")
+                owners = {entry.user_data['sourceId']: destination_id for entry, destination_id in migrated}
+                FileMigrator(source, destination, journal).migrate_drives(owners, on_file=reporter.item,
+                                                                          on_progress=reporter.progress)
+
+            if job.get("delete_source"):
+                reporter.start("delete_source")
+                record = open_deletion_record(source.tenant_id)
+                try:
+                    SourceCleanup(source, destination, record).delete(plan, journal, on_user=reporter.item,
+                                                                     on_progress=reporter.progress)
+                finally:
+                    record.close()
+        finally:
+            journal.close()
+    except Exception as e:
+        logging.error(f"Failed to run migration job {job['name']}: {e}")
+        summary["ok"] = False
+        summary["error"] = str(e)
+    finally:
+        for service in (source, destination):
+            if service is not None:
+                service.close()
+    summary["seconds"] = time.monotonic() - started
+    summary["metrics"] = get_metrics().snapshot()
+    return summary
+
+
+class TenantOrchestrator:
+    """Runs migration jobs for several tenant pairs in parallel processes.
+
+    Workers are started with the spawn method so each begins with a clean
+    interpreter: no sessions, token managers or locks inherited from the
+    parent. Progress comes back over a queue and is summed across jobs for
+    on_progress(done, total, rate); on_item(job, key, status) receives
+    failures and conflicts, and on_job(summary) each finished job. Each
+    job's request metrics are merged into this process's registry.
+    """
+
+    def __init__(self, jobs, processes=None, log_level=logging.WARNING):
+        self.jobs = jobs
+        processes = processes or config.ORCHESTRATOR_MAX_PROCESSES
+        self.processes = max(1, min(processes, len(jobs)))
+        self.log_level = log_level
+        self.progress = {}  # job name -> {stage: (done, total)}
+
+    def shared_destinations(self):
+        # Destination tenants more than one job writes to
+        seen = set()
+        shared = set()
+        for job in self.jobs:
+            tenant = job["destination"].get("tenant_id") or job["destination"].get("profile")
+            if tenant in seen:
+                shared.add(tenant)
+            seen.add(tenant)
+        return shared
+
+    def run(self, on_progress=None, on_item=None, on_job=None):
+        """Runs every job; returns their summaries in job order."""
+        started = time.monotonic()
+        context = multiprocessing.get_context("spawn")
+        progress_queue = context.Queue()
+        shared = self.shared_destinations()
+        summaries = {}
+
+        def handle(message):
+            kind, name = message[0], message[1]
+            if kind == "started":
+                logging.info(f"Job {name}: {message[2]} -> {message[3]}")
+            elif kind == "progress":
+                _, _, stage, done, total = message
+                # Stages count different things, so each keeps its own
+                # figures; a job's finished stages stay in the totals
+                self.progress.setdefault(name, {})[stage] = (done, total)
+                if on_progress is not None:
+                    done_all, total_all = self.totals()
+                    elapsed = time.monotonic() - started
+                    on_progress(done_all, total_all, done_all / elapsed if elapsed > 0 else 0.0)
+            elif kind == "item" and on_item is not None:
+                _, _, stage, key, status = message
+                on_item(name, key, f"{stage} {status}")
+
+        def drain(timeout):
+            try:
+                handle(progress_queue.get(timeout=timeout))
+                while True:
+                    handle(progress_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=context, initializer=init_worker,
+                                 initargs=(progress_queue, self.log_level)) as pool:
+            # The directory cache is SQLite, so a destination shared by several
+            # jobs is read live instead of from one cache file in several processes
+            futures = {pool.submit(run_job, job, (job["destination"].get("tenant_id")
+                                                  or job["destination"].get("profile")) not in shared): job["name"]
+                       for job in self.jobs}
+            pending = set(futures)
+            while pending:
+                drain(0.2)
+                for future in [future for future in pending if future.done()]:
+                    pending.discard(future)
+                    name = futures[future]
+                    try:
+                        summary = future.result()
+                    except Exception as e:
+                        # The worker process itself died
+                        logging.error(f"Migration job {name} did not finish: {e}")
+                        summary = {"name": name, "ok": False, "error": str(e), "stages": {}, "seconds": 0.0}
+                    # Worker request metrics join this process's, for export
+                    metrics = summary.pop("metrics", None)
+                    if metrics is not None:
+                        get_metrics().merge(metrics)
+                    summaries[name] = summary
+                    if on_job is not None:
+                        on_job(summary)
+            drain(0)
+        return [summaries[job["name"]] for job in self.jobs]
+
+    def totals(self):
+        # Summed over every stage of every job, so done never goes down
+        stages = [figures for job in self.progress.values() for figures in job.values()]
+        return sum(done for done, _ in stages), sum(total for _, total in stages)
+
+
+def summarize(summaries, seconds):
+    """Combined summary lines: one per job, then the totals."""
+    lines = []
+    totals = {}
+    for summary in summaries:
+        parts = []
+        for stage, counts in summary["stages"].items():
+            parts.append(f"{stage} " + ", ".join(f"{count} {outcome}" for outcome, count in counts.items()))
+            if stage == "users":
+                for outcome, count in counts.items():
+                    totals[outcome] = totals.get(outcome, 0) + count
+        state = "ok" if summary["ok"] else f"failed: {summary['error']}"
+        lines.append(f"{summary['name']}: {state} in {summary['seconds']:.1f}s; {'; '.join(parts) or 'nothing run'}")
+    failed_jobs = sum(1 for summary in summaries if not summary["ok"])
+    users = sum(totals.values())
+    lines.append(f"total: {len(summaries)} jobs ({failed_jobs} failed), {users} users "
+                 f"({', '.join(f'{count} {outcome}' for outcome, count in totals.items()) or 'none'}) "
+                 f"in {seconds:.1f}s ({users / seconds if seconds > 0 else 0.0:.1f} users/s)")
+    return lines
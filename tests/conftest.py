@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.mock_server import GRAPH_PREFIX, FaultProfile, MockDirectory, start_server
+
+# config reads its settings on import, so the mock server and a scratch cache
+# directory are set up before any module of the tool is imported. Throttled
+# requests are retried without waiting and often enough never to run out.
+_directory = MockDirectory(groups=0)
+_server = start_server(directory=_directory)
+os.environ["GRAPH_API_URL"] = f"{_server.base_url}{GRAPH_PREFIX}"
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="migration-tests-")
+os.environ["HTTP_BACKOFF_FACTOR"] = "0"
+os.environ["HTTP_MAX_RETRIES"] = "8"
+os.environ["MIGRATION_MAX_ATTEMPTS"] = "10"
+
+from benchmarks.run_benchmark import MockCredential
+from metrics import get_metrics
+from migration_core import TenantService
+
+
+@pytest.fixture
+def server():
+    # Tests set server.faults to inject latency, throttling and errors
+    yield _server
+    _server.faults = FaultProfile()
+
+
+@pytest.fixture
+def directory():
+    # The mock tenant holds both sides: source users are given UPNs outside
+    # @yourdomain.com so they never match a destination account
+    with _directory.lock:
+        _directory.reset(groups=0)
+    get_metrics().reset()
+    return _directory
+
+
+@pytest.fixture
+def source(directory):
+    service = TenantService(MockCredential(), "source-tenant", use_cache=False)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def destination(directory):
+    service = TenantService(MockCredential(), "destination-tenant", use_cache=False)
+    yield service
+    service.close()
+
+
+def add_user(directory, upn, mail=None, **fields):
+    """Adds a user to the mock tenant; returns its id."""
+    user_id = str(uuid.uuid4())
+    with directory.lock:
+        directory.users[user_id] = dict(fields, id=user_id, userPrincipalName=upn, mail=mail)
+        directory.users_by_key[upn.lower()] = user_id
+        if mail:
+            directory.users_by_key[mail.lower()] = user_id
+    return user_id
+
+
+def add_group(directory, name, members=()):
+    group_id = str(uuid.uuid4())
+    with directory.lock:
+        directory.groups[group_id] = {"id": group_id, "displayName": name, "members": set(members)}
+    return group_id
+
+
+def source_user(directory, first_name, last_name, number=1, **fields):
+    """Adds a source user and returns its user_data, as the source listing builds it."""
+    source_id = add_user(directory, f"{first_name}.{last_name}.{number}@source.test".lower(),
+                         givenName=first_name, surname=last_name)
+    user_data = {'sourceId': source_id, 'firstName': first_name, 'lastName': last_name,
+                 'email': f"{first_name}{number}@elsewhere.test".lower()}
+    user_data.update(fields)
+    return user_data
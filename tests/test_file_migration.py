@@ -0,0 +1,93 @@
+import os
+import pytest
+from conftest import source_user
+from file_migration import SIMPLE_UPLOAD_LIMIT, UPLOAD_FRAGMENT, FileMigrator
+from migration_journal import MigrationJournal, migrated_accounts
+from migration_planner import MigrationPlanner
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.jsonl"))
+    yield journal
+    journal.close()
+
+
+def files_of(directory, owner_id):
+    return {f"{item['path'].split(':', 1)[1]}/{item['name']}".strip("/"): item['content']
+            for item in directory.files.values() if item['owner'] == owner_id}
+
+
+def test_files_go_only_to_the_account_migrated_from_their_owner(directory, source, destination, journal):
+    first = source_user(directory, "Jane", "Doe", number=1)
+    second = source_user(directory, "Jane", "Doe", number=2)
+    directory.add_file(first['sourceId'], "Documents/plan.docx", b"first")
+    directory.add_file(second['sourceId'], "Documents/plan.docx", b"second")
+    planner = MigrationPlanner(destination)
+    plan = planner.plan_users([first, second], journal=journal)
+    planner.execute(plan, journal=journal)
+
+    # Both users rebuild to jane.doe@yourdomain.com; only the first was migrated
+    migrated, _ = plan.migrated(journal)
+    owners = {entry.user_data['sourceId']: destination_id for entry, destination_id in migrated}
+    assert owners == migrated_accounts(journal)
+    stats = FileMigrator(source, destination, journal).migrate_drives(owners)
+
+    destination_id = journal.data("jane.doe@yourdomain.com")['id']
+    assert list(owners) == [first['sourceId']]
+    assert stats[first['sourceId']].files == 1
+    assert files_of(directory, destination_id) == {"Documents/plan.docx": b"first"}
+
+
+def test_copied_files_are_skipped_on_rerun(directory, source, destination, journal):
+    owner = source_user(directory, "Jane", "Doe")
+    directory.add_file(owner['sourceId'], "a.txt", b"a" * 10)
+    directory.add_file(owner['sourceId'], "Folder/b.txt", b"b" * 10)
+    destination_id = source_user(directory, "Jane", "Doe", number=2)['sourceId']
+    owners = {owner['sourceId']: destination_id}
+
+    FileMigrator(source, destination, journal).migrate_drives(owners)
+    uploads = directory.counts.get("PUT /users/{id}/drive/root:/a.txt:/content", 0)
+    stats = FileMigrator(source, destination, journal).migrate_drives(owners)
+
+    assert stats[owner['sourceId']].skipped == 2
+    assert stats[owner['sourceId']].files == 0
+    assert directory.counts.get("PUT /users/{id}/drive/root:/a.txt:/content", 0) == uploads
+    assert files_of(directory, destination_id) == {"a.txt": b"a" * 10, "Folder/b.txt": b"b" * 10}
+
+
+def test_interrupted_upload_resumes_at_the_next_byte(directory, source, destination, tmp_path):
+    content = os.urandom(SIMPLE_UPLOAD_LIMIT + 3 * UPLOAD_FRAGMENT + 1234)
+    fragments = -(-len(content) // UPLOAD_FRAGMENT)
+    owner = source_user(directory, "Jane", "Doe")
+    directory.add_file(owner['sourceId'], "big.bin", content)
+    destination_id = source_user(directory, "Jane", "Doe", number=2)['sourceId']
+    owners = {owner['sourceId']: destination_id}
+    path = str(tmp_path / "files.jsonl")
+    checkpoints = [0]
+
+    def interrupt():
+        checkpoints[0] += 1
+        if checkpoints[0] == 6:
+            raise Interrupted()
+
+    journal = MigrationJournal(path)
+    stats = FileMigrator(source, destination, journal, chunk_size=UPLOAD_FRAGMENT).migrate_drives(
+        owners, checkpoint=interrupt)
+    journal.close()
+    assert stats[owner['sourceId']].failed == 1
+    sent = directory.counts["PUT /mock/upload"]
+    assert 0 < sent < fragments
+
+    journal = MigrationJournal(path, resume=True)
+    stats = FileMigrator(source, destination, journal, chunk_size=UPLOAD_FRAGMENT).migrate_drives(owners)
+    journal.close()
+
+    assert stats[owner['sourceId']].files == 1
+    assert directory.counts["PUT /mock/upload"] == fragments
+    assert directory.counts["POST /users/{id}/drive/root:/big.bin:/createUploadSession"] == 1
+    assert files_of(directory, destination_id) == {"big.bin": content}
@@ -0,0 +1,76 @@
+import uuid
+from benchmarks.mock_server import FaultProfile
+from conftest import add_group, add_user
+from membership_migration import MembershipMigrator
+from metrics import get_metrics
+
+
+def throttled_requests():
+    counters, _ = get_metrics().snapshot()
+    return sum(value for (name, _), value in counters.items() if name == "throttled_total")
+
+
+def migrated_team(directory, size):
+    # (accounts, destination group id, source group id) for a team of size
+    # members, each with the destination account migrated from it
+    accounts = {}
+    for number in range(size):
+        source_id = add_user(directory, f"member{number}@source.test")
+        accounts[source_id] = add_user(directory, f"member{number}@yourdomain.com")
+    # The destination group comes first, so it is the one matched by name
+    destination_group = add_group(directory, "Team")
+    source_group = add_group(directory, "Team", members=accounts)
+    return accounts, destination_group, source_group
+
+
+def test_members_map_through_migrated_accounts(directory, source, destination):
+    accounts, destination_group, source_group = migrated_team(directory, 3)
+    # Same name as a migrated member, but never migrated itself
+    stranger = add_user(directory, "member0@other.test")
+    directory.groups[source_group]['members'].add(stranger)
+    present = next(iter(accounts.values()))
+    directory.groups[destination_group]['members'].add(present)
+
+    stats = MembershipMigrator(source, destination, accounts).migrate([source_group])
+
+    assert (stats['added'], stats['present'], stats['unresolved'], stats['failed']) == (2, 1, 1, 0)
+    assert directory.groups[destination_group]['members'] == set(accounts.values())
+
+
+def test_throttled_adds_are_retried(directory, server, source, destination):
+    accounts, destination_group, source_group = migrated_team(directory, 45)
+    server.faults = FaultProfile(throttle_rate=0.3, retry_after=0, seed=7)
+
+    stats = MembershipMigrator(source, destination, accounts).migrate([source_group])
+
+    assert throttled_requests() > 0
+    assert stats['added'] == 45
+    assert stats['failed'] == 0
+    assert directory.groups[destination_group]['members'] == set(accounts.values())
+
+
+def test_single_adds_after_a_rejected_batch_are_retried(directory, server, source, destination):
+    accounts, destination_group, source_group = migrated_team(directory, 5)
+    # One member maps to an account that is gone, so the batched PATCH is
+    # rejected and the members are added one by one
+    gone = add_user(directory, "gone@source.test")
+    directory.groups[source_group]['members'].add(gone)
+    mapped = dict(accounts, **{gone: str(uuid.uuid4())})
+    server.faults = FaultProfile(throttle_rate=0.3, retry_after=0, seed=11)
+
+    stats = MembershipMigrator(source, destination, mapped).migrate([source_group])
+
+    assert directory.counts.get("POST /groups/{id}/members/$ref", 0) >= 6
+    assert stats['added'] == 5
+    assert stats['failed'] == 1
+    assert directory.groups[destination_group]['members'] == set(accounts.values())
+
+
+def test_unreadable_selected_group_is_skipped(directory, source, destination):
+    accounts, destination_group, source_group = migrated_team(directory, 2)
+
+    stats = MembershipMigrator(source, destination, accounts).migrate([str(uuid.uuid4()), source_group])
+
+    assert stats['failed_groups'] == 1
+    assert stats['groups'] == 1
+    assert stats['added'] == 2
@@ -0,0 +1,87 @@
+import os
+import time
+from migration_journal import (CREATED, FILE_COPIED, GROUP_ADDED, MIGRATED, MigrationJournal, group_step,
+                               migrated_accounts)
+
+
+def test_resume_replays_completed_steps(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MigrationJournal(path)
+    journal.record("Alice.Brown@yourdomain.com", CREATED, id="dest-1")
+    journal.record("alice.brown@yourdomain.com", group_step("group-1"))
+    journal.close()
+
+    journal = MigrationJournal(path, resume=True)
+    assert journal.is_done("alice.brown@yourdomain.com", CREATED)
+    assert journal.data("ALICE.BROWN@yourdomain.com") == {"id": "dest-1"}
+    assert journal.added_to_group("alice.brown@yourdomain.com", "group-1")
+    assert not journal.added_to_group("alice.brown@yourdomain.com", "group-2")
+    assert journal.users_with(CREATED) == ["alice.brown@yourdomain.com"]
+    journal.close()
+
+
+def test_unkeyed_group_adds_of_older_journals_are_read(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MigrationJournal(path)
+    journal.record("alice", GROUP_ADDED, group_id="group-1")
+    journal.close()
+
+    journal = MigrationJournal(path, resume=True)
+    assert journal.added_to_group("alice", "group-1")
+    assert not journal.added_to_group("alice", "group-2")
+    journal.close()
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MigrationJournal(path)
+    journal.record("file:1", FILE_COPIED)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"user": "file:2", "step": "file_co')
+
+    journal = MigrationJournal(path, resume=True)
+    journal.record("file:3", FILE_COPIED)
+    journal.close()
+
+    journal = MigrationJournal(path, resume=True)
+    assert journal.is_done("file:1", FILE_COPIED)
+    assert not journal.is_done("file:2", FILE_COPIED)
+    assert journal.is_done("file:3", FILE_COPIED)
+    journal.close()
+
+
+def test_fresh_start_moves_old_journal_aside(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MigrationJournal(path)
+    journal.record("alice", CREATED)
+    journal.close()
+
+    journal = MigrationJournal(path, resume=False)
+    assert not journal.is_done("alice", CREATED)
+    journal.close()
+    assert os.path.exists(f"{path}.prev")
+
+
+def test_pending_records_are_synced_without_another_record(tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.jsonl"), fsync_every=100, fsync_interval=0.1)
+    journal.record("alice", CREATED)
+    assert journal._pending == 1
+    deadline = time.monotonic() + 5
+    while journal._pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert journal._pending == 0
+    journal.close()
+
+
+def test_migrated_accounts_refuses_a_destination_claimed_twice(tmp_path):
+    users = MigrationJournal(str(tmp_path / "users.jsonl"))
+    guests = MigrationJournal(str(tmp_path / "guests.jsonl"))
+    users.record("alice.brown@yourdomain.com", MIGRATED, id="dest-1", source_id="source-1")
+    users.record("john.smith@yourdomain.com", MIGRATED, id="dest-2", source_id="source-2")
+    guests.record("john@elsewhere.test", MIGRATED, id="dest-2", source_id="source-3")
+    guests.record("mary@elsewhere.test", MIGRATED, id="dest-3", source_id="source-4")
+
+    assert migrated_accounts(users, guests) == {"source-1": "dest-1", "source-4": "dest-3"}
+    users.close()
+    guests.close()
@@ -0,0 +1,86 @@
+from conftest import add_user, source_user
+from migration_journal import CREATED, MIGRATED, MigrationJournal
+from migration_planner import CONFLICT, CREATE, SKIP, UPDATE, MigrationPlanner
+
+
+def actions(plan):
+    return {entry.key: entry.action for entry in plan.entries}
+
+
+def test_classifies_selection_against_destination(directory, destination):
+    add_user(directory, "john.smith@yourdomain.com", displayName="John Smith", department="Sales",
+             jobTitle="N/A", companyName="N/A")
+    add_user(directory, "mary.jones@yourdomain.com", displayName="Mary Jones", department="HR")
+    add_user(directory, "taken@yourdomain.com", mail="bob1@elsewhere.test")
+    users = [
+        source_user(directory, "Alice", "Brown"),
+        source_user(directory, "John", "Smith", department="Sales"),
+        source_user(directory, "Mary", "Jones", department="Finance"),
+        source_user(directory, "Bob", "White"),
+        source_user(directory, "Alice", "Brown", number=2),
+    ]
+
+    plan = MigrationPlanner(destination).plan_users(users)
+
+    assert [entry.action for entry in plan.entries] == [CREATE, SKIP, UPDATE, CONFLICT, CONFLICT]
+    assert plan.entries[2].changes == {"department": "Finance"}
+    assert "taken@yourdomain.com" in plan.entries[3].reason
+    assert plan.entries[4].reason == "UPN appears twice in the selection"
+    assert plan.counts() == {CREATE: 1, UPDATE: 1, SKIP: 1, CONFLICT: 2}
+
+
+def test_execute_journals_migrated_accounts(directory, destination, tmp_path):
+    existing_id = add_user(directory, "john.smith@yourdomain.com", displayName="John Smith")
+    alice = source_user(directory, "Alice", "Brown")
+    john = source_user(directory, "John", "Smith")
+    journal = MigrationJournal(str(tmp_path / "journal.jsonl"))
+    planner = MigrationPlanner(destination)
+
+    statuses = {}
+    planner.execute(planner.plan_users([alice, john], journal=journal), on_user=statuses.__setitem__,
+                    journal=journal)
+
+    assert statuses == {"alice.brown@yourdomain.com": "created", "john.smith@yourdomain.com": "exists"}
+    created_id = journal.data("alice.brown@yourdomain.com")['id']
+    assert directory.users[created_id]['userPrincipalName'] == "alice.brown@yourdomain.com"
+    assert journal.is_done("alice.brown@yourdomain.com", MIGRATED)
+    assert journal.data("alice.brown@yourdomain.com")['source_id'] == alice['sourceId']
+    assert journal.data("john.smith@yourdomain.com") == {"id": existing_id, "source_id": john['sourceId']}
+    journal.close()
+
+
+def test_account_migrated_from_another_user_is_a_conflict(directory, destination, tmp_path):
+    add_user(directory, "john.smith@yourdomain.com", displayName="John Smith")
+    first = source_user(directory, "John", "Smith", number=1)
+    second = source_user(directory, "John", "Smith", number=2)
+    journal = MigrationJournal(str(tmp_path / "journal.jsonl"))
+    planner = MigrationPlanner(destination)
+    planner.execute(planner.plan_users([first], journal=journal), journal=journal)
+
+    # A later run selecting only the second John Smith must not take over the account
+    plan = planner.plan_users([second], journal=journal)
+
+    assert actions(plan) == {"john.smith@yourdomain.com": CONFLICT}
+    assert plan.entries[0].reason == "UPN already migrated from another source user"
+    journal.close()
+
+
+def test_resumed_user_is_not_created_again(directory, destination, tmp_path):
+    alice = source_user(directory, "Alice", "Brown")
+    path = str(tmp_path / "journal.jsonl")
+    journal = MigrationJournal(path)
+    planner = MigrationPlanner(destination)
+    planner.execute(planner.plan_users([alice], journal=journal), journal=journal)
+    journal.close()
+    posts = directory.counts.get("POST /users", 0)
+
+    journal = MigrationJournal(path, resume=True)
+    plan = planner.plan_users([alice], journal=journal)
+    statuses = {}
+    planner.execute(plan, on_user=statuses.__setitem__, journal=journal)
+
+    assert journal.is_done("alice.brown@yourdomain.com", CREATED)
+    assert plan.entries[0].steps == 0
+    assert statuses == {"alice.brown@yourdomain.com": "skipped"}
+    assert directory.counts.get("POST /users", 0) == posts
+    journal.close()
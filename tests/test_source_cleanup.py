@@ -0,0 +1,80 @@
+import pytest
+from conftest import add_user, source_user
+from migration_journal import MigrationJournal
+from migration_planner import MigrationPlanner
+from source_cleanup import SourceCleanup
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.jsonl"))
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def record(tmp_path):
+    record = MigrationJournal(str(tmp_path / "deleted.jsonl"))
+    yield record
+    record.close()
+
+
+def test_verify_only_passes_users_the_plan_migrated(directory, source, destination, journal, record):
+    add_user(directory, "john.smith@yourdomain.com", displayName="John Smith")
+    add_user(directory, "taken@yourdomain.com", mail="bob1@elsewhere.test")
+    alice = source_user(directory, "Alice", "Brown")
+    john = source_user(directory, "John", "Smith")
+    bob = source_user(directory, "Bob", "White")
+    alice_again = source_user(directory, "Alice", "Brown", number=2)
+    planner = MigrationPlanner(destination)
+    plan = planner.plan_users([alice, john, bob, alice_again], journal=journal)
+    planner.execute(plan, journal=journal)
+
+    verified, kept = SourceCleanup(source, destination, record).verify(plan, journal)
+
+    assert sorted(verified) == sorted([(alice['sourceId'], "alice.brown@yourdomain.com"),
+                                       (john['sourceId'], "john.smith@yourdomain.com")])
+    assert [key for key, _ in kept] == ["bob.white@yourdomain.com", "alice.brown@yourdomain.com"]
+    assert all(reason.startswith("conflict:") for _, reason in kept)
+
+
+def test_verify_keeps_users_whose_create_did_not_happen(directory, source, destination, journal, record):
+    alice = source_user(directory, "Alice", "Brown")
+    plan = MigrationPlanner(destination).plan_users([alice], journal=journal)
+
+    verified, kept = SourceCleanup(source, destination, record).verify(plan, journal)
+
+    assert verified == []
+    assert kept == [("alice.brown@yourdomain.com", "not created in the destination")]
+
+
+def test_verify_keeps_user_whose_account_was_replaced(directory, source, destination, journal, record):
+    add_user(directory, "john.smith@yourdomain.com", displayName="John Smith")
+    john = source_user(directory, "John", "Smith")
+    plan = MigrationPlanner(destination).plan_users([john], journal=journal)
+    plan.index.by_upn["john.smith@yourdomain.com"] = {"id": "someone-else"}
+
+    verified, kept = SourceCleanup(source, destination, record).verify(plan, journal)
+
+    assert verified == []
+    assert kept == [("john.smith@yourdomain.com", "destination account does not match the migrated one")]
+
+
+def test_delete_removes_only_verified_source_users(directory, source, destination, journal, record):
+    add_user(directory, "taken@yourdomain.com", mail="bob1@elsewhere.test")
+    alice = source_user(directory, "Alice", "Brown")
+    bob = source_user(directory, "Bob", "White")
+    planner = MigrationPlanner(destination)
+    plan = planner.plan_users([alice, bob], journal=journal)
+    planner.execute(plan, journal=journal)
+
+    stats = SourceCleanup(source, destination, record).delete(plan, journal)
+
+    assert stats == {"deleted": 1, "kept": 1, "failed": 0}
+    assert set(directory.deleted) == {alice['sourceId']}
+    assert bob['sourceId'] in directory.users
+
+
+def test_refuses_to_clean_up_within_one_tenant(source, record):
+    with pytest.raises(ValueError):
+        SourceCleanup(source, source, record)
@@ -0,0 +1,98 @@
+import sys
+from datetime import datetime, timezone
+
+DEFAULT_MANAGER_EMAIL = 'manager@default.com'
+
+# Custom field names used on the new-user request form
+MANAGER_EMAIL = 'ManagerEmail'
+FIRST_NAME = 'FirstName'
+LAST_NAME = 'LastName'
+DEPARTMENT = 'Department'
+JOB_TITLE = 'JobTitle'
+COMPANY_NAME = 'CompanyName'
+EMAIL = 'Email'
+
+
+def parse_timestamp(value):
+    # SolarWinds returns ISO 8601 with an offset; fall back to UTC if missing
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class TicketRecord:
+    """The parts of a SolarWinds ticket that provisioning reads.
+
+    Built once per ticket by from_ticket(); the raw JSON is not kept. Custom
+    fields are indexed by name, so lookups do not scan the field list.
+    """
+
+    __slots__ = ('id', 'number', 'name', 'state', 'updated_at', 'fields')
+
+    def __init__(self, ticket_id, number=None, name=None, state=None, updated_at=None, fields=None):
+        self.id = ticket_id
+        self.number = number
+        self.name = name
+        self.state = state
+        self.updated_at = updated_at
+        self.fields = fields or {}
+
+    @classmethod
+    def from_ticket(cls, ticket):
+        fields = {}
+        for field in ticket.get('customFields') or ():
+            name = field.get('name')
+            value = field.get('value')
+            # Keep the first non-empty value if a field appears twice
+            if name and value not in (None, '') and name not in fields:
+                fields[sys.intern(name)] = value
+        return cls(ticket.get('id'), ticket.get('number'), ticket.get('name'), ticket.get('state'),
+                   parse_timestamp(ticket.get('updated_at') or ticket.get('created_at')), fields)
+
+    def field(self, name, default=None):
+        return self.fields.get(name, default)
+
+    @property
+    def manager_email(self):
+        return self.fields.get(MANAGER_EMAIL)
+
+    @property
+    def first_name(self):
+        return self.fields.get(FIRST_NAME)
+
+    @property
+    def last_name(self):
+        return self.fields.get(LAST_NAME)
+
+    @property
+    def department(self):
+        return self.fields.get(DEPARTMENT)
+
+    @property
+    def job_title(self):
+        return self.fields.get(JOB_TITLE)
+
+    def to_user_data(self):
+        # The manifest-row shape TenantService.create_users expects
+        user_data = {
+            'ticketId': self.id,
+            'firstName': self.first_name,
+            'lastName': self.last_name,
+            'department': self.department,
+            'jobTitle': self.job_title,
+            'companyName': self.fields.get(COMPANY_NAME),
+            'email': self.fields.get(EMAIL),
+            'managerEmail': self.manager_email,
+        }
+        return {key: value for key, value in user_data.items() if value is not None}
+
+    def __repr__(self):
+        return f"TicketRecord({self.id!r}, {self.name!r})"
+
+
+def normalize_tickets(tickets):
+    """Yields a TicketRecord per raw ticket dict, so pages can be dropped as they are read."""
+    for ticket in tickets:
+        yield ticket if isinstance(ticket, TicketRecord) else TicketRecord.from_ticket(ticket)
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+import config
+from metrics import get_metrics
+from migration_journal import TICKET_UPDATED
+from solarwinds_api import SolarWindsAPI
+
+COALESCE_DELAY = 0.5  # Seconds a ticket waits for more notes before it is written
+
+_STOP = object()
+
+
+class TicketWriteback:
+    """Writes ticket notes in the background, one update per ticket.
+
+    Notes added for a ticket while it is waiting to be written are merged into
+    a single PUT. A ticket is never written by two workers at once; notes that
+    arrive during a write go out in the next one, in order. Up to ``workers``
+    tickets are written in parallel. Each note goes out in one PUT: the HTTP
+    transport already retries throttled and 5xx answers (honouring
+    Retry-After), and retrying on top of it could post a note twice.
+    """
+
+    def __init__(self, api, workers=None, coalesce_delay=COALESCE_DELAY):
+        self.api = api
+        self.worker_count = workers or config.SOLARWINDS_WRITEBACK_WORKERS
+        self.coalesce_delay = coalesce_delay
+        self._queue = queue.Queue()
+        self._pending = {}  # ticket id -> [(note, on_done)]
+        self._scheduled = set()  # ticket ids queued or being written
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for number in range(self.worker_count):
+                worker = threading.Thread(target=self._run, name=f"ticket-writeback-{number}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def add_note(self, ticket_id, note, on_done=None):
+        # Returns immediately; on_done(ok) is called from a worker thread
+        self.start()
+        with self._lock:
+            self._pending.setdefault(ticket_id, []).append((note, on_done))
+            if ticket_id not in self._scheduled:
+                self._scheduled.add(ticket_id)
+                self._queue.put((ticket_id, time.monotonic() + self.coalesce_delay))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(_STOP)
+        for worker in workers:
+            worker.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    break
+                ticket_id, due = item
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                with self._lock:
+                    notes = self._pending.pop(ticket_id, [])
+                if len(notes) > 1:
+                    get_metrics().count("ticket_notes_coalesced_total", len(notes) - 1)
+                if notes:
+                    ok = self._write(ticket_id, "\n".join(note for note, _ in notes))
+                    for _, on_done in notes:
+                        if on_done is not None:
+                            on_done(ok)
+            except Exception as e:
+                logging.error(f"Ticket write-back worker error: {e}")
+            finally:
+                self._reschedule(item)
+                self._queue.task_done()
+
+    def _reschedule(self, item):
+        if item is _STOP:
+            return
+        ticket_id = item[0]
+        with self._lock:
+            if ticket_id in self._pending:
+                # More notes came in while this ticket was being written
+                self._queue.put((ticket_id, time.monotonic() + self.coalesce_delay))
+            else:
+                self._scheduled.discard(ticket_id)
+
+    def _write(self, ticket_id, note):
+        try:
+            self.api.put_note(ticket_id, note)
+            logging.info(f"Updated ticket {ticket_id}")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to update ticket {ticket_id}: {e}")
+            return False
+
+
+_writeback = None
+_writeback_lock = threading.Lock()
+
+
+def get_ticket_writeback():
+    # None when no SolarWinds token is configured
+    global _writeback
+    if _writeback is None and config.SOLARWINDS_API_TOKEN:
+        with _writeback_lock:
+            if _writeback is None:
+                _writeback = TicketWriteback(SolarWindsAPI(config.SOLARWINDS_API_TOKEN))
+    return _writeback
+
+
+def account_created_note(user_principal_name, group_id=None):
+    note = f"Account {user_principal_name} created"
+    return f"{note} and added to group {group_id}" if group_id else note
+
+
+def guest_invited_note(email, group_id=None):
+    note = f"Guest {email} invited"
+    return f"{note} and added to group {group_id}" if group_id else note
+
+
+def note_ticket(user_data, user, note, journal=None, writeback=None):
+    """Queues a note on the ticket a manifest row came from, if it has one."""
+    ticket_id = user_data.get('ticketId')
+    writeback = writeback or get_ticket_writeback()
+    if not ticket_id or writeback is None:
+        return False
+
+    def on_done(ok):
+        if ok and journal is not None:
+            journal.record(user, TICKET_UPDATED, ticket_id=ticket_id)
+
+    writeback.add_note(ticket_id, note, on_done)
+    return True
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+import jwt
+from metrics import get_metrics
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+REFRESH_MARGIN = 300  # Refresh this many seconds before expires_on
+EXPIRY_SKEW = 30  # Never hand out a token closer than this to expiry
+RETRY_DELAY = 30
+
+
+class TokenManager:
+    """Caches the auth headers for one credential and scope.
+
+    The token is refreshed on a background timer shortly before it expires, so
+    callers normally get the cached headers without touching the credential.
+    Only a missing or already-expired token makes a caller wait.
+    """
+
+    def __init__(self, credential, scope=GRAPH_SCOPE, refresh_margin=REFRESH_MARGIN):
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._expires_on = 0
+        self._headers = None
+        self._timer = None
+        self._closed = False
+
+    def get_headers(self):
+        headers = self._headers
+        if headers is None or self._is_stale():
+            with self._lock:
+                if self._headers is None or self._is_stale():
+                    self._refresh_locked()
+                headers = self._headers
+        return dict(headers)
+
+    def get_token(self):
+        return self.get_headers()["Authorization"][len("Bearer "):]
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._cancel_timer()
+            self._headers = None
+
+    def _is_stale(self):
+        return time.time() >= self._expires_on - EXPIRY_SKEW
+
+    def _refresh_locked(self):
+        with get_metrics().span("token_acquire", scope=self.scope):
+            token = self.credential.get_token(self.scope)
+        self._headers = {
+            "Authorization": f"Bearer {token.token}",
+            "Content-Type": "application/json"
+        }
+        self._expires_on = token.expires_on
+        logging.debug(f"Refreshed token for {self.scope}, expires at {token.expires_on}")
+        self._schedule(token.expires_on - self.refresh_margin - time.time())
+
+    def _schedule(self, delay):
+        self._cancel_timer()
+        if self._closed:
+            return
+        self._timer = threading.Timer(max(delay, 1), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _background_refresh(self):
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._refresh_locked()
+            except Exception as e:
+                logging.error(f"Background token refresh failed for {self.scope}: {e}")
+                self._schedule(RETRY_DELAY)
+
+
+def extract_tenant_id(token):
+    try:
+        decoded = jwt.decode(token, options={"verify_signature": False})
+        return decoded['tid']
+    except Exception as e:
+        logging.error(f"Failed to extract tenant ID: {e}")
+        return None
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(credential, scope=GRAPH_SCOPE):
+    # The registry keeps a reference to the credential, so its id stays unique
+    # for as long as the entry exists.
+    key = (id(credential), scope)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = TokenManager(credential, scope)
+            _managers[key] = manager
+        return manager
+
+
+def release_token_managers(credential):
+    with _managers_lock:
+        for key in [key for key, manager in _managers.items() if manager.credential is credential]:
+            _managers.pop(key).close()
@@ -1,10 +1,13 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QAction, QMenuBar
+import time
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QAction, QMenuBar, QStackedWidget
 from PyQt5.QtGui import QIcon
 import logging
 
-from data_migration import DataMigrationApp
-from user_guest_creation import UserGuestCreationApp
+from metrics import get_metrics
+
+# The tool screens are imported on first use: between them they pull in
+# azure.identity, jwt, requests and smtplib, none of which the main window needs.
 
 class MainApp(QMainWindow):
     def __init__(self):
@@ -15,8 +18,15 @@ class MainApp(QMainWindow):
         self.init_ui()
 
     def init_ui(self):
+        # The main screen and each tool are pages of the stack. Tools are
+        # created on first use and kept, so their sign-ins and fetched data
+        # survive "Back to Main".
+        self.stack = QStackedWidget()
+        self.setCentralWidget(self.stack)
+        self.tools = {}
+
         self.main_widget = QWidget()
-        self.setCentralWidget(self.main_widget)
+        self.stack.addWidget(self.main_widget)
         self.layout = QVBoxLayout(self.main_widget)
 
         self.button_migration = QPushButton('Azure Tenant Migration Tool', self)
@@ -47,6 +57,10 @@ class MainApp(QMainWindow):
         back_to_main_action.triggered.connect(self.show_main_screen)
         options_menu.addAction(back_to_main_action)
 
+        show_stats_action = QAction('Request Statistics', self)
+        show_stats_action.triggered.connect(self.show_stats_panel)
+        options_menu.addAction(show_stats_action)
+
     def set_default_stylesheet(self):
         self.setStyleSheet("")
         self.menuBar().setStyleSheet("""
@@ -79,32 +93,52 @@ class MainApp(QMainWindow):
             """)
             self.dark_mode = True
 
+    def show_stats_panel(self):
+        if getattr(self, 'stats_panel', None) is None:
+            from stats_panel import StatsPanel
+            self.stats_panel = StatsPanel(self)
+        self.stats_panel.show()
+        self.stats_panel.raise_()
+
     def show_main_screen(self):
         logging.debug('Showing main screen...')
-        self.clear_layout()
-        self.layout.addWidget(self.button_migration)
-        self.layout.addWidget(self.button_user_creation)
+        self.stack.setCurrentWidget(self.main_widget)
 
     def show_migration_tool(self):
         logging.debug('Showing migration tool...')
-        self.clear_layout()
-        self.migration_app = DataMigrationApp()
-        self.layout.addWidget(self.migration_app)
+        self.show_tool('migration', self.create_migration_tool)
 
     def show_user_creation_tool(self):
         logging.debug('Showing user/guest creation tool...')
-        self.clear_layout()
+        self.show_tool('user_creation', self.create_user_creation_tool)
+
+    def create_migration_tool(self):
+        from data_migration import DataMigrationApp
+        self.migration_app = DataMigrationApp(self)
+        return self.migration_app
+
+    def create_user_creation_tool(self):
+        from user_guest_creation import UserGuestCreationApp
         self.user_creation_app = UserGuestCreationApp(self)
-        self.layout.addWidget(self.user_creation_app)
-
-    def clear_layout(self):
-        logging.debug('Clearing layout...')
-        for i in reversed(range(self.layout.count())):
-            widget = self.layout.itemAt(i).widget()
-            if widget is not None:
-                logging.debug(f"Removing widget: {widget}")
-                widget.setParent(None)
-        logging.debug('Layout cleared.')
+        return self.user_creation_app
+
+    def show_tool(self, name, create):
+        tool = self.tools.get(name)
+        if tool is None:
+            started = time.perf_counter()
+            tool = create()
+            seconds = time.perf_counter() - started
+            logging.info(f"Loaded {name} screen in {seconds:.2f}s")
+            get_metrics().observe("screen_load_seconds", seconds, screen=name)
+            self.tools[name] = tool
+            self.stack.addWidget(tool)
+        self.stack.setCurrentWidget(tool)
+
+    def closeEvent(self, event):
+        for tool in self.tools.values():
+            if hasattr(tool, 'cleanup_resources'):
+                tool.cleanup_resources()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
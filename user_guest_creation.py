@@ -1,17 +1,28 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QListWidget, QCheckBox, QComboBox, QApplication
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QListView, QCheckBox, QComboBox, QApplication, QAbstractItemView
 import logging
 import random
 import string
-from azure.identity import InteractiveBrowserCredential
-import requests
 import sys
+import credential_store
+from list_models import CompactListModel, filter_edit
+from migration_core import TenantService
+from notifications import get_dispatcher
+from workers import JobRunner
 
 class UserGuestCreationApp(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         self.credential = None
+        self.service = None
+        self.job_runner = JobRunner()
+        self.active_job = None
         self.init_ui()
+        if credential_store.has_saved_account("tenant"):
+            # Silent sign-in from the token cache; no browser if it has expired
+            self.tenant_label.setText("Tenant: Restoring session...")
+            self.job_runner.start(self.sign_in, False, False, on_result=self.on_authenticated,
+                                  on_error=self.on_authentication_failed)
 
     def init_ui(self):
         logging.debug("Initializing UserGuestCreationApp UI...")
@@ -28,7 +39,13 @@ class UserGuestCreationApp(QWidget):
         self.groups_label = QLabel("Select Groups", self)
         layout.addWidget(self.groups_label)
 
-        self.groups_list = QListWidget(self)
+        self.group_model = CompactListModel(self)
+        layout.addWidget(filter_edit(self.group_model, "Filter groups...", self))
+
+        self.groups_list = QListView(self)
+        self.groups_list.setModel(self.group_model)
+        self.groups_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.groups_list.setUniformItemSizes(True)
         layout.addWidget(self.groups_list)
 
         self.fetch_groups_button = QPushButton("Fetch Groups", self)
@@ -36,7 +53,13 @@ class UserGuestCreationApp(QWidget):
         self.fetch_groups_button.clicked.connect(self.fetch_groups)
         layout.addWidget(self.fetch_groups_button)
 
-        self.user_list = QListWidget(self)
+        self.user_model = CompactListModel(self)
+        layout.addWidget(filter_edit(self.user_model, "Filter users...", self))
+
+        self.user_list = QListView(self)
+        self.user_list.setModel(self.user_model)
+        self.user_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.user_list.setUniformItemSizes(True)
         layout.addWidget(self.user_list)
 
         self.create_user_button = QPushButton("Create User", self)
@@ -49,38 +72,114 @@ class UserGuestCreationApp(QWidget):
         self.create_guest_button.clicked.connect(self.create_guest)
         layout.addWidget(self.create_guest_button)
 
+        self.status_label = QLabel("Idle", self)
+        layout.addWidget(self.status_label)
+
+        self.pause_button = QPushButton("Pause", self)
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause)
+        layout.addWidget(self.pause_button)
+
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_job)
+        layout.addWidget(self.cancel_button)
+
         self.setLayout(layout)
 
     def authenticate_tenant(self):
         logging.debug("Authenticating tenant...")
-        try:
-            self.credential = InteractiveBrowserCredential()
-            token = self.credential.get_token("https://graph.microsoft.com/.default")
-            self.headers = {
-                'Authorization': f'Bearer {token.token}',
-                'Content-Type': 'application/json'
-            }
-            self.tenant_label.setText("Tenant: Authenticated")
-            logging.info("Authenticated Tenant")
-        except Exception as e:
-            logging.error(f"Failed to authenticate tenant: {e}")
+        # Signing in again while signed in switches to another account
+        switch = self.service is not None
+        if self.service is not None:
+            self.service.close()
+            self.service = None
+        self.credential = None
+        self.tenant_label.setText("Tenant: Authenticating...")
+        self.job_runner.start(self.sign_in, switch, on_result=self.on_authenticated,
+                              on_error=self.on_authentication_failed)
+
+    def sign_in(self, job, switch=False, interactive=True):
+        if switch:
+            credential_store.forget_account("tenant")
+        # Acquires the first token now; later calls get cached, auto-refreshed headers
+        return credential_store.sign_in("tenant", interactive)
+
+    def on_authenticated(self, result):
+        if result is None:
             self.tenant_label.setText("Tenant: Not Authenticated")
+            return
+        self.credential, tenant_id = result
+        self.service = TenantService(self.credential, tenant_id)
+        self.tenant_label.setText("Tenant: Authenticated")
+        logging.info("Authenticated Tenant")
+
+    def on_authentication_failed(self, error):
+        logging.error(f"Failed to authenticate tenant: {error}")
+        self.tenant_label.setText("Tenant: Not Authenticated")
+
+    def graph_headers(self):
+        return self.service.graph_headers()
 
     def fetch_groups(self):
         logging.debug("Fetching groups...")
         if not self.credential:
             logging.error("Tenant not authenticated.")
             return
-        try:
-            response = requests.get('https://graph.microsoft.com/v1.0/groups', headers=self.headers)
-            response.raise_for_status()
-            groups = response.json().get('value', [])
-            self.groups_list.clear()
-            for group in groups:
-                self.groups_list.addItem(group['displayName'])
-            logging.info("Fetched groups successfully.")
-        except Exception as e:
-            logging.error(f"Failed to fetch groups: {e}")
+        self.group_model.clear()
+        self.fetch_groups_button.setEnabled(False)
+        self.job_runner.start(self.load_groups, on_partial=self.on_groups_loaded,
+                              on_result=lambda _: logging.info(f"Fetched {len(self.group_model)} groups successfully."),
+                              on_error=lambda error: logging.error(f"Failed to fetch groups: {error}"),
+                              on_finished=lambda: self.fetch_groups_button.setEnabled(True))
+
+    def load_groups(self, job):
+        # Pages are handed to the GUI thread as (replace, groups) while they arrive
+        self.service.load_groups(lambda replace, groups: job.emit_partial((replace, groups)),
+                                 checkpoint=job.checkpoint)
+
+    def on_groups_loaded(self, update):
+        replace, groups = update
+        if replace:
+            self.group_model.clear()
+        self.group_model.append_rows((group['id'], group['displayName']) for group in groups if '@removed' not in group)
+
+    def start_job(self, fn, *args):
+        if self.service is None:
+            logging.error("Tenant not authenticated.")
+            return
+        if self.active_job is not None:
+            logging.info("A creation job is already running.")
+            return
+        self.status_label.setText("Working...")
+        self.active_job = self.job_runner.start(fn, *args, on_item=self.on_item_status,
+                                                on_finished=self.on_job_finished)
+        self.pause_button.setEnabled(True)
+        self.cancel_button.setEnabled(True)
+
+    def toggle_pause(self):
+        if self.active_job is None:
+            return
+        if self.active_job.paused:
+            self.active_job.resume()
+            self.pause_button.setText("Pause")
+        else:
+            self.active_job.pause()
+            self.pause_button.setText("Resume")
+
+    def cancel_job(self):
+        if self.active_job is not None:
+            self.active_job.cancel()
+            self.status_label.setText("Cancelling...")
+
+    def on_item_status(self, key, status):
+        self.status_label.setText(f"{key}: {status}")
+
+    def on_job_finished(self):
+        self.active_job = None
+        self.pause_button.setText("Pause")
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
 
     def generate_random_password(self, length=8):
         letters = string.ascii_letters
@@ -89,6 +188,9 @@ class UserGuestCreationApp(QWidget):
         return password
 
     def create_user(self):
+        self.start_job(self.create_user_in_azure)
+
+    def create_user_in_azure(self, job):
         logging.debug("Creating user...")
         try:
             user_data = {
@@ -106,14 +208,18 @@ class UserGuestCreationApp(QWidget):
                 'employeeId': '123456'
             }
             logging.debug(f"User payload: {user_data}")
-            response = requests.post('https://graph.microsoft.com/v1.0/users', headers=self.headers, json=user_data)
-            response.raise_for_status()
+            job.checkpoint()
+            self.service.create_account(user_data)
             logging.info("User created successfully.")
+            job.report_item(user_data['userPrincipalName'], "created")
             self.send_email(user_data, "Account Created", "Your account has been created.", "manager@example.com")
         except Exception as e:
             logging.error(f"Failed to create user: {e}")
 
     def create_guest(self):
+        self.start_job(self.create_guest_in_azure)
+
+    def create_guest_in_azure(self, job):
         logging.debug("Creating guest...")
         try:
             user_data = {
@@ -131,28 +237,22 @@ class UserGuestCreationApp(QWidget):
                 'employeeId': '654321'
             }
             logging.debug(f"Guest payload: {user_data}")
-            response = requests.post('https://graph.microsoft.com/v1.0/users', headers=self.headers, json=user_data)
-            response.raise_for_status()
+            job.checkpoint()
+            self.service.create_account(user_data)
             logging.info("Guest created successfully.")
+            job.report_item(user_data['userPrincipalName'], "created")
             self.send_email(user_data, "Guest Account Created", "Your guest account has been created.", "manager@example.com")
         except Exception as e:
             logging.error(f"Failed to create guest: {e}")
 
     def send_email(self, user_data, subject, body, to_email):
-        logging.debug(f"Generating email for {user_data['userPrincipalName']}")
+        logging.debug(f"Queueing email for {user_data['userPrincipalName']}")
         try:
-            smtp_server = "smtp.office365.com"  # Microsoft 365 SMTP server
-            smtp_port = 587  # Microsoft 365 SMTP port
-            smtp_username = "yourusername@yourdomain.com"  # Your Microsoft 365 email
-            smtp_password = "yourpassword"  # Your Microsoft 365 email password
-            from_email = smtp_username  # Same as smtp_username for Microsoft 365
-
-            msg = f"Subject: {subject}\n\n{body}\n\nUsername: {user_data['userPrincipalName']}\nPassword: {user_data['passwordProfile']['password']}"
-            logging.debug(f"Email content: {msg}")
-            print(msg)  # Temporarily print the email instead of sending
-            logging.info(f"Generated email for {user_data['userPrincipalName']}")
+            msg = f"{body}\n\nUsername: {user_data['userPrincipalName']}\nPassword: {user_data['passwordProfile']['password']}"
+            get_dispatcher().send(to_email, subject, msg)
+            logging.info(f"Queued email for {user_data['userPrincipalName']}")
         except Exception as e:
-            logging.error(f"Failed to generate email: {e}")
+            logging.error(f"Failed to queue email: {e}")
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
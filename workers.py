@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class JobCancelled(BaseException):
+    # BaseException so the broad "except Exception" handlers around Graph
+    # calls do not swallow a cancellation, same as asyncio.CancelledError.
+    pass
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, int, float)  # done, total, items per second
+    item_status = pyqtSignal(str, str)  # item key, status
+    partial = pyqtSignal(object)  # incremental results, e.g. a page of groups
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class Job(QRunnable):
+    """Runs ``fn(job, *args, **kwargs)`` on a pool thread.
+
+    The function reports back through the job (report_progress, report_item,
+    emit_partial) and calls checkpoint() between items so the GUI can pause or
+    cancel it. Signals are delivered to the GUI thread as queued calls.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancelled = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._started_at = None
+
+    def run(self):
+        self._started_at = time.monotonic()
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+            self.signals.result.emit(result)
+        except JobCancelled:
+            logging.info(f"Job {self.fn.__name__} cancelled.")
+        except Exception as e:
+            logging.error(f"Job {self.fn.__name__} failed: {e}")
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._resume.set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def checkpoint(self):
+        self._resume.wait()
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, done, total):
+        elapsed = time.monotonic() - self._started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+        self.signals.progress.emit(done, total, rate)
+
+    def report_item(self, key, status):
+        self.signals.item_status.emit(str(key), status)
+
+    def emit_partial(self, value):
+        self.signals.partial.emit(value)
+
+
+class JobRunner:
+    def __init__(self, max_threads=None):
+        self.pool = QThreadPool()
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self._jobs = set()
+
+    def start(self, fn, *args, on_result=None, on_error=None, on_progress=None, on_item=None,
+              on_partial=None, on_finished=None, **kwargs):
+        job = Job(fn, *args, **kwargs)
+        signals = job.signals
+        for signal, slot in ((signals.result, on_result), (signals.error, on_error),
+                             (signals.progress, on_progress), (signals.item_status, on_item),
+                             (signals.partial, on_partial), (signals.finished, on_finished)):
+            if slot is not None:
+                signal.connect(slot)
+        # Keep the job alive until its queued signals have been delivered
+        self._jobs.add(job)
+        signals.finished.connect(lambda: self._jobs.discard(job))
+        self.pool.start(job)
+        return job
+
+    def cancel_all(self):
+        for job in list(self._jobs):
+            job.cancel()